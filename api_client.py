@@ -1,56 +1,473 @@
+import yarl
 import aiohttp
 import json
+import time
+import random
 import asyncio
 import datetime
-from config import get_api_token, validate_api_token, API_CONFIG
+import threading
+import collections
+import email.utils
+from sse_parser import SSEParser, parse_delta
+from wire_format import WireEncoder, get_system_message
+from token_budget import estimate_message_tokens
+from response_cache import cache_key
+from telemetry import RequestTimer
+from config import get_api_token, validate_api_token, API_CONFIG, MODELS
+
+# 可重試的HTTP狀態碼
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# 請求被取消時send_message返回的狀態
+CANCELLED_STATUS = "回應已取消"
+
+# 每次從串流讀取的最大位元組數：限制兩次背壓檢查之間處理的事件數
+READ_SIZE = 2 ** 14
+
+
+class RequestError(Exception):
+    """單次請求失敗"""
+
+    def __init__(self, message, status, retryable=False, retry_after=None, http_status=None):
+        """初始化請求錯誤
+
+        Args:
+            message: 顯示給用戶的錯誤消息
+            status: 狀態欄顯示的簡短狀態
+            retryable: 是否可以重試
+            retry_after: 伺服器要求的重試等待時間（秒）
+            http_status: HTTP狀態碼，非HTTP錯誤時為None
+        """
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.http_status = http_status
+
+
+def parse_retry_after(value):
+    """解析Retry-After標頭（秒數或HTTP日期）
+
+    Returns:
+        等待秒數，無法解析時為None
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_time is None:
+        return None
+    now = datetime.datetime.now(retry_time.tzinfo)
+    return max((retry_time - now).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """令牌桶
+
+    以預約方式扣除額度：餘額不足時直接記為負數並返回需要等待的時間，
+    之後的請求依次排在後面，不需要在等待期間持有鎖。
+    """
+
+    def __init__(self, rate_per_minute, burst_seconds):
+        """初始化令牌桶
+
+        Args:
+            rate_per_minute: 每分鐘補充的額度
+            burst_seconds: 桶容量相當於多少秒的額度
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """扣除額度
+
+        Returns:
+            需要等待的秒數
+        """
+        self._refill(now)
+        # 超過桶容量的單次請求只需等到桶滿
+        self.level -= min(amount, self.capacity)
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+    def debit(self, amount, now):
+        """事後扣除額度（例如回應實際使用的token數），不等待"""
+        self._refill(now)
+        self.level -= amount
+
+    def pause(self, seconds, now):
+        """清空額度，使之後的請求至少等待seconds秒（伺服器回應429時調用）"""
+        self._refill(now)
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class RateLimiter:
+    """同一API令牌的客戶端速率限制
+
+    限制同時進行的請求數，並按模型以令牌桶限制每分鐘請求數與token數，
+    使比較模式、批次任務與排隊消息的突發請求被平滑發送，而不是觸發429。
+    可被多個事件循環共用。
+    """
+
+    def __init__(self, max_concurrent=None, rate_limits=None, burst_seconds=None):
+        """初始化速率限制器
+
+        Args:
+            max_concurrent: 同時進行的請求數上限，默認使用API_CONFIG
+            rate_limits: 模型ID到 {"requests_per_minute", "tokens_per_minute"} 的映射，默認使用API_CONFIG
+            burst_seconds: 令牌桶容量（秒），默認使用API_CONFIG
+        """
+        self.max_concurrent = API_CONFIG["max_concurrent_requests"] if max_concurrent is None else max_concurrent
+        self.rate_limits = API_CONFIG["rate_limits"] if rate_limits is None else rate_limits
+        self.burst_seconds = API_CONFIG["rate_limit_burst_seconds"] if burst_seconds is None else burst_seconds
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._active = 0
+        # 等待名額的 (事件循環, future)
+        self._waiters = collections.deque()
+
+    def _get_buckets(self, model):
+        """獲取模型的 (請求數令牌桶, token數令牌桶)，未限制的項為None"""
+        # 多個事件循環可能同時首次使用同一模型，檢查與創建須在鎖內完成，
+        # 否則各自創建的令牌桶會互相覆蓋，已預約的額度隨之丟失
+        with self._lock:
+            buckets = self._buckets.get(model)
+            if buckets is None:
+                limits = self.rate_limits.get(model) or self.rate_limits.get("default") or {}
+                buckets = tuple(
+                    TokenBucket(limits[name], self.burst_seconds) if limits.get(name) else None
+                    for name in ("requests_per_minute", "tokens_per_minute")
+                )
+                self._buckets[model] = buckets
+            return buckets
+
+    async def acquire_slot(self):
+        """取得一個並行名額，名額已滿時按先後順序等待"""
+        with self._lock:
+            if not self.max_concurrent or self._active < self.max_concurrent:
+                self._active += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # 名額已轉交給此請求，取消時歸還
+            self.release_slot()
+            raise
+
+    def release_slot(self):
+        """歸還並行名額，有等待者時直接轉交"""
+        with self._lock:
+            if self._waiters:
+                loop, future = self._waiters.popleft()
+                loop.call_soon_threadsafe(_set_future_result, future)
+                return
+            self._active -= 1
+
+    def reserve(self, model, estimated_tokens):
+        """預約一次請求的額度
+
+        Args:
+            model: 模型ID
+            estimated_tokens: 估算的提示token數
+
+        Returns:
+            發送前需要等待的秒數
+        """
+        request_bucket, token_bucket = self._get_buckets(model)
+        now = time.monotonic()
+        with self._lock:
+            wait = request_bucket.reserve(1, now) if request_bucket else 0.0
+            if token_bucket:
+                wait = max(wait, token_bucket.reserve(estimated_tokens, now))
+        return wait
+
+    def record_usage(self, model, tokens):
+        """記錄回應實際輸出的token數"""
+        token_bucket = self._get_buckets(model)[1]
+        if token_bucket and tokens:
+            with self._lock:
+                token_bucket.debit(tokens, time.monotonic())
+
+    def pause(self, model, seconds):
+        """伺服器回應429時暫停該模型的請求"""
+        request_bucket = self._get_buckets(model)[0]
+        if request_bucket and seconds > 0:
+            with self._lock:
+                request_bucket.pause(seconds, time.monotonic())
+
+
+def _set_future_result(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# 每個API令牌一個速率限制器
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_token):
+    """獲取API令牌對應的速率限制器（同一進程內共用）"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(api_token)
+        if limiter is None:
+            limiter = _rate_limiters[api_token] = RateLimiter()
+        return limiter
+
+
+def create_pooled_session():
+    """創建帶連接池的aiohttp會話
+
+    連接保持keep-alive並快取DNS結果，供多輪對話與多個模型重複使用。
+    必須在事件循環中調用。
+    """
+    connector = aiohttp.TCPConnector(
+        limit=API_CONFIG["connector_limit"],
+        limit_per_host=API_CONFIG["connector_limit_per_host"],
+        use_dns_cache=True,
+        ttl_dns_cache=API_CONFIG["dns_cache_ttl"],
+        keepalive_timeout=API_CONFIG["keepalive_timeout"]
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[_create_trace_config()])
+
+
+def _create_trace_config():
+    """以aiohttp的追蹤回調記錄DNS解析與建立連接的時間
+
+    請求時以trace_request_ctx傳入RequestTimer，未傳入時不記錄。
+    """
+    def marker(name):
+        async def on_event(session, context, params):
+            timer = context.trace_request_ctx
+            if timer is not None:
+                timer.mark(name)
+        return on_event
+
+    async def on_connection_reused(session, context, params):
+        # 重試時只以第一次取得連接的方式為準
+        timer = context.trace_request_ctx
+        if timer is not None and timer.connection_reused is None:
+            timer.connection_reused = True
+
+    async def on_connection_created(session, context, params):
+        timer = context.trace_request_ctx
+        if timer is not None:
+            timer.mark("connect_end")
+            timer.connection_reused = False
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_dns_resolvehost_start.append(marker("dns_start"))
+    trace_config.on_dns_resolvehost_end.append(marker("dns_end"))
+    trace_config.on_connection_create_start.append(marker("connect_start"))
+    trace_config.on_connection_create_end.append(on_connection_created)
+    trace_config.on_connection_reuseconn.append(on_connection_reused)
+    return trace_config
+
+async def warm_up_connection(session, api_url, timeout=5):
+    """預先建立到API伺服器的連接（DNS解析、TCP與TLS握手），放入連接池供之後的請求重用
+
+    以HEAD請求伺服器根路徑，不消耗API額度；任何錯誤都會被忽略。
+
+    Returns:
+        建立連接所用的毫秒數（含DNS解析與握手，即之後的請求可省下的時間），
+        連接池中已有可用連接時為0，失敗時為None
+    """
+    origin = str(yarl.URL(api_url).origin())
+    timer = RequestTimer(None, "prewarm")
+    try:
+        async with session.head(origin, timeout=aiohttp.ClientTimeout(total=timeout),
+                                trace_request_ctx=timer) as response:
+            await response.read()
+    except Exception:
+        return None
+    return timer.finish(True, "prewarm")["connect_ms"] or 0.0
 
 class ApiClient:
-    def __init__(self, on_message_callback=None, on_error_callback=None, on_done_callback=None):
+    def __init__(self, on_message_callback=None, on_error_callback=None, on_done_callback=None,
+                 session=None, api_url=None, wire_encoder=None,
+                 on_retry_callback=None, on_failover_callback=None,
+                 rate_limiter=None, on_throttle_callback=None, response_cache=None,
+                 request_kind="chat", wait_for_capacity=None):
         """初始化API客戶端
         
         Args:
             on_message_callback: 收到消息時的回調函數
-            on_error_callback: 發生錯誤時的回調函數
+            on_error_callback: 發生錯誤時的回調函數（重試全部失敗後才調用）
             on_done_callback: 完成時的回調函數
+            session: 共用的aiohttp會話，由調用方負責關閉；為None時自行創建
+            api_url: API端點，默認使用API_CONFIG["api_url"]
+            wire_encoder: 請求編碼器，傳入同一個實例可在多輪對話間重用已編碼的歷史
+            on_retry_callback: 重試前的回調，參數為 (模型ID, 第幾次重試, 等待秒數, 失敗原因)
+            on_failover_callback: 切換到備用模型時的回調，參數為 (原模型ID, 備用模型ID)
+            rate_limiter: 速率限制器，默認使用API令牌對應的共用限制器
+            on_throttle_callback: 因速率限制而延後發送時的回調，參數為 (模型ID, 等待秒數)
+            response_cache: ResponseCache實例，為None時不使用快取
+            request_kind: 記錄在指標中的請求類型（chat、compare、batch）
+            wait_for_capacity: 每處理一個數據塊後等待的協程函數（背壓），顯示端跟不上時
+                               暫停讀取串流，為None時不等待
         """
         self.on_message = on_message_callback
         self.on_error = on_error_callback
         self.on_done = on_done_callback
-        self.session = None
+        self.on_retry = on_retry_callback
+        self.on_failover = on_failover_callback
+        self.on_throttle = on_throttle_callback
+        self.wait_for_capacity = wait_for_capacity
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+        # 上一次請求是否命中快取（未使用快取時為None）
+        self.cache_hit = None
+        # 上一次請求的計時器與指標
+        self.request_kind = request_kind
+        self.timer = None
+        self.metrics = None
+        self.session = session
+        self.owns_session = session is None
+        self.api_url = api_url or API_CONFIG["api_url"]
+        self.wire_encoder = wire_encoder or WireEncoder()
         self.is_cancelled = False
+        # 已收到的增量片段（取消時為截斷前的部分）
+        self.response_parts = []
+        # 進行中請求所屬的事件循環、任務與串流回應，供cancel()從其他線程中止請求
+        self._loop = None
+        self._task = None
+        self._response = None
+        # 是否正在等待顯示端追上（此時沒有進行中的讀取，取消須直接取消任務）
+        self._waiting_for_capacity = False
+        # 實際回應的模型（切換到備用模型後與請求的模型不同）
+        self.last_model = None
+        # 總超時不設限，只限制建立連接；首字節與閒置超時在讀取時控制
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=API_CONFIG["connect_timeout"])
     
     async def create_session(self):
         """創建aiohttp會話"""
         if self.session is None:
-            self.session = aiohttp.ClientSession()
+            self.session = create_pooled_session()
+            self.owns_session = True
         return self.session
     
     async def close_session(self):
-        """關閉aiohttp會話"""
-        if self.session:
+        """關閉aiohttp會話（共用會話不會被關閉）"""
+        if self.session and self.owns_session:
             await self.session.close()
             self.session = None
     
     def cancel(self):
-        """取消當前請求"""
+        """取消當前請求（可從任意線程調用）
+        
+        串流中的回應會立即關閉連接，伺服器隨即停止輸出（未讀完的回應無法放回
+        連接池，關閉連接是讓伺服器停止生成的唯一方式）；等待連接、速率限制
+        額度或重試時則取消等待。send_message照常返回已收到的部分。
+        
+        Returns:
+            是否有進行中的請求（為False時請求尚未開始或已經結束）
+        """
         self.is_cancelled = True
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return False
+        loop.call_soon_threadsafe(self._abort)
+        return True
+    
+    def _abort(self):
+        """在請求所屬的事件循環中中止請求"""
+        if self._response is not None and not self._waiting_for_capacity:
+            # 進行中的讀取會因連接關閉而結束
+            self._response.close()
+        elif self._task is not None:
+            self._task.cancel()
     
-    async def send_message(self, messages, model, temperature=0.5):
+    def shape_messages(self, messages, model):
+        """在消息前加上模型固定的系統提示（SYSTEM_PROMPTS）
+        
+        系統提示每個模型只有一個消息對象，每輪請求都以相同的位元組開頭，
+        有利於服務端的前綴快取。
+        """
+        system_message = get_system_message(model)
+        return [system_message] + messages if system_message else messages
+    
+    def build_request_body(self, messages, model, temperature=0.5):
+        """構建請求體
+        
+        Args:
+            messages: 消息歷史列表（只發送role和content欄位）
+            model: 模型ID
+            temperature: 溫度參數
+            
+        Returns:
+            UTF-8編碼的JSON請求體；與上一個請求體相同的開頭位元組數見
+            self.wire_encoder.unchanged_prefix_bytes
+        """
+        # 四捨五入到小數點後2位，確保精度一致
+        temperature = round(temperature, 2)
+        
+        return self.wire_encoder.encode_body(
+            self.shape_messages(messages, model), model, temperature, API_CONFIG["max_tokens"]
+        )
+    
+    def _fallback_model(self, model):
+        """獲取備用模型ID，未配置或與當前模型相同時返回None"""
+        fallback = API_CONFIG.get("fallback_model")
+        if not fallback:
+            return None
+        fallback = MODELS.get(fallback, fallback)
+        return fallback if fallback != model else None
+    
+    async def send_message(self, messages, model, temperature=0.5, payload=None):
         """發送消息到API
         
+        429、5xx、連接失敗及超時會以帶抖動的指數退避重試（遵循Retry-After），
+        主模型仍失敗時可切換到API_CONFIG["fallback_model"]。已經輸出部分回應後
+        不再重試或切換，避免重複或前後不一致的文字。
+        
         Args:
             messages: 消息歷史列表
             model: 模型ID
             temperature: 溫度參數
+            payload: 已由build_request_body構建的請求體，為None時自動構建
             
         Returns:
-            元組 (成功標誌, 回應內容, 錯誤消息)
+            元組 (成功標誌, 回應內容, 錯誤消息)；請求的延遲與吞吐量指標保存在self.metrics
         """
+        self.timer = RequestTimer(model, self.request_kind)
+        self._request_bytes = 0
+        self._unchanged_prefix_bytes = None
         self.is_cancelled = False
-        full_response = ""
-        
-        # 四捨五入到小數點後2位，確保精度一致
-        temperature = round(temperature, 2)
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        try:
+            success, response, status = await self._send_message(messages, model, temperature, payload)
+        finally:
+            self._loop = None
+            self._task = None
+        self.metrics = self.timer.finish(success, status, bool(self.cache_hit), self._request_bytes,
+                                         self._unchanged_prefix_bytes)
+        return success, response, status
+    
+    async def _send_message(self, messages, model, temperature, payload):
+        """send_message的實際處理"""
+        self.last_model = model
+        # 以列表累積增量文字，最後一次性拼接，避免長回應的二次方複製
+        response_parts = self.response_parts = []
         
         # 獲取並驗證API令牌
         api_token = get_api_token()
@@ -64,23 +481,152 @@ class ApiClient:
             "Content-Type": "application/json"
         }
         
-        body = {
-            "model": model,
-            "messages": messages,
-            "stream": True,
-            "max_tokens": 10000,
-            "temperature": temperature
-        }
+        if payload is None:
+            payload = self.build_request_body(messages, model, temperature)
+        self._request_bytes = len(payload)
+        self._unchanged_prefix_bytes = self.wire_encoder.unchanged_prefix_bytes
         
-        try:
-            session = await self.create_session()
+        self.cache_hit = None
+        cache = self.response_cache if self.response_cache and self.response_cache.is_cacheable(temperature) else None
+        if cache:
+            key = cache_key(payload)
+            # SQLite查詢在線程池中執行，不阻塞事件循環上的其他串流
+            deltas = await asyncio.get_running_loop().run_in_executor(None, cache.get, key)
+            self.cache_hit = deltas is not None
+            if deltas is not None:
+                return await self._replay(deltas)
+        
+        if self.rate_limiter is None:
+            self.rate_limiter = get_rate_limiter(api_token)
+        self._prompt_tokens = sum(estimate_message_tokens(message) for message in self.shape_messages(messages, model))
+        
+        error = await self._send_with_retry(model, headers, payload, response_parts)
+        
+        fallback = self._fallback_model(model)
+        if error and fallback and not response_parts and not self.is_cancelled:
+            if self.on_failover:
+                self.on_failover(model, fallback)
+            self.last_model = fallback
+            self.timer.model = fallback
+            payload = self.build_request_body(messages, fallback, temperature)
+            error = await self._send_with_retry(fallback, headers, payload, response_parts)
+        
+        if error:
+            if self.is_cancelled:
+                return False, "".join(response_parts), CANCELLED_STATUS
+            if self.on_error:
+                self.on_error(error.message)
+            return False, "".join(response_parts), error.status
+        
+        # 只保存完整且由請求的模型產生的回應
+        if cache and response_parts and not self.is_cancelled and self.last_model == model:
+            await asyncio.get_running_loop().run_in_executor(None, cache.put, key, model, response_parts)
+        
+        # 調用完成回調
+        if self.on_done and not self.is_cancelled:
+            self.on_done()
             
-            async with session.post(
-                API_CONFIG["api_url"],
-                headers=headers,
-                json=body,
-                timeout=60
-            ) as response:
+        return True, "".join(response_parts), "就緒" if not self.is_cancelled else CANCELLED_STATUS
+    
+    async def _replay(self, deltas):
+        """以快取的增量片段重播回應，回調順序與真實串流相同"""
+        response_parts = self.response_parts = []
+        try:
+            for index, content in enumerate(deltas):
+                if self.is_cancelled:
+                    break
+                response_parts.append(content)
+                self.timer.on_token()
+                if self.on_message:
+                    self.on_message(content)
+                # 定期讓出事件循環，長回應重播時仍可取消
+                if index % 64 == 63:
+                    await asyncio.sleep(0)
+                    await self._wait_for_capacity()
+        except asyncio.CancelledError:
+            self.is_cancelled = True
+        
+        if self.on_done and not self.is_cancelled:
+            self.on_done()
+        
+        return True, "".join(response_parts), "就緒（快取）" if not self.is_cancelled else CANCELLED_STATUS
+    
+    def _retry_delay(self, attempt, retry_after=None):
+        """計算第attempt次重試前的等待時間（秒）"""
+        max_delay = API_CONFIG["retry_max_delay"]
+        if retry_after is not None:
+            return min(retry_after, max_delay)
+        # 完全抖動：在指數增長的上限內隨機取值，避免多個客戶端同時重試
+        return random.uniform(0, min(max_delay, API_CONFIG["retry_base_delay"] * 2 ** attempt))
+    
+    async def _send_with_retry(self, model, headers, payload, response_parts):
+        """發送請求，可重試的錯誤按退避策略重試
+        
+        Returns:
+            最終失敗時的RequestError，成功或取消時為None
+        """
+        attempt = 0
+        while True:
+            try:
+                await self._send_limited(model, headers, payload, response_parts)
+                return None
+            except asyncio.CancelledError:
+                # 在等待速率限制額度時被取消
+                self.is_cancelled = True
+                return None
+            except RequestError as error:
+                if (self.is_cancelled or response_parts or not error.retryable
+                        or attempt >= API_CONFIG["max_retries"]):
+                    return error
+                delay = self._retry_delay(attempt, error.retry_after)
+                if error.http_status == 429:
+                    # 伺服器已限流，同一令牌的其他請求也應暫停
+                    self.rate_limiter.pause(model, delay)
+                attempt += 1
+                self.timer.retries += 1
+                if self.on_retry:
+                    self.on_retry(model, attempt, delay, error.status)
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    self.is_cancelled = True
+                    return None
+    
+    async def _send_limited(self, model, headers, payload, response_parts):
+        """在速率限制內發送一次請求（每次重試都計入額度）"""
+        limiter = self.rate_limiter
+        await limiter.acquire_slot()
+        received_before = len(response_parts)
+        try:
+            wait = limiter.reserve(model, self._prompt_tokens)
+            if wait > 0:
+                if self.on_throttle:
+                    self.on_throttle(model, wait)
+                await asyncio.sleep(wait)
+            await self._send_once(headers, payload, response_parts)
+        finally:
+            limiter.release_slot()
+            # 每個增量片段約為一個token
+            limiter.record_usage(model, len(response_parts) - received_before)
+    
+    async def _send_once(self, headers, payload, response_parts):
+        """發送一次請求並讀取串流回應
+        
+        Raises:
+            RequestError: 請求失敗
+        """
+        session = await self.create_session()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + API_CONFIG["first_byte_timeout"]
+        
+        try:
+            response = await asyncio.wait_for(
+                session.post(self.api_url, headers=headers, data=payload, timeout=self.timeout,
+                             trace_request_ctx=self.timer),
+                API_CONFIG["first_byte_timeout"]
+            )
+            self._response = response
+            async with response:
                 if response.status != 200:
                     # 處理非200響應
                     error_text = await response.text()
@@ -90,57 +636,89 @@ class ApiClient:
                     except:
                         error_message = f"請求失敗: 狀態碼 {response.status}"
                     
-                    if self.on_error:
-                        self.on_error(error_message)
-                    return False, "", f"API錯誤: {response.status}"
+                    raise RequestError(
+                        error_message, f"API錯誤: {response.status}",
+                        retryable=response.status in RETRY_STATUSES,
+                        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                        http_status=response.status
+                    )
                 
-                # 處理流式響應
-                try:
-                    async for line in response.content:
-                        # 檢查是否取消
-                        if self.is_cancelled:
-                            break
-                        
-                        line = line.decode("utf-8").strip()
-                        if line.startswith("data: "):
-                            data = line[6:]
-                            if data == "[DONE]":
-                                break
-                            
-                            try:
-                                data_json = json.loads(data)
-                                content = data_json.get("choices", [{}])[0].get("delta", {}).get("content")
-                                if content:
-                                    full_response += content
-                                    if self.on_message:
-                                        self.on_message(content)
-                            except Exception as e:
-                                if not self.is_cancelled and self.on_error:
-                                    self.on_error(f"解析響應時出錯: {e}")
-                except asyncio.CancelledError:
-                    self.is_cancelled = True
-                except asyncio.TimeoutError:
-                    if not self.is_cancelled and self.on_error:
-                        self.on_error("請求超時，請稍後再試。")
-                    return False, full_response, "請求超時"
-                except Exception as e:
-                    if not self.is_cancelled and self.on_error:
-                        self.on_error(f"讀取回應時發生錯誤: {e}")
-                    return False, full_response, f"讀取錯誤: {str(e)[:50]}"
+                # 處理流式響應：第一段內容受首字節超時限制，之後受閒置超時限制
+                parser = SSEParser()
+                read_timeout = max(deadline - loop.time(), 0)
+                while True:
+                    chunk = await asyncio.wait_for(response.content.read(READ_SIZE), read_timeout)
+                    if not chunk:
+                        self._handle_events(parser.close(), response_parts)
+                        break
+                    read_timeout = API_CONFIG["idle_read_timeout"]
+                    
+                    # 檢查是否取消
+                    if self.is_cancelled:
+                        break
+                    
+                    if self._handle_events(parser.feed(chunk), response_parts):
+                        break
+                    # 顯示端積壓時暫停讀取，未讀的數據留在TCP緩衝區，伺服器隨之放慢
+                    await self._wait_for_capacity()
         
         except asyncio.CancelledError:
             self.is_cancelled = True
-        except aiohttp.ClientConnectorError:
-            if not self.is_cancelled and self.on_error:
-                self.on_error("無法連接到API伺服器，請檢查網絡連接。")
-            return False, full_response, "網絡連接錯誤"
         except Exception as e:
-            if not self.is_cancelled and self.on_error:
-                self.on_error(f"連接錯誤: {e}")
-            return False, full_response, f"錯誤: {str(e)[:50]}"
+            # cancel()關閉回應後，進行中的讀取因連接關閉而失敗，不視為錯誤
+            if not self.is_cancelled:
+                raise self._to_request_error(e)
+        finally:
+            self._response = None
+    
+    async def _wait_for_capacity(self):
+        """等待顯示端追上（未設置wait_for_capacity時立即返回）"""
+        if self.wait_for_capacity is None:
+            return
+        self._waiting_for_capacity = True
+        try:
+            await self.wait_for_capacity()
+        finally:
+            self._waiting_for_capacity = False
+    
+    def _to_request_error(self, error):
+        """將請求過程中的異常轉換為RequestError"""
+        if isinstance(error, RequestError):
+            return error
+        if isinstance(error, asyncio.TimeoutError):
+            return RequestError("請求超時，請稍後再試。", "請求超時", retryable=True)
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return RequestError("無法連接到API伺服器，請檢查網絡連接。", "網絡連接錯誤", retryable=True)
+        if isinstance(error, (aiohttp.ClientPayloadError, aiohttp.ServerDisconnectedError)):
+            return RequestError(f"讀取回應時發生錯誤: {error}", f"讀取錯誤: {str(error)[:50]}", retryable=True)
+        return RequestError(f"連接錯誤: {error}", f"錯誤: {str(error)[:50]}",
+                            retryable=isinstance(error, aiohttp.ClientError))
+    
+    def _handle_events(self, events, response_parts):
+        """處理解析出的SSE事件
         
-        # 調用完成回調
-        if self.on_done and not self.is_cancelled:
-            self.on_done()
+        Args:
+            events: 事件data列表
+            response_parts: 用於累積回應內容的列表
+            
+        Returns:
+            是否應停止讀取（收到串流結束標記或請求已取消）
+        """
+        for data in events:
+            # 取消後同一數據塊中剩餘的token也不再輸出
+            if data == "[DONE]" or self.is_cancelled:
+                return True
+            
+            try:
+                content = parse_delta(data)
+            except Exception as e:
+                if not self.is_cancelled and self.on_error:
+                    self.on_error(f"解析響應時出錯: {e}")
+                continue
             
-        return True, full_response, "就緒" if not self.is_cancelled else "回應已取消" 
\ No newline at end of file
+            if content:
+                response_parts.append(content)
+                self.timer.on_token()
+                if self.on_message:
+                    self.on_message(content)
+        return False
@@ -1,12 +1,16 @@
 import tkinter as tk
-from tkinter import scrolledtext, ttk, filedialog
+from tkinter import scrolledtext, ttk
 import datetime
+import threading
 import tkinter.messagebox as messagebox
 
 from config import (APP_VERSION, DEFAULT_FONT_FAMILY, DEFAULT_FONT_SIZES, 
                   FONT_SCALE_MIN, FONT_SCALE_MAX, LAST_VALID_CUSTOM_SCALE,
-                  MODELS, UI_COLORS, setup_warnings)
+                  MODELS, UI_COLORS, STORE_CONFIG, setup_warnings, profiling_enabled)
 from chat_manager import ChatManager
+from markdown_render import configure_markdown_tags
+from conversation_store import ConversationStore
+from ui_dispatcher import UiDispatcher
 from ui_utils import (get_time_str, set_text_readonly_but_selectable, 
                     create_custom_dialog, create_context_menu,
                     validate_decimal)
@@ -16,6 +20,7 @@ selected_model = None
 temperature_value = None
 font_scale_value = None
 status_bar = None
+stats_label = None
 chat_manager = None
 
 def update_status(message):
@@ -24,6 +29,36 @@ def update_status(message):
     if status_bar:
         status_bar.config(text=message)
 
+def update_stats(text):
+    """更新統計面板（最近一次請求的延遲與吞吐量）"""
+    global stats_label
+    if stats_label:
+        stats_label.config(text=text)
+
+def export_telemetry():
+    """將本次運行記錄的請求指標導出為CSV或JSON"""
+    global chat_manager
+    
+    if not chat_manager.telemetry.records():
+        update_status("尚未記錄任何請求指標")
+        return
+    
+    current_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    from tkinter import filedialog
+    file_path = filedialog.asksaveasfilename(
+        defaultextension=".csv",
+        filetypes=[("CSV", "*.csv"), ("JSON", "*.json"), ("所有文件", "*.*")],
+        initialfile=f"請求統計_{current_time}.csv"
+    )
+    if not file_path:
+        return
+    
+    try:
+        count = chat_manager.telemetry.export(file_path)
+        update_status(f"已導出 {count} 條請求統計到: {file_path}")
+    except OSError as e:
+        update_status(f"導出統計失敗: {e}")
+
 def clear_history_handler(chat_display):
     """處理清除歷史的操作"""
     global chat_manager
@@ -34,8 +69,7 @@ def clear_history_handler(chat_display):
         chat_manager.clear_history()
         
         # 清除聊天顯示
-        chat_display.config(state=tk.NORMAL)
-        chat_display.delete(1.0, tk.END)
+        chat_manager.chat_view.clear()
         chat_display.insert(tk.END, "聊天歷史已清除\n\n", "system")
         set_text_readonly_but_selectable(chat_display)
         
@@ -68,10 +102,11 @@ def clear_history_handler(chat_display):
 def update_font_size():
     """更新界面所有元素的字體大小"""
     global LAST_VALID_CUSTOM_SCALE, font_scale_value
-    global chat_display, user_input_entry, send_btn, stop_btn, clear_btn, export_btn
+    global chat_display, user_input_entry, send_btn, stop_btn, clear_btn, export_btn, sessions_btn, compare_btn
     global model_label, temp_label, temp_value_label, temp_desc
     global font_size_label, font_size_radios, custom_size_entry, custom_size_label
     global title_label, version_label, status_bar
+    global search_label, search_entry, search_btn
     
     # 獲取當前選擇的比例
     scale = font_scale_value.get()
@@ -115,15 +150,17 @@ def update_font_size():
         chat_display.tag_configure("user_header", font=(DEFAULT_FONT_FAMILY, main_size, "bold"))
         chat_display.tag_configure("assistant_header", font=(DEFAULT_FONT_FAMILY, main_size, "bold"))
         chat_display.tag_configure("system", font=(DEFAULT_FONT_FAMILY, status_size, "italic"))
+        configure_markdown_tags(chat_display, main_size)
     
     # 更新輸入框和按鈕
     if 'user_input_entry' in globals() and user_input_entry:
         user_input_entry.config(font=(DEFAULT_FONT_FAMILY, input_size))
     
     # 更新其他UI元素的字體大小 (如果它們存在)
-    for elem_name in ['send_btn', 'stop_btn', 'clear_btn', 'export_btn',
+    for elem_name in ['send_btn', 'stop_btn', 'clear_btn', 'export_btn', 'sessions_btn', 'compare_btn',
                      'model_label', 'temp_label', 'temp_value_label', 'temp_desc',
-                     'font_size_label', 'title_label', 'version_label', 'status_bar']:
+                     'font_size_label', 'title_label', 'version_label', 'status_bar', 'stats_label',
+                     'stats_export_btn', 'search_label', 'search_entry', 'search_btn']:
         if elem_name in globals() and globals()[elem_name]:
             if 'btn' in elem_name:
                 globals()[elem_name].config(font=(DEFAULT_FONT_FAMILY, button_size, "bold"))
@@ -131,7 +168,7 @@ def update_font_size():
                 globals()[elem_name].config(font=(DEFAULT_FONT_FAMILY, title_size, "bold"))
             elif elem_name == 'version_label':
                 globals()[elem_name].config(font=(DEFAULT_FONT_FAMILY, subtitle_size))
-            elif elem_name == 'status_bar':
+            elif elem_name in ('status_bar', 'stats_label'):
                 globals()[elem_name].config(font=(DEFAULT_FONT_FAMILY, status_size))
             elif elem_name == 'temp_desc':
                 globals()[elem_name].config(font=(DEFAULT_FONT_FAMILY, description_size))
@@ -154,17 +191,14 @@ def update_font_size():
     style.configure("TRadiobutton", font=(DEFAULT_FONT_FAMILY, main_size))
 
 def export_history(chat_display):
-    """導出聊天歷史到文本文件"""
+    """在背景線程中以串流方式導出聊天歷史"""
     global chat_manager
     
     # 定義關閉對話框的函數
     def close_dialog(dialog):
         dialog.destroy()
     
-    # 獲取聊天歷史
-    chat_history = chat_manager.get_history()
-    
-    if not chat_history:
+    if not chat_manager.get_history():
         # 創建提示對話框
         create_custom_dialog(
             chat_display.master,
@@ -181,34 +215,31 @@ def export_history(chat_display):
     current_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     default_filename = f"聊天記錄_{current_time}.txt"
     
-    # 打開文件保存對話框
+    # 打開文件保存對話框（副檔名決定導出格式；不常用的模組在首次使用時才導入）
+    from tkinter import filedialog
     file_path = filedialog.asksaveasfilename(
         defaultextension=".txt",
-        filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")],
+        filetypes=[
+            ("文本文件", "*.txt"),
+            ("Markdown", "*.md"),
+            ("JSON Lines", "*.jsonl"),
+            ("gzip 壓縮文本", "*.txt.gz"),
+            ("gzip 壓縮 JSON Lines", "*.jsonl.gz"),
+            ("所有文件", "*.*")
+        ],
         initialfile=default_filename
     )
     
     if not file_path:  # 用戶取消了保存
         return
     
-    try:
-        with open(file_path, "w", encoding="utf-8") as file:
-            # 寫入標題
-            file.write(f"===== AI 聊天助手對話記錄 =====\n")
-            file.write(f"導出時間: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            # 寫入對話內容
-            for msg in chat_history:
-                if msg["role"] == "user":
-                    role = "您"
-                else:
-                    # 使用模型名稱，若無則默認為「AI」
-                    role = msg.get("model", "AI").split('/')[-1]
-                
-                # 使用消息中的時間戳
-                timestamp = msg.get("timestamp", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                file.write(f"[{timestamp}] {role}: {msg['content']}\n\n")
-        
+    dispatcher = chat_manager.dispatcher
+    
+    def report_progress(done, total):
+        percent = f" ({done * 100 // total}%)" if total else ""
+        dispatcher.call_coalesced("status", update_status, f"正在導出聊天記錄: {done} 條{percent}")
+    
+    def on_success(count):
         # 更新狀態
         update_status(f"聊天記錄已保存到: {file_path}")
         
@@ -216,27 +247,189 @@ def export_history(chat_display):
         create_custom_dialog(
             chat_display.master,
             "成功",
-            f"聊天記錄已保存到:\n{file_path}",
+            f"已導出 {count} 條聊天記錄到:\n{file_path}",
             width=350,
             height=120,
             buttons=[("確定", close_dialog)],
             default_button=0
         )
-        
-    except Exception as e:
+    
+    def on_failure(error):
         # 顯示錯誤
-        update_status(f"保存失敗: {e}")
+        update_status(f"保存失敗: {error}")
         
         # 創建錯誤對話框
         create_custom_dialog(
             chat_display.master,
             "錯誤",
-            f"保存失敗: {e}",
+            f"保存失敗: {error}",
             width=350,
             height=120,
             buttons=[("確定", close_dialog)],
             default_button=0
         )
+    
+    def run_export():
+        from exporter import export_messages
+        try:
+            messages, total = chat_manager.get_export_source()
+            count = export_messages(messages, file_path, total, report_progress)
+        except Exception as e:
+            dispatcher.call(on_failure, e)
+        else:
+            dispatcher.call(on_success, count)
+    
+    update_status("正在導出聊天記錄...")
+    threading.Thread(target=run_export, name="HistoryExport", daemon=True).start()
+
+def open_sessions_dialog(chat_display):
+    """顯示已存儲的會話列表，選擇後開啟該會話"""
+    global chat_manager
+    
+    if chat_manager.is_sending:
+        update_status("請等待目前的回應完成後再切換會話")
+        return
+    
+    sessions = chat_manager.list_sessions()
+    if not sessions:
+        create_custom_dialog(
+            chat_display.master,
+            "提示",
+            "目前沒有已保存的會話",
+            width=300,
+            height=100,
+            buttons=[("確定", lambda dialog: dialog.destroy())],
+            default_button=0
+        )
+        return
+    
+    parent = chat_display.winfo_toplevel()
+    dialog = tk.Toplevel(parent)
+    dialog.title("歷史會話")
+    dialog.geometry("520x360")
+    dialog.transient(parent)
+    dialog.grab_set()
+    
+    listbox = tk.Listbox(dialog, font=(DEFAULT_FONT_FAMILY, 10), activestyle="none")
+    listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+    for session in sessions:
+        title = session["title"] or "（無標題）"
+        listbox.insert(tk.END, f"{session['updated_at']}  {title}  ({session['message_count']} 條)")
+    listbox.selection_set(0)
+    
+    def open_selected(event=None):
+        selection = listbox.curselection()
+        if not selection:
+            return
+        session = sessions[selection[0]]
+        dialog.destroy()
+        
+        chat_manager.open_session(session["id"])
+        chat_manager.chat_view.show_history()
+        update_status(f"已開啟會話: {session['title'] or session['id'][:8]}")
+    
+    listbox.bind("<Double-Button-1>", open_selected)
+    listbox.bind("<Return>", open_selected)
+    
+    button_frame = tk.Frame(dialog)
+    button_frame.pack(pady=(0, 10))
+    tk.Button(button_frame, text="開啟", width=8, font=(DEFAULT_FONT_FAMILY, 9),
+              command=open_selected).pack(side=tk.LEFT, padx=5)
+    tk.Button(button_frame, text="取消", width=8, font=(DEFAULT_FONT_FAMILY, 9),
+              command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+    listbox.focus_set()
+
+def highlight_matches(chat_display, query):
+    """在聊天顯示區標記搜尋詞，並捲動到第一個匹配處"""
+    chat_display.tag_remove("search_hit", "1.0", tk.END)
+    first = None
+    for term in query.split():
+        start = "1.0"
+        count = tk.IntVar()
+        while True:
+            pos = chat_display.search(term, start, stopindex=tk.END, nocase=True, count=count)
+            if not pos:
+                break
+            end = f"{pos}+{count.get()}c"
+            chat_display.tag_add("search_hit", pos, end)
+            if first is None or chat_display.compare(pos, "<", first):
+                first = pos
+            start = end
+    if first:
+        chat_display.see(first)
+
+def search_handler(chat_display, query):
+    """搜尋已保存的會話並顯示結果列表"""
+    global chat_manager
+    
+    query = query.strip()
+    if not query:
+        return
+    
+    if chat_manager.is_sending:
+        update_status("請等待目前的回應完成後再開啟搜尋結果")
+        return
+    
+    results = chat_manager.search_messages(query)
+    update_status(f"找到 {len(results)} 條符合「{query}」的訊息")
+    if not results:
+        return
+    
+    parent = chat_display.winfo_toplevel()
+    dialog = tk.Toplevel(parent)
+    dialog.title(f"搜尋結果: {query}")
+    dialog.geometry("640x380")
+    dialog.transient(parent)
+    
+    listbox = tk.Listbox(dialog, font=(DEFAULT_FONT_FAMILY, 10), activestyle="none")
+    listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+    for result in results:
+        role = "您" if result["role"] == "user" else (result["model"] or "AI").split('/')[-1]
+        snippet = result["snippet"].replace("\n", " ")
+        listbox.insert(tk.END, f"[{result['timestamp']}] {role}: {snippet}  —  {result['session_title'] or ''}")
+    listbox.selection_set(0)
+    
+    def open_selected(event=None):
+        selection = listbox.curselection()
+        if not selection:
+            return
+        result = results[selection[0]]
+        dialog.destroy()
+        
+        chat_manager.open_session(result["session_id"], from_seq=result["seq"])
+        chat_manager.chat_view.show_history(start=0)
+        highlight_matches(chat_display, query)
+        update_status(f"已開啟會話: {result['session_title'] or result['session_id'][:8]}")
+    
+    listbox.bind("<Double-Button-1>", open_selected)
+    listbox.bind("<Return>", open_selected)
+    
+    button_frame = tk.Frame(dialog)
+    button_frame.pack(pady=(0, 10))
+    tk.Button(button_frame, text="開啟", width=8, font=(DEFAULT_FONT_FAMILY, 9),
+              command=open_selected).pack(side=tk.LEFT, padx=5)
+    tk.Button(button_frame, text="關閉", width=8, font=(DEFAULT_FONT_FAMILY, 9),
+              command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+    listbox.focus_set()
+
+def open_compare_window(chat_display, user_input_entry):
+    """開啟比較模式視窗，以輸入框中的內容作為預填問題"""
+    global chat_manager, selected_model, temperature_value
+    
+    placeholder_text = "歡迎使用AI聊天助手！請輸入您的問題。(按Enter發送，Shift+Enter換行)"
+    prompt = user_input_entry.get("1.0", "end-1c")
+    if prompt == placeholder_text:
+        prompt = ""
+    
+    from compare_window import CompareWindow
+    CompareWindow(
+        chat_display.winfo_toplevel(),
+        chat_manager,
+        selected_model.get(),
+        temperature_value.get(),
+        prompt=prompt,
+        update_status=update_status
+    )
 
 def send_message_handler(user_input_entry, chat_display, send_btn, clear_btn, stop_btn):
     """處理發送消息的操作"""
@@ -255,6 +448,9 @@ def send_message_handler(user_input_entry, chat_display, send_btn, clear_btn, st
     
     # 處理特殊命令
     if user_input.lower() == 'clear':
+        if chat_manager.is_sending:
+            update_status("請等待目前的回應完成後再清除歷史")
+            return
         clear_history_handler(chat_display)
     else:
         # 獲取當前選擇的模型ID和名稱
@@ -273,16 +469,19 @@ def send_message_handler(user_input_entry, chat_display, send_btn, clear_btn, st
 
 def create_gui():
     global selected_model, status_bar, temperature_value, font_scale_value
-    global chat_display, user_input_entry, send_btn, stop_btn, clear_btn, export_btn
+    global chat_display, user_input_entry, send_btn, stop_btn, clear_btn, export_btn, sessions_btn, compare_btn
     global model_label, temp_label, temp_value_label, temp_desc
     global font_size_label, font_size_radios, custom_size_entry, custom_size_label
-    global title_label, version_label, chat_manager, custom_size_var
+    global title_label, version_label, chat_manager, custom_size_var, stats_label, stats_export_btn
+    global search_label, search_entry, search_btn
     
     # 建立根視窗
     root = tk.Tk()
     root.title(f"AI 聊天助手 v{APP_VERSION}")
     root.geometry("770x810")
     root.minsize(540, 740)
+    # 創建控件期間先隱藏視窗，聊天區建好後才顯示（見下方deiconify）
+    root.withdraw()
     
     # 配置視窗自適應大小
     root.grid_rowconfigure(0, weight=0)  # 標題區域不需要擴展
@@ -298,8 +497,18 @@ def create_gui():
     font_scale_value = tk.DoubleVar(root)  # 字體縮放比例變量
     font_scale_value.set(0.8)  # 默認比例為0.8（小型）
     
+    # 創建UI調度器，背景線程的UI操作統一經由它在主線程執行
+    dispatcher = UiDispatcher(root)
+    dispatcher.start()
+    
+    # 創建對話存儲（寫入在背景線程進行，不阻塞介面）
+    store = ConversationStore() if STORE_CONFIG["enabled"] else None
+    
     # 創建聊天管理器
-    chat_manager = ChatManager(update_status_callback=update_status)
+    chat_manager = ChatManager(update_status_callback=update_status, dispatcher=dispatcher, store=store,
+                               update_stats_callback=update_stats)
+    # 切換模型時預先建立連接
+    selected_model.trace_add("write", lambda *args: chat_manager.prewarm())
     
     # 設置主題色彩
     bg_color = UI_COLORS["bg_color"]
@@ -343,6 +552,34 @@ def create_gui():
     chat_frame = tk.Frame(root, bg=bg_color)
     chat_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
     
+    # 搜尋列（搜尋已保存的會話）
+    search_frame = tk.Frame(chat_frame, bg=bg_color)
+    search_frame.pack(fill=tk.X, pady=(0, 5))
+    
+    search_label = tk.Label(search_frame, text="搜尋記錄:", bg=bg_color, font=(DEFAULT_FONT_FAMILY, 10))
+    search_label.pack(side=tk.LEFT)
+    
+    search_var = tk.StringVar()
+    search_entry = tk.Entry(search_frame, textvariable=search_var, font=(DEFAULT_FONT_FAMILY, 10))
+    search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 5))
+    search_entry.bind("<Return>", lambda e: search_handler(chat_display, search_var.get()))
+    
+    search_btn = tk.Button(
+        search_frame,
+        text="搜尋",
+        bg=UI_COLORS["sessions_btn_color"],
+        fg="white",
+        font=(DEFAULT_FONT_FAMILY, 10, "bold"),
+        borderwidth=1,
+        padx=10,
+        command=lambda: search_handler(chat_display, search_var.get())
+    )
+    search_btn.pack(side=tk.LEFT)
+    
+    if not store:
+        search_entry.config(state=tk.DISABLED)
+        search_btn.config(state=tk.DISABLED)
+    
     chat_display = scrolledtext.ScrolledText(chat_frame, wrap=tk.WORD, bg=text_bg, font=(DEFAULT_FONT_FAMILY, 10))
     chat_display.pack(fill=tk.BOTH, expand=True)
     
@@ -363,6 +600,16 @@ def create_gui():
     chat_display.tag_configure("assistant", foreground="#000000")
     chat_display.tag_configure("system", foreground="#6c757d", font=(DEFAULT_FONT_FAMILY, 9, "italic"))
     chat_display.tag_configure("error", foreground="#dc3545")
+    configure_markdown_tags(chat_display, 10)
+    # 搜索高亮在Markdown標籤之後創建，優先級較高（不被代碼背景蓋住）
+    chat_display.tag_configure("search_hit", background="#fff3b0")
+    
+    # 綁定渲染隊列與視窗化視圖（只保留視窗附近的消息，捲動時分頁載入）
+    chat_manager.attach_display(chat_display)
+    
+    # 標題與聊天區建好後即顯示視窗並完成佈局，再創建下方的控制面板，縮短首次繪製的時間
+    root.deiconify()
+    root.update_idletasks()
     
     # 創建模型選擇區域
     model_frame = tk.Frame(root, bg=bg_color, padx=15, pady=0)
@@ -636,15 +883,19 @@ def create_gui():
     
     # 設定按鍵綁定
     def handle_keypress(event):
-        # 如果是純Enter鍵（不是Shift+Enter），觸發發送
+        # 如果是純Enter鍵（不是Shift+Enter），觸發發送（請求本身會建立連接，不再預熱）
         if event.keysym == "Return" and not event.state & 0x1:
             send_message_handler(user_input_entry, chat_display, send_btn, clear_btn, stop_btn)
             return "break"  # 防止默認行為（插入換行）
+        # 用戶開始輸入時預先建立連接（已預熱時直接返回）
+        chat_manager.prewarm()
         # 如果是Shift+Enter，允許插入換行
-        elif event.keysym == "Return" and event.state & 0x1:
+        if event.keysym == "Return" and event.state & 0x1:
             return None  # 允許默認行為（插入換行）
     
     user_input_entry.bind("<KeyPress>", handle_keypress)
+    # Esc取消排隊中尚未發送的消息
+    user_input_entry.bind("<Escape>", lambda e: chat_manager.cancel_queued())
     
     # 創建一個框架用於按鈕的2x2網格排列
     button_area = tk.Frame(input_area, bg=bg_color)
@@ -655,6 +906,7 @@ def create_gui():
     button_area.columnconfigure(1, weight=1)
     button_area.rowconfigure(0, weight=1)
     button_area.rowconfigure(1, weight=1)
+    button_area.rowconfigure(2, weight=1)
     
     # 美化按鈕設計
     button_style = {"font": (DEFAULT_FONT_FAMILY, 10, "bold"), "borderwidth": 1, "relief": tk.RAISED, "padx": 10, "pady": 2}
@@ -698,6 +950,27 @@ def create_gui():
     )
     export_btn.grid(row=1, column=1, padx=2, pady=2, sticky="ew")
     
+    sessions_btn = tk.Button(
+        button_area,
+        text="歷史會話",
+        bg=UI_COLORS["sessions_btn_color"],
+        fg="white",
+        state=tk.NORMAL if store else tk.DISABLED,
+        command=lambda: open_sessions_dialog(chat_display),
+        **button_style
+    )
+    sessions_btn.grid(row=2, column=0, padx=2, pady=2, sticky="ew")
+    
+    compare_btn = tk.Button(
+        button_area,
+        text="比較模式",
+        bg=UI_COLORS["compare_btn_color"],
+        fg="white",
+        command=lambda: open_compare_window(chat_display, user_input_entry),
+        **button_style
+    )
+    compare_btn.grid(row=2, column=1, padx=2, pady=2, sticky="ew")
+    
     # 添加狀態欄
     status_bar = tk.Label(
         root,
@@ -711,6 +984,31 @@ def create_gui():
     )
     status_bar.grid(row=4, column=0, sticky="ew")
     
+    # 添加統計面板（最近一次請求的DNS/連接、首字延遲、吞吐量、token間隔與渲染延遲）
+    stats_frame = tk.Frame(root, bg=UI_COLORS["status_bg"])
+    stats_frame.grid(row=5, column=0, sticky="ew")
+    stats_frame.grid_columnconfigure(0, weight=1)
+    
+    stats_label = tk.Label(
+        stats_frame,
+        text="尚無請求統計",
+        fg=UI_COLORS["status_fg"],
+        bg=UI_COLORS["status_bg"],
+        anchor=tk.W,
+        padx=10,
+        font=(DEFAULT_FONT_FAMILY, 9)
+    )
+    stats_label.grid(row=0, column=0, sticky="ew")
+    
+    stats_export_btn = tk.Button(
+        stats_frame,
+        text="導出統計",
+        relief=tk.FLAT,
+        command=export_telemetry,
+        font=(DEFAULT_FONT_FAMILY, 9)
+    )
+    stats_export_btn.grid(row=0, column=1, padx=2)
+    
     # 設置按鈕命令
     send_btn.config(command=lambda: send_message_handler(user_input_entry, chat_display, send_btn, clear_btn, stop_btn))
     clear_btn.config(command=lambda: clear_history_handler(chat_display))
@@ -768,12 +1066,51 @@ def create_gui():
     
     return root
 
+def start_profiler():
+    """啟用性能分析：包裝發送與渲染的熱點路徑（須在創建GUI之前調用）
+    
+    Returns:
+        SessionProfiler實例
+    """
+    global update_font_size
+    import exporter
+    from profiler import SessionProfiler
+    profiler = SessionProfiler()
+    profiler.patch(ChatManager, "_send_message_async")
+    profiler.patch(ChatManager, "_on_message_received")
+    # 導出在背景線程中執行，分析實際的寫出而非等待用戶選擇檔案的export_history；
+    # run_export調用時才從模組取出函數，替換後即生效
+    profiler.patch(exporter, "export_messages")
+    # 界面中以全局名稱調用，替換後即生效
+    update_font_size = profiler.wrap(update_font_size)
+    return profiler
+
 def main():
     # 設置忽略警告
     setup_warnings()
     
+    # 可選的性能分析（環境變數AI_CHAT_PROFILE=1）
+    profiler = start_profiler() if profiling_enabled() else None
+    
     # 創建GUI
     root = create_gui()
+    if profiler:
+        profiler.watch_tk(root)
+    
+    # 關閉視窗時釋放連接池並停止背景事件循環
+    def on_close():
+        if chat_manager:
+            if chat_manager.dispatcher:
+                chat_manager.dispatcher.stop()
+            chat_manager.shutdown()
+        if profiler:
+            profiler.save()
+        root.destroy()
+    
+    root.protocol("WM_DELETE_WINDOW", on_close)
+    
+    # 視窗顯示後才在背景導入aiohttp並預先連接API伺服器，不延遲首次繪製
+    root.after(100, chat_manager.prewarm)
     
     # 啟動主循環
     root.mainloop()
@@ -0,0 +1,261 @@
+"""
+無界面的批次模式
+
+用法: python main.py --batch prompts.jsonl [--model 名稱] [--temperature 0.5]
+                     [--workers 4] [--output results.jsonl] [--api-url URL]
+
+輸入檔每行一個JSON對象，包含 "prompt"（字串）或 "messages"（消息列表），
+可選 "id"、"model"、"temperature"。輸入檔為 "-" 時從標準輸入讀取。
+結果寫入 --output 指定的JSONL檔，未指定時輸出到標準輸出。
+
+此模組不導入tkinter，只依賴ApiClient與共用的連接池會話。
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from api_client import ApiClient, create_pooled_session
+from token_budget import TokenBudget
+from response_cache import ResponseCache
+from config import MODELS, RESPONSE_CACHE_CONFIG
+
+DEFAULT_MODEL = "DeepSeek V3-0324"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py --batch", description="批次發送提示並輸出回應")
+    parser.add_argument("--batch", metavar="FILE", required=True, help="JSONL輸入檔，'-' 表示標準輸入")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="模型名稱（MODELS中的鍵）或模型ID")
+    parser.add_argument("--temperature", type=float, default=0.5, help="溫度值（默認0.5）")
+    parser.add_argument("--workers", type=int, default=4, help="同時進行的請求數（默認4）")
+    parser.add_argument("--output", metavar="FILE", help="結果JSONL檔，未指定時輸出到標準輸出")
+    parser.add_argument("--api-url", help="API端點，默認使用API_CONFIG中的設定")
+    return parser.parse_args(argv)
+
+
+def _parse_job(record, line_number, default_model, default_temperature):
+    """將輸入檔的一行記錄轉換為工作字典
+
+    Raises:
+        ValueError: 記錄格式不正確
+    """
+    if not isinstance(record, dict):
+        raise ValueError("每行須為JSON對象")
+    if "messages" in record:
+        messages = record["messages"]
+        if not isinstance(messages, list) or not messages:
+            raise ValueError('"messages" 須為非空列表')
+        for message in messages:
+            if not (isinstance(message, dict) and isinstance(message.get("role"), str)
+                    and isinstance(message.get("content"), str)):
+                raise ValueError('"messages" 中的每項須為包含字串 "role" 與 "content" 的對象')
+    elif "prompt" in record:
+        if not isinstance(record["prompt"], str):
+            raise ValueError('"prompt" 須為字串')
+        messages = [{"role": "user", "content": record["prompt"]}]
+    else:
+        raise ValueError('缺少 "prompt" 或 "messages"')
+    model = record.get("model", default_model)
+    if not isinstance(model, str):
+        raise ValueError('"model" 須為字串')
+    temperature = record.get("temperature", default_temperature)
+    if isinstance(temperature, bool) or not isinstance(temperature, (int, float)):
+        raise ValueError('"temperature" 須為數字')
+    return {
+        "id": record.get("id", line_number),
+        "model": MODELS.get(model, model),
+        "temperature": temperature,
+        "messages": messages,
+    }
+
+
+def load_jobs(path, default_model, default_temperature):
+    """讀取並檢查輸入檔
+
+    Returns:
+        元組 (工作字典列表，每項包含id、model、temperature、messages;
+              格式錯誤的行的說明列表，每項以 "檔案:行號:" 開頭)
+    """
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    name = "<stdin>" if path == "-" else path
+    jobs = []
+    errors = []
+    try:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                jobs.append(_parse_job(json.loads(line), line_number, default_model, default_temperature))
+            except json.JSONDecodeError as e:
+                errors.append(f"{name}:{line_number}: 不是有效的JSON: {e.msg}")
+            except ValueError as e:
+                errors.append(f"{name}:{line_number}: {e}")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return jobs, errors
+
+
+class BatchRunner:
+    """以固定數量的工作協程並行處理批次請求，所有請求共用一個連接池會話"""
+
+    def __init__(self, jobs, workers, output=None, stream_stdout=False, api_url=None):
+        """初始化批次執行器
+
+        Args:
+            jobs: load_jobs產生的工作列表
+            workers: 同時進行的請求數
+            output: 結果JSONL檔的檔案對象，為None時輸出可讀文字到標準輸出
+            stream_stdout: 輸出到標準輸出時是否即時顯示增量文字（只在單個工作協程時使用）
+            api_url: API端點，為None時使用API_CONFIG["api_url"]
+        """
+        self.jobs = jobs
+        self.workers = max(1, workers)
+        self.output = output
+        self.stream_stdout = stream_stdout
+        self.api_url = api_url
+        self.token_budget = TokenBudget()
+        self.response_cache = ResponseCache() if RESPONSE_CACHE_CONFIG["enabled"] else None
+        self.succeeded = 0
+        self.failed = 0
+
+    async def run(self):
+        """處理所有工作
+
+        Returns:
+            是否全部成功
+        """
+        queue = asyncio.Queue()
+        for job in self.jobs:
+            queue.put_nowait(job)
+
+        session = create_pooled_session()
+        try:
+            await asyncio.gather(*(self._worker(queue, session) for _ in range(self.workers)))
+        finally:
+            await session.close()
+            if self.response_cache:
+                self.response_cache.close()
+        return self.failed == 0
+
+    async def _worker(self, queue, session):
+        while not queue.empty():
+            job = queue.get_nowait()
+            # 單個工作的異常只記為失敗，不中止其他工作協程
+            try:
+                result = await self._run_job(job, session)
+            except Exception as e:
+                print(f"[{job['id']}] 處理失敗: {e}", file=sys.stderr)
+                result = self._error_result(job, e)
+            try:
+                self._write_result(result)
+            except Exception as e:
+                print(f"[{job['id']}] 寫入結果失敗: {e}", file=sys.stderr)
+                result["success"] = False
+            if result["success"]:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    async def _run_job(self, job, session):
+        """發送一個工作並記錄延遲"""
+        errors = []
+        start = time.perf_counter()
+        first_token_time = None
+
+        def handle_message(content):
+            nonlocal first_token_time
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+                if self.stream_stdout:
+                    sys.stdout.write(f"### [{job['id']}] {job['model'].split('/')[-1]}\n")
+            if self.stream_stdout:
+                sys.stdout.write(content)
+                sys.stdout.flush()
+
+        client = ApiClient(
+            on_message_callback=handle_message,
+            on_error_callback=errors.append,
+            session=session,
+            api_url=self.api_url,
+            response_cache=self.response_cache,
+            request_kind="batch"
+        )
+        messages, _, _ = self.token_budget.fit(job["messages"], job["model"])
+        success, response, status = await client.send_message(messages, job["model"], job["temperature"])
+        end = time.perf_counter()
+
+        if not success:
+            for error in errors:
+                print(f"[{job['id']}] {error}", file=sys.stderr)
+
+        return {
+            "id": job["id"],
+            "model": client.last_model,
+            "success": success,
+            "status": status,
+            "response": response,
+            "ttft": round(first_token_time - start, 3) if first_token_time else None,
+            "elapsed": round(end - start, 3),
+            "cache_hit": client.cache_hit,
+            "metrics": client.metrics,
+        }
+
+    def _error_result(self, job, error):
+        """工作拋出異常時寫入的結果"""
+        return {
+            "id": job["id"],
+            "model": job["model"],
+            "success": False,
+            "status": None,
+            "response": "",
+            "error": str(error),
+            "ttft": None,
+            "elapsed": None,
+            "cache_hit": False,
+            "metrics": None,
+        }
+
+    def _write_result(self, result):
+        if self.output is not None:
+            self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.output.flush()
+        elif self.stream_stdout:
+            sys.stdout.write("\n\n")
+        else:
+            sys.stdout.write(f"### [{result['id']}] {result['model'].split('/')[-1]}\n{result['response']}\n\n")
+        sys.stdout.flush()
+
+
+def main(argv=None):
+    """批次模式入口
+
+    Returns:
+        退出碼：全部成功為0，有請求失敗為1，輸入檔格式錯誤（不發送任何請求）為2
+    """
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    model = MODELS.get(args.model, args.model)
+    jobs, errors = load_jobs(args.batch, model, args.temperature)
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        print(f"輸入檔有 {len(errors)} 行格式錯誤，未發送任何請求", file=sys.stderr)
+        return 2
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    runner = BatchRunner(jobs, args.workers, output,
+                         stream_stdout=output is None and args.workers == 1, api_url=args.api_url)
+    start = time.perf_counter()
+    try:
+        success = asyncio.run(runner.run())
+    finally:
+        if output:
+            output.close()
+
+    print(f"完成 {runner.succeeded}/{len(jobs)} 個請求，失敗 {runner.failed} 個，"
+          f"耗時 {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0 if success else 1
@@ -0,0 +1,137 @@
+"""
+串流背壓基準測試
+
+以不限速的模擬串流發送回應，在收到部分回應後讓Tk主線程停頓（默認2秒），
+期間以背景線程取樣渲染隊列的積壓，比較：
+
+    有背壓   ChatManager的默認行為：渲染隊列或UI隊列超過上限時ApiClient暫停讀取串流
+    無背壓   不等待主線程，積壓隨網絡速度增長
+
+有背壓時積壓在停頓的後半段不再增長、最大值不超過上限加一次讀取的事件數，
+否則以非零狀態碼退出。需要Tk，沒有顯示器時嘗試使用Xvfb，否則跳過。
+
+用法: python bench/bench_backpressure.py [--stall 2] [--tokens 100000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+# 導入bench_suite時已關閉客戶端速率限制
+from bench_suite import start_display, run_tk_until
+from config import API_CONFIG
+from event_loop import BackgroundLoop
+from mock_sse_server import MockSSEServer
+
+MODEL = "deepseek-ai/DeepSeek-V3-0324"
+# 開始停頓前先收到的token數
+WARMUP_TOKENS = 200
+
+
+async def _no_wait():
+    return None
+
+
+def stall_once(root, chat_display, dispatcher, server, stall, backpressure):
+    """發送一條消息，在串流中途讓主線程停頓stall秒
+
+    Returns:
+        (積壓最大值, 停頓後半段的積壓增長, 停頓期間伺服器寫出的token數, 積壓是否有界)
+    """
+    from chat_manager import ChatManager
+
+    chat_manager = ChatManager(dispatcher=dispatcher)
+    chat_manager.attach_display(chat_display)
+    if not backpressure:
+        chat_manager._wait_for_ui = _no_wait
+    render_queue = chat_manager.render_queue
+
+    samples = []
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.is_set():
+            samples.append(render_queue.pending_count())
+            time.sleep(0.01)
+
+    try:
+        chat_manager.send_message("你好", chat_display, MODEL, 0.5, None, None, None, None)
+        if not run_tk_until(root, lambda: chat_manager.api_client is not None
+                            and len(chat_manager.api_client.response_parts) >= WARMUP_TOKENS, timeout=30):
+            raise RuntimeError("等待回應超時")
+
+        sent_before = server.tokens_sent
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        # 在主線程中阻塞，模擬長時間的重排或其他卡頓
+        time.sleep(stall)
+        sampling.set()
+        sampler.join()
+        sent_during = server.tokens_sent - sent_before
+
+        chat_manager.stop_response()
+        if not run_tk_until(root, lambda: not chat_manager.is_sending, timeout=30):
+            raise RuntimeError("停止後未恢復空閒")
+        render_queue.flush()
+    finally:
+        chat_manager.shutdown()
+
+    peak = max(samples)
+    growth = samples[-1] - samples[len(samples) // 2]
+    # 每次讀取（READ_SIZE）之後才等待，積壓最多超出上限一次讀取的事件數
+    bounded = peak <= render_queue.max_pending * 2 and growth <= 0
+    return peak, growth, sent_during, bounded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="串流背壓基準測試")
+    parser.add_argument("--stall", type=float, default=2.0, help="主線程停頓的秒數")
+    parser.add_argument("--tokens", type=int, default=100000, help="模擬回應的token數")
+    args = parser.parse_args()
+
+    xvfb, reason = start_display()
+    if reason:
+        print(f"跳過: {reason}")
+        return 0
+
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from ui_dispatcher import UiDispatcher
+
+    loop_runner = BackgroundLoop("MockServerLoop")
+    server = loop_runner.submit(MockSSEServer(tokens=args.tokens, tokens_per_chunk=8).start()).result()
+    API_CONFIG["api_url"] = server.url
+    root = tk.Tk()
+    dispatcher = UiDispatcher(root)
+    dispatcher.start()
+    ok = True
+    try:
+        for name, backpressure in (("有背壓", True), ("無背壓", False)):
+            chat_display = scrolledtext.ScrolledText(root)
+            chat_display.pack()
+            peak, growth, sent, bounded = stall_once(root, chat_display, dispatcher, server, args.stall,
+                                                     backpressure)
+            print(f"{name}: 停頓 {args.stall:.1f} s 期間渲染隊列積壓最大 {peak} 項, "
+                  f"後半段增長 {growth} 項, 伺服器寫出 {sent} 個token")
+            if backpressure:
+                ok = bounded
+            chat_display.destroy()
+    finally:
+        dispatcher.stop()
+        root.destroy()
+        loop_runner.submit(server.stop()).result()
+        loop_runner.stop()
+        if xvfb is not None:
+            xvfb.terminate()
+
+    print(f"有背壓時積壓保持有界: {'是' if ok else '否'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+取消回應的基準測試
+
+以慢速的模擬串流（默認每秒50個token）在收到部分回應後停止，測量：
+
+    ApiClient    從cancel()到send_message返回的時間、停止後是否仍有token輸出、
+                 伺服器多久後發現連接已關閉（停止生成）、停止後仍輸出的token數
+    ChatManager  從stop_response()到恢復空閒的時間，並檢查截斷的回應只加入聊天歷史一次
+                 （需要Tk，沒有顯示器時嘗試使用Xvfb，否則跳過）
+
+用法: python bench/bench_cancel.py [--rounds 10] [--rate 50]
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+# 導入bench_suite時已關閉客戶端速率限制
+from bench_suite import start_display, run_tk_until
+from config import API_CONFIG
+from event_loop import BackgroundLoop
+from api_client import ApiClient, create_pooled_session
+from mock_sse_server import MockSSEServer
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+MODEL = "deepseek-ai/DeepSeek-V3-0324"
+# 收到多少個token後停止
+STOP_AFTER = 20
+
+
+def summarize(name, samples, unit="ms"):
+    print(f"{name}: 中位數 {statistics.median(samples):.2f} {unit}, 最大 {max(samples):.2f} {unit}")
+
+
+def bench_api_client(loop_runner, server, rounds):
+    session = loop_runner.submit(_create_session()).result()
+    stop_to_return = []
+    disconnect = []
+    server_tokens_after = []
+    client_tokens_after = []
+    try:
+        for _ in range(rounds):
+            received = []
+            enough = threading.Event()
+
+            def on_message(content):
+                received.append(time.perf_counter())
+                if len(received) >= STOP_AFTER:
+                    enough.set()
+
+            client = ApiClient(on_message_callback=on_message, session=session, api_url=server.url)
+            future = loop_runner.submit(client.send_message(MESSAGES, MODEL))
+            enough.wait(30)
+
+            server.disconnect_time = None
+            sent_at_stop = server.tokens_sent
+            start = time.perf_counter()
+            client.cancel()
+            future.result(10)
+            stop_to_return.append((time.perf_counter() - start) * 1000)
+
+            # 等待伺服器的下一次寫入發現連接已關閉
+            time.sleep(0.3)
+            client_tokens_after.append(sum(1 for when in received if when > start))
+            server_tokens_after.append(server.tokens_sent - sent_at_stop)
+            if server.disconnect_time is not None:
+                disconnect.append((server.disconnect_time - start) * 1000)
+    finally:
+        loop_runner.submit(session.close()).result()
+
+    summarize("ApiClient 停止到返回", stop_to_return)
+    print(f"停止後仍顯示的token: 共 {sum(client_tokens_after)} 個（{rounds} 次）")
+    summarize("伺服器停止後仍輸出的token", server_tokens_after, "個")
+    if disconnect:
+        summarize(f"伺服器發現連接關閉（{len(disconnect)}/{rounds} 次）", disconnect)
+    else:
+        print("伺服器未發現連接關閉")
+
+
+async def _create_session():
+    return create_pooled_session()
+
+
+def bench_chat_manager(root, server, rounds):
+    from tkinter import scrolledtext
+    from chat_manager import ChatManager
+    from ui_dispatcher import UiDispatcher
+
+    API_CONFIG["api_url"] = server.url
+    dispatcher = UiDispatcher(root)
+    dispatcher.start()
+    chat_display = scrolledtext.ScrolledText(root)
+    chat_display.pack()
+    chat_manager = ChatManager(dispatcher=dispatcher)
+
+    stop_to_idle = []
+    committed = []
+    try:
+        for _ in range(rounds):
+            chat_manager.clear_history()
+            chat_manager.send_message("你好", chat_display, MODEL, 0.5, None, None, None, None)
+            run_tk_until(root, lambda: chat_manager.api_client is not None
+                         and len(chat_manager.api_client.response_parts) >= STOP_AFTER, timeout=30)
+
+            start = time.perf_counter()
+            chat_manager.stop_response()
+            if not run_tk_until(root, lambda: not chat_manager.is_sending, timeout=10):
+                raise RuntimeError("停止後未恢復空閒")
+            stop_to_idle.append((time.perf_counter() - start) * 1000)
+
+            replies = [message for message in chat_manager.get_history() if message["role"] == "assistant"]
+            committed.append(len(replies) == 1 and replies[0]["content"].endswith(" [回應被截斷]"))
+    finally:
+        chat_manager.shutdown()
+        dispatcher.stop()
+        chat_display.destroy()
+
+    summarize("ChatManager 停止到空閒", stop_to_idle)
+    print(f"截斷的回應恰好保存一次: {sum(committed)}/{rounds}")
+    return all(committed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="取消回應的基準測試")
+    parser.add_argument("--rounds", type=int, default=10, help="重複次數")
+    parser.add_argument("--rate", type=float, default=50, help="模擬串流每秒輸出的token數")
+    args = parser.parse_args()
+
+    loop_runner = BackgroundLoop("MockServerLoop")
+    server = loop_runner.submit(MockSSEServer(tokens=100000, token_rate=args.rate).start()).result()
+    ok = True
+    try:
+        bench_api_client(loop_runner, server, args.rounds)
+
+        xvfb, reason = start_display()
+        if reason:
+            print(f"跳過 ChatManager: {reason}")
+        else:
+            import tkinter as tk
+            root = tk.Tk()
+            try:
+                ok = bench_chat_manager(root, server, args.rounds)
+            finally:
+                root.destroy()
+                if xvfb is not None:
+                    xvfb.terminate()
+    finally:
+        loop_runner.submit(server.stop()).result()
+        loop_runner.stop()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+冷連接與熱連接的首個token延遲（TTFT）基準測試
+
+冷連接：每輪對話創建新的ApiClient與會話（舊行為）。
+熱連接：所有輪次共用create_pooled_session()創建的連接池會話。
+
+用法: python bench/bench_connection_reuse.py [輪數]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from config import API_CONFIG
+from api_client import ApiClient, create_pooled_session
+from mock_sse_server import MockSSEServer
+
+# 測試本身不應受客戶端速率限制影響
+API_CONFIG["max_concurrent_requests"] = 0
+API_CONFIG["rate_limits"] = {"default": {"requests_per_minute": 0, "tokens_per_minute": 0}}
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+async def measure_turn(url, session=None):
+    """發送一輪請求並返回首個token延遲（毫秒）"""
+    start = time.perf_counter()
+    first_token = []
+
+    def on_message(content):
+        if not first_token:
+            first_token.append(time.perf_counter())
+
+    client = ApiClient(on_message_callback=on_message, session=session, api_url=url)
+    try:
+        await client.send_message(MESSAGES, "mock-model")
+    finally:
+        await client.close_session()
+    return (first_token[0] - start) * 1000
+
+
+async def run(turns):
+    server = await MockSSEServer(tokens=20).start()
+    try:
+        cold = [await measure_turn(server.url) for _ in range(turns)]
+
+        session = create_pooled_session()
+        try:
+            # 第一輪建立連接，不計入熱連接結果
+            await measure_turn(server.url, session)
+            warm = [await measure_turn(server.url, session) for _ in range(turns)]
+        finally:
+            await session.close()
+    finally:
+        await server.stop()
+
+    for name, samples in (("冷連接", cold), ("熱連接", warm)):
+        print(f"{name}: 中位數 {statistics.median(samples):.2f} ms, "
+              f"平均 {statistics.mean(samples):.2f} ms, 最小 {min(samples):.2f} ms")
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    asyncio.run(run(turns))
@@ -0,0 +1,54 @@
+"""
+聊天記錄導出基準測試
+
+生成約50 MB的對話（以生成器逐條產生，不預先放入記憶體），導出為各種格式，
+記錄耗時、檔案大小及導出過程中Python記憶體分配的峰值。
+
+用法: python bench/bench_export.py [對話大小MB]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exporter import export_messages
+
+REPLY = "這是一段用於測試導出效能的模型回應，包含 code、說明與範例。\n" * 20
+
+
+def generate_messages(target_bytes):
+    """逐條產生消息，直到內容總量達到target_bytes"""
+    produced = 0
+    i = 0
+    while produced < target_bytes:
+        if i % 2 == 0:
+            message = {"role": "user", "content": f"第{i}個問題", "timestamp": "2025-01-01 12:00:00"}
+        else:
+            message = {"role": "assistant", "content": REPLY, "timestamp": "2025-01-01 12:00:05",
+                       "model": "deepseek-ai/DeepSeek-V3-0324"}
+        produced += len(message["content"].encode("utf-8"))
+        i += 1
+        yield message
+
+
+def run(size_mb):
+    target = size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("history.txt", "history.md", "history.jsonl", "history.txt.gz", "history.jsonl.gz"):
+            path = os.path.join(tmp, name)
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = export_messages(generate_messages(target), path)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:18s} {count} 條, {elapsed:6.2f} s, 檔案 {os.path.getsize(path) / 1024 / 1024:7.1f} MB, "
+                  f"記憶體峰值 {peak / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
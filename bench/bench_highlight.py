@@ -0,0 +1,184 @@
+"""
+代碼塊語法高亮基準測試
+
+以含多個代碼塊（默認40個，每個約40行）的長回應測量：
+
+    切分       每個代碼塊在工作線程中以pygments切分的耗時，即若在Tk主線程同步高亮
+               整條回應會阻塞主循環的時間
+    快取命中   重新插入相同代碼塊時主線程的成本（計算雜湊與查找快取）
+    Tk         捲動到頂部後可見代碼塊完成高亮的時間與主循環最長停頓；重繪後的快取命中數；
+               調整字體大小後高亮標籤保持不變；切分進行中停止後恢復空閒（沒有顯示器時
+               嘗試使用Xvfb，否則跳過）
+
+需要安裝pygments。
+用法: python bench/bench_highlight.py [--blocks 40] [--lines 40] [--no-tk]
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from bench_suite import start_display, run_tk_until
+from code_highlight import CodeHighlighter, CodeTokenizer, block_key, closed_blocks
+from markdown_render import MarkdownStream
+
+TEMPLATES = {
+    "python": [
+        "def handler_{n}_{i}(request, *args, **kwargs):",
+        "    \"\"\"處理第{i}個請求\"\"\"",
+        "    value = compute(request.data[{i}], factor=0.{i})  # 計算",
+        "    return {{\"id\": {n}, \"ok\": value is not None}}",
+    ],
+    "javascript": [
+        "function handler_{n}_{i}(request) {{",
+        "  const value = compute(request.data[{i}], 0.{i}); // 計算",
+        "  return {{ id: {n}, ok: value !== null, name: `item-{i}` }};",
+        "}}",
+    ],
+    "sql": [
+        "SELECT id, name, COUNT(*) AS total_{i}",
+        "FROM orders_{n} WHERE status = 'open' AND amount > {i}",
+        "GROUP BY id, name ORDER BY total_{i} DESC; -- 統計",
+        "",
+    ],
+}
+
+
+def make_reply(blocks, lines):
+    """生成含blocks個代碼塊、每塊約lines行的回應（各代碼塊內容不同）"""
+    parts = []
+    languages = list(TEMPLATES)
+    for n in range(blocks):
+        language = languages[n % len(languages)]
+        template = TEMPLATES[language]
+        code = [template[i % len(template)].format(n=n, i=i) for i in range(lines)]
+        parts.append(f"### 範例 {n}\n\n說明文字，第 {n} 個例子。\n\n```{language}\n" + "\n".join(code) + "\n```\n\n")
+    return "".join(parts)
+
+
+def bench_tokenize(reply):
+    blocks = closed_blocks(1, reply)
+    tokenizer = CodeTokenizer()
+    # 先導入pygments，不計入切分時間
+    tokenizer.tokenize("python", "x = 1\n")
+
+    durations = []
+    ranges = 0
+    for _, language, code in blocks:
+        start = time.perf_counter()
+        ranges += len(tokenizer.tokenize(language, code))
+        durations.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _, language, code in blocks:
+        block_key(language, code)
+    key_ms = (time.perf_counter() - start) * 1000
+
+    print(f"回應: {len(reply)} 個字元, {len(blocks)} 個代碼塊, {ranges} 個標籤範圍")
+    print(f"切分（工作線程）: 每塊平均 {sum(durations) / len(durations):.2f} ms, 最長 {max(durations):.2f} ms, "
+          f"同步高亮整條回應將阻塞主線程 {sum(durations):.1f} ms")
+    print(f"快取命中（主線程）: 全部代碼塊共 {key_ms:.2f} ms")
+
+
+def bench_tk(root, reply):
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from markdown_render import configure_markdown_tags
+
+    text_widget = scrolledtext.ScrolledText(root, height=40)
+    text_widget.pack()
+    configure_markdown_tags(text_widget, 12)
+    highlighter = CodeHighlighter(text_widget)
+    text_widget.configure(yscrollcommand=lambda first, last: highlighter.schedule())
+
+    def render():
+        text_widget.delete("1.0", tk.END)
+        args = []
+        for text, tags in MarkdownStream().segments(reply):
+            args.extend([text, tags])
+        text_widget.insert(tk.END, *args)
+        text_widget.see("1.0")
+
+    def measure(name):
+        stall = {"last": time.perf_counter(), "max": 0.0}
+
+        def tick():
+            now = time.perf_counter()
+            stall["max"] = max(stall["max"], now - stall["last"])
+            stall["last"] = now
+            stall["id"] = root.after(5, tick)
+
+        tick()
+        start = time.perf_counter()
+        render()
+        root.update_idletasks()
+        highlighter.schedule()
+        run_tk_until(root, lambda: time.perf_counter() - start > 0.1 and highlighter.is_idle(), timeout=30)
+        elapsed = (time.perf_counter() - start) * 1000
+        root.after_cancel(stall["id"])
+        done = len(text_widget.tag_ranges("hl_done")) // 2
+        print(f"{name}: {elapsed:.1f} ms 後完成 {done} 個代碼塊的高亮, 主循環最長停頓 {stall['max'] * 1000:.1f} ms")
+
+    measure("首次顯示")
+    misses = highlighter.misses
+    measure("重繪")
+    print(f"重繪後快取命中 {highlighter.hits} 次, 新增切分 {highlighter.misses - misses} 次")
+
+    before = len(text_widget.tag_ranges("hl_keyword"))
+    configure_markdown_tags(text_widget, 18)
+    root.update_idletasks()
+    unchanged = len(text_widget.tag_ranges("hl_keyword")) == before
+    print(f"調整字體大小後高亮標籤不變: {'是' if unchanged else '否'}")
+
+    # 切分進行中停止：未完成的代碼塊不應使高亮器一直處於忙碌狀態
+    highlighter.cache.clear()
+    render()
+    root.update_idletasks()
+    highlighter.schedule()
+    run_tk_until(root, lambda: highlighter._in_flight, timeout=5)
+    highlighter.stop()
+    leftover = [name for name in text_widget.mark_names() if name.startswith("hl_")]
+    idle = highlighter.is_idle() and not leftover
+    print(f"切分進行中停止後恢復空閒且沒有殘留標記: {'是' if idle else '否'}")
+    text_widget.destroy()
+    return idle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代碼塊語法高亮基準測試")
+    parser.add_argument("--blocks", type=int, default=40, help="代碼塊數")
+    parser.add_argument("--lines", type=int, default=40, help="每個代碼塊的行數")
+    parser.add_argument("--no-tk", action="store_true", help="跳過Tk測試")
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("pygments") is None:
+        print("未安裝pygments，語法高亮不可用")
+        return 1
+
+    reply = make_reply(args.blocks, args.lines)
+    bench_tokenize(reply)
+
+    if not args.no_tk:
+        xvfb, reason = start_display()
+        if reason:
+            print(f"跳過 Tk: {reason}")
+        else:
+            import tkinter as tk
+            root = tk.Tk()
+            try:
+                if not bench_tk(root, reply):
+                    return 1
+            finally:
+                root.destroy()
+                if xvfb is not None:
+                    xvfb.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+增量Markdown渲染基準測試
+
+以含標題、粗體、行內代碼、代碼塊與表格的長回應（默認10000個token）測量：
+
+    解析器   MarkdownStream逐token處理的吞吐量（背景線程的成本），並與「每個token
+             重新解析整條回應」的估算成本比較；同時檢查串流與一次性解析得到的格式一致
+    Tk渲染   經由RenderQueue寫入文字框並套用標籤的吞吐量與主循環最長停頓，
+             與不解析Markdown的純文字渲染比較（沒有顯示器時嘗試使用Xvfb，否則跳過）
+
+用法: python bench/bench_markdown.py [--tokens 10000] [--repeat 3] [--no-tk]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from bench_suite import start_display, run_tk_until
+from markdown_render import MarkdownStream, apply_line_tags
+
+SECTION = """## 第{n}節：實作說明
+
+這裡說明 **重要的設計決定**，並以 `parse_line()` 為例解釋增量解析的做法 🚀。
+每一行只在完成時解析一次，`feed` 的成本與回應長度成正比。
+
+```python
+def handle(chunk, state):
+    # 逐行處理，**這裡不是粗體**
+    for line in chunk.splitlines():
+        state.append(line.strip())
+    return state
+```
+
+| 方法 | 成本 | 說明 |
+|------|------|------|
+| 增量 | O(n) | 只處理 **新的一行** |
+
+### 小結
+
+最後再強調一次：`已渲染的文字` 不會被重新解析。
+
+"""
+
+
+def make_tokens(count):
+    """生成約count個token的Markdown回應，按約4個字元切分為token"""
+    tokens = []
+    section = 0
+    while len(tokens) < count:
+        section += 1
+        tokens.extend(re.findall(r"\s*\S{1,4}|\s+", SECTION.format(n=section)))
+    return tokens[:count]
+
+
+def stream_format(tokens):
+    """以串流方式解析並以finish結束，返回每個字元的標籤集合（用於與一次性解析比較）"""
+    stream = MarkdownStream()
+    pieces = []
+    for token in tokens:
+        pieces.extend(stream.feed(token))
+    pieces.extend(stream.finish())
+
+    chars = []
+    line_start = 0
+    for text, tags, spans in pieces:
+        for char in text:
+            chars.append(set(tags))
+        if spans:
+            for tag, first, last in spans:
+                end = len(chars) if last is None else line_start + last
+                for index in range(line_start + first, end):
+                    chars[index].add(tag)
+        if text.endswith("\n"):
+            line_start = len(chars)
+    return chars
+
+
+def whole_format(text):
+    """一次性解析，返回每個字元的標籤集合"""
+    chars = []
+    for segment, tags in MarkdownStream().segments(text):
+        chars.extend(set(tags) for _ in segment)
+    return chars
+
+
+def bench_parser(tokens, repeat):
+    text = "".join(tokens)
+    # 確認串流與一次性解析結果一致（不含BMP以外的字元時列號與字串位置相同；
+    # finish為未完成的最後一行補上換行，一次性解析的文字也以換行結束）
+    plain_tokens = [token.replace("🚀", "*") for token in tokens]
+    plain_text = "".join(plain_tokens)
+    if not plain_text.endswith("\n"):
+        plain_text += "\n"
+    consistent = stream_format(plain_tokens) == whole_format(plain_text)
+
+    samples = []
+    for _ in range(repeat):
+        stream = MarkdownStream()
+        calls = 0
+        start = time.perf_counter()
+        for token in tokens:
+            for _, _, spans in stream.feed(token):
+                if spans:
+                    calls += 1
+        samples.append(time.perf_counter() - start)
+    elapsed = statistics.median(samples)
+
+    # 每個token重新解析整條回應：平均每次解析一半長度的文字
+    start = time.perf_counter()
+    MarkdownStream().segments(text[:len(text) // 2])
+    reparse = (time.perf_counter() - start) * len(tokens)
+
+    print(f"回應: {len(tokens)} 個token, {len(text)} 個字元, {text.count(chr(10))} 行")
+    print(f"串流與一次性解析的格式一致: {'是' if consistent else '否'}")
+    print(f"增量解析: {elapsed * 1000:.1f} ms, {len(tokens) / elapsed:,.0f} tokens/s, "
+          f"需要設置標籤的行 {calls} 行")
+    print(f"每個token重新解析整條回應（估算）: {reparse * 1000:,.0f} ms, {len(tokens) / reparse:,.0f} tokens/s")
+    return consistent
+
+
+def bench_tk(root, tokens, repeat):
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from render_queue import RenderQueue
+    from markdown_render import configure_markdown_tags
+
+    text_widget = scrolledtext.ScrolledText(root)
+    text_widget.pack()
+    configure_markdown_tags(text_widget, 12)
+    total_chars = sum(len(token) for token in tokens)
+
+    def produce_plain(render_queue):
+        for token in tokens:
+            render_queue.push(token, "assistant")
+
+    def produce_markdown(render_queue):
+        # 與ChatManager._on_message_received相同的處理
+        stream = MarkdownStream()
+        for token in tokens:
+            for text, tags, spans in stream.feed(token):
+                render_queue.push(text, tags)
+                if spans:
+                    render_queue.push_call(apply_line_tags, text_widget, spans)
+
+    for name, produce in (("純文字", produce_plain), ("Markdown", produce_markdown)):
+        samples = []
+        stalls = []
+        for _ in range(repeat):
+            text_widget.delete("1.0", tk.END)
+            render_queue = RenderQueue(text_widget)
+            render_queue.start()
+
+            # 以5ms的定時器測量主循環的最長停頓
+            stall = {"last": time.perf_counter(), "max": 0.0}
+
+            def tick():
+                now = time.perf_counter()
+                stall["max"] = max(stall["max"], now - stall["last"])
+                stall["last"] = now
+                stall["id"] = root.after(5, tick)
+
+            tick()
+            producer = threading.Thread(target=produce, args=(render_queue,), daemon=True)
+            start = time.perf_counter()
+            producer.start()
+            run_tk_until(root, lambda: render_queue.chars >= total_chars and not render_queue._pending,
+                         timeout=120)
+            samples.append(time.perf_counter() - start)
+            root.after_cancel(stall["id"])
+            render_queue.stop()
+            producer.join()
+            stalls.append(stall["max"] * 1000)
+
+        elapsed = statistics.median(samples)
+        print(f"Tk渲染（{name}）: {elapsed * 1000:.1f} ms, {len(tokens) / elapsed:,.0f} tokens/s, "
+              f"主循環最長停頓 {statistics.median(stalls):.1f} ms")
+
+    bold = len(text_widget.tag_ranges("md_bold")) // 2
+    code = len(text_widget.tag_ranges("md_code")) // 2
+    print(f"已套用的標籤範圍: 粗體 {bold} 段, 代碼塊 {code} 段")
+    text_widget.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量Markdown渲染基準測試")
+    parser.add_argument("--tokens", type=int, default=10000, help="回應的token數")
+    parser.add_argument("--repeat", type=int, default=3, help="重複次數（取中位數）")
+    parser.add_argument("--no-tk", action="store_true", help="跳過Tk渲染測試")
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.tokens)
+    ok = bench_parser(tokens, args.repeat)
+
+    if not args.no_tk:
+        xvfb, reason = start_display()
+        if reason:
+            print(f"跳過 Tk渲染: {reason}")
+        else:
+            import tkinter as tk
+            root = tk.Tk()
+            try:
+                bench_tk(root, tokens, args.repeat)
+            finally:
+                root.destroy()
+                if xvfb is not None:
+                    xvfb.terminate()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+連接預熱基準測試
+
+比較新會話上第一個請求的首個token延遲（TTFT）：
+冷連接：直接發送請求，需要先建立連接。
+預熱：先以warm_up_connection建立連接（如用戶輸入時），再發送請求。
+
+本地模擬伺服器的連接成本很低；加上 --origin 時另外測量到真實API伺服器
+建立連接（DNS、TCP與TLS握手）所需的時間，即預熱可為每個請求省下的TTFT。
+該測量只發送HEAD請求，不消耗API額度。
+
+用法: python bench/bench_prewarm.py [--rounds 20] [--origin https://llm.chutes.ai]
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from config import API_CONFIG
+from api_client import ApiClient, create_pooled_session, warm_up_connection
+from mock_sse_server import MockSSEServer
+
+# 測試本身不應受客戶端速率限制影響
+API_CONFIG["max_concurrent_requests"] = 0
+API_CONFIG["rate_limits"] = {"default": {"requests_per_minute": 0, "tokens_per_minute": 0}}
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+async def first_request(url, prewarm):
+    """在新會話上發送一個請求
+
+    Returns:
+        (TTFT毫秒, 預熱報告的連接毫秒數, 請求是否重用連接)
+    """
+    session = create_pooled_session()
+    try:
+        saved_ms = await warm_up_connection(session, url) if prewarm else None
+        client = ApiClient(on_message_callback=lambda content: None, session=session, api_url=url)
+        await client.send_message(MESSAGES, "mock-model")
+        return client.metrics["ttft_ms"], saved_ms, client.metrics["connection_reused"]
+    finally:
+        await session.close()
+
+
+def summarize(name, samples):
+    print(f"{name}: 中位數 {statistics.median(samples):.2f} ms, 平均 {statistics.mean(samples):.2f} ms, "
+          f"最小 {min(samples):.2f} ms")
+
+
+async def run(rounds, origin):
+    server = await MockSSEServer(tokens=20).start()
+    try:
+        cold = [await first_request(server.url, False) for _ in range(rounds)]
+        warm = [await first_request(server.url, True) for _ in range(rounds)]
+    finally:
+        await server.stop()
+
+    summarize("冷連接TTFT", [ttft for ttft, _, _ in cold])
+    summarize("預熱後TTFT", [ttft for ttft, _, _ in warm])
+    reused = sum(1 for _, _, connection_reused in warm if connection_reused)
+    print(f"預熱後重用連接的請求: {reused}/{rounds}")
+    summarize("預熱建立連接", [saved for _, saved, _ in warm if saved is not None])
+
+    if origin:
+        samples = []
+        for _ in range(rounds):
+            session = create_pooled_session()
+            try:
+                saved_ms = await warm_up_connection(session, origin)
+            finally:
+                await session.close()
+            if saved_ms is not None:
+                samples.append(saved_ms)
+            # 避免過於頻繁地連接真實伺服器
+            await asyncio.sleep(0.2)
+        if samples:
+            summarize(f"{origin} 建立連接（預熱可省下的TTFT）", samples)
+        else:
+            print(f"無法連接到 {origin}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="連接預熱基準測試")
+    parser.add_argument("--rounds", type=int, default=20, help="每種情況的請求數")
+    parser.add_argument("--origin", help="另外測量到此伺服器建立連接的時間（只發送HEAD請求）")
+    args = parser.parse_args()
+    asyncio.run(run(args.rounds, args.origin))
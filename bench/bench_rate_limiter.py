@@ -0,0 +1,68 @@
+"""
+客戶端速率限制基準測試
+
+同時發出一批請求（模擬比較模式、批次任務或排隊消息的突發），比較有無
+速率限制時伺服器端每秒收到的請求數與並行數。
+
+用法: python bench/bench_rate_limiter.py [請求數] [每分鐘請求數]
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from api_client import ApiClient, RateLimiter, create_pooled_session
+from mock_sse_server import MockSSEServer
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+MODEL = "bench/model"
+
+
+async def burst(server, session, limiter, count):
+    """同時發出count個請求，返回總耗時"""
+    server.request_times.clear()
+    start = time.perf_counter()
+    clients = [ApiClient(session=session, api_url=server.url, rate_limiter=limiter) for _ in range(count)]
+    await asyncio.gather(*(client.send_message(MESSAGES, MODEL) for client in clients))
+    return time.perf_counter() - start
+
+
+def peak_per_second(times):
+    """任意1秒窗口內的最大請求數"""
+    times = sorted(times)
+    peak = 0
+    left = 0
+    for right, current in enumerate(times):
+        while current - times[left] > 1.0:
+            left += 1
+        peak = max(peak, right - left + 1)
+    return peak
+
+
+async def run(count, requests_per_minute):
+    server = await MockSSEServer(tokens=20, token_delay=0.01).start()
+    session = create_pooled_session()
+    try:
+        unlimited = RateLimiter(max_concurrent=0, rate_limits={})
+        limited = RateLimiter(
+            max_concurrent=4,
+            rate_limits={"default": {"requests_per_minute": requests_per_minute}},
+            burst_seconds=1
+        )
+        for name, limiter in (("不限制", unlimited), (f"{requests_per_minute}次/分鐘, 並行4", limited)):
+            elapsed = await burst(server, session, limiter, count)
+            print(f"{name}: {count} 個請求耗時 {elapsed:.2f}s, "
+                  f"每秒最多 {peak_per_second(server.request_times)} 個請求")
+    finally:
+        await session.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    requests_per_minute = int(sys.argv[2]) if len(sys.argv) > 2 else 600
+    asyncio.run(run(count, requests_per_minute))
@@ -0,0 +1,87 @@
+"""
+重試、退避與備用模型切換的故障注入測試
+
+對本地模擬伺服器注入429/5xx、斷線、停頓及串流中途斷開等故障，
+檢查ApiClient的重試次數、最終結果與是否出現重複文字。
+
+用法: python bench/bench_resilience.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from api_client import ApiClient
+from config import API_CONFIG
+from mock_sse_server import MockSSEServer
+
+TOKENS = 20
+MESSAGES = [{"role": "user", "content": "你好"}]
+PRIMARY = "primary/model"
+FALLBACK = "fallback/model"
+
+# (名稱, 故障列表, Retry-After, 是否配置備用模型, 預期成功, 預期請求數)
+SCENARIOS = [
+    ("正常回應", [], None, False, True, 1),
+    ("429後重試成功", [429], None, False, True, 2),
+    ("遵循Retry-After", [429], "0.3", False, True, 2),
+    ("連續5xx後成功", [503, 502, 500], None, False, True, 4),
+    ("斷線後重試", ["drop"], None, False, True, 2),
+    ("首字節超時後重試", ["stall"], None, False, True, 2),
+    ("400不重試", [400], None, False, False, 1),
+    ("重試耗盡", [503] * 4, None, False, False, 4),
+    ("重試耗盡後切換備用模型", [503] * 4, None, True, True, 5),
+    ("串流中途斷開不重試", ["cut"], None, False, False, 1),
+]
+
+
+async def run_scenario(name, faults, retry_after, use_fallback, expect_success, expect_requests):
+    server = await MockSSEServer(tokens=TOKENS, faults=faults, retry_after=retry_after,
+                                 token_delay=0.005, stall_time=1.0).start()
+    API_CONFIG["fallback_model"] = FALLBACK if use_fallback else None
+    received = []
+    retries = []
+    errors = []
+    client = ApiClient(
+        on_message_callback=received.append,
+        on_error_callback=errors.append,
+        on_retry_callback=lambda model, attempt, delay, reason: retries.append((attempt, delay, reason)),
+        api_url=server.url
+    )
+    start = time.perf_counter()
+    try:
+        success, response, status = await client.send_message(MESSAGES, PRIMARY)
+    finally:
+        await client.close_session()
+        await server.stop()
+    elapsed = time.perf_counter() - start
+
+    # 輸出的文字必須與返回的回應一致，且不超過一次完整回應
+    no_duplicate = "".join(received) == response and len(response) <= TOKENS
+    passed = (success == expect_success and server.request_count == expect_requests and no_duplicate)
+    print(f"{'通過' if passed else '失敗'}  {name}: 成功={success} 狀態={status} "
+          f"請求數={server.request_count} 重試={len(retries)} 文字長度={len(response)} "
+          f"模型={client.last_model} 耗時={elapsed:.2f}s")
+    if retry_after and retries:
+        print(f"      Retry-After={retry_after}，實際等待 {retries[0][1]:.2f}s")
+    return passed
+
+
+async def run():
+    API_CONFIG.update({
+        "retry_base_delay": 0.05,
+        "retry_max_delay": 1.0,
+        "first_byte_timeout": 0.5,
+        "idle_read_timeout": 0.5,
+    })
+    results = [await run_scenario(*scenario) for scenario in SCENARIOS]
+    print(f"\n{sum(results)}/{len(results)} 個場景通過")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
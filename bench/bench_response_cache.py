@@ -0,0 +1,60 @@
+"""
+回應快取基準測試
+
+對同一請求先發送一次（未命中，經由模擬伺服器串流），再重複發送（命中，
+從磁碟快取重播），比較總耗時並確認重播的增量片段與原串流一致。
+
+用法: python bench/bench_response_cache.py [重複次數]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from api_client import ApiClient, RateLimiter, create_pooled_session
+from response_cache import ResponseCache
+from mock_sse_server import MockSSEServer
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+MODEL = "bench/model"
+
+
+async def send(client):
+    deltas = []
+    client.on_message = deltas.append
+    start = time.perf_counter()
+    await client.send_message(MESSAGES, MODEL, temperature=0)
+    return (time.perf_counter() - start) * 1000, deltas
+
+
+async def run(repeats):
+    server = await MockSSEServer(tokens=200, token_delay=0.001).start()
+    session = create_pooled_session()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, "cache.db"))
+        client = ApiClient(session=session, api_url=server.url, response_cache=cache,
+                           rate_limiter=RateLimiter(max_concurrent=0, rate_limits={}))
+        try:
+            miss_ms, original = await send(client)
+            hits = [await send(client) for _ in range(repeats)]
+        finally:
+            await session.close()
+            await server.stop()
+            stats = cache.get_stats()
+            cache.close()
+
+    identical = all(deltas == original for _, deltas in hits)
+    print(f"未命中: {miss_ms:.2f} ms（{len(original)} 個片段）")
+    print(f"命中:   中位數 {statistics.median(ms for ms, _ in hits):.2f} ms，重播片段一致: {identical}")
+    print(f"伺服器請求數: {server.request_count}，統計: {stats}")
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    asyncio.run(run(repeats))
@@ -0,0 +1,80 @@
+"""
+全文搜尋基準測試
+
+在臨時數據庫中寫入大量消息（經由ConversationStore的正常寫入路徑，
+索引由觸發器增量建立），然後測量各類查詢（長詞、2字元與1字元的短詞、
+長短混合、無結果）的搜尋延遲。任一查詢的p95超出預算時以非零狀態碼退出。
+
+用法: python bench/bench_search.py [消息數] [--budget-ms 50]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore
+
+WORDS = ["模型", "回應", "串流", "資料庫", "索引", "python", "asyncio", "connection",
+         "事件循環", "效能", "tokenizer", "記憶體", "快取", "函式", "參數", "buffer"]
+QUERIES = ["事件循環", "python asyncio", "connection", "資料庫 索引", "tokenizer", "記憶體", "不存在的詞",
+           "罕見", "模型", "快", "快取 python", "模型 回應"]
+MODELS = ["deepseek-ai/DeepSeek-V3-0324", "Qwen/Qwen3-235B-A22B"]
+
+
+def populate(store, total, per_session=200, seed=0):
+    rng = random.Random(seed)
+    session_id = None
+    for i in range(total):
+        if i % per_session == 0:
+            session_id = store.create_session()
+        role = "user" if i % 2 == 0 else "assistant"
+        message = {"role": role, "content": " ".join(rng.choice(WORDS) for _ in range(40)),
+                   "timestamp": "2025-01-01 00:00:00"}
+        if role == "assistant":
+            message["model"] = rng.choice(MODELS)
+        store.append_message(session_id, message)
+    # 批量寫入遠超默認的等待時間
+    store.flush(timeout=600)
+
+
+def run(total, budget_ms):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ConversationStore(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        populate(store, total)
+        print(f"寫入並索引 {total} 條消息: {time.perf_counter() - start:.1f} s "
+              f"(全文索引: {'啟用' if store.search_enabled else '不可用'})")
+
+        over_budget = []
+        for query in QUERIES:
+            samples = []
+            for _ in range(20):
+                start = time.perf_counter()
+                results = store.search(query, limit=50)
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            print(f"「{query}」: {len(results)} 筆, 中位數 {statistics.median(samples):.2f} ms, p95 {p95:.2f} ms")
+            if p95 > budget_ms:
+                over_budget.append(query)
+        store.close()
+
+    if over_budget:
+        print(f"超出 {budget_ms} ms 預算: {'、'.join(over_budget)}")
+        return 1
+    print(f"所有查詢的p95均在 {budget_ms} ms 預算內")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全文搜尋基準測試")
+    parser.add_argument("total", nargs="?", type=int, default=100000, help="寫入的消息數")
+    parser.add_argument("--budget-ms", type=float, default=50, help="每個查詢p95延遲的預算（毫秒）")
+    args = parser.parse_args()
+    sys.exit(run(args.total, args.budget_ms))
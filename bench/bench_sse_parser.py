@@ -0,0 +1,112 @@
+"""
+SSE解析微基準測試
+
+比較舊的逐行解析（decode + strip + json.loads + 字符串拼接）與SSEParser
+在10k-token串流上的吞吐量。默認使用合成的錄製串流，也可傳入真實錄製的
+原始回應檔案（SSE位元組）。
+
+用法: python bench/bench_sse_parser.py [錄製檔案] [--repeat N]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sse_parser
+from sse_parser import SSEParser, parse_delta
+from mock_sse_server import make_chunk
+
+
+def synthesize_stream(tokens=10000, seed=0):
+    """生成模擬的10k-token錄製串流"""
+    rng = random.Random(seed)
+    words = ["的", "模型", " the", " stream", "```", "\n", " def", "回應", " token", "，"]
+    parts = [b": keep-alive\n\n"]
+    for _ in range(tokens):
+        parts.append(make_chunk(rng.choice(words)))
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def split_reads(raw, seed=0):
+    """按隨機大小切分，模擬網絡讀取"""
+    rng = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(raw):
+        size = rng.randint(32, 4096)
+        chunks.append(raw[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def legacy_parse(raw):
+    """舊實現：逐行處理並以字符串拼接累積"""
+    full_response = ""
+    for line in raw.splitlines(keepends=True):
+        line = line.decode("utf-8").strip()
+        if line.startswith("data: "):
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            data_json = json.loads(data)
+            content = data_json.get("choices", [{}])[0].get("delta", {}).get("content")
+            if content:
+                full_response += content
+    return full_response
+
+
+def incremental_parse(chunks):
+    """新實現：增量解析原始位元組塊並以列表累積"""
+    parser = SSEParser()
+    parts = []
+    for chunk in chunks:
+        for data in parser.feed(chunk):
+            if data == "[DONE]":
+                return "".join(parts)
+            content = parse_delta(data)
+            if content:
+                parts.append(content)
+    return "".join(parts)
+
+
+def timed(func, arg, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("recording", nargs="?", help="錄製的原始SSE回應檔案")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    if args.recording:
+        with open(args.recording, "rb") as f:
+            raw = f.read()
+    else:
+        raw = synthesize_stream()
+    chunks = split_reads(raw)
+    # 舊實現按行讀取，這裡預先傳入完整串流，不計入網絡切分的成本
+    legacy_time, legacy_text = timed(legacy_parse, raw, args.repeat)
+    new_time, new_text = timed(incremental_parse, chunks, args.repeat)
+    assert legacy_text == new_text, "解析結果不一致"
+
+    decoder = "orjson" if sse_parser.orjson else "json"
+    print(f"串流大小: {len(raw) / 1024:.1f} KB, 讀取塊數: {len(chunks)}")
+    print(f"舊實現: {legacy_time * 1000:.2f} ms")
+    print(f"SSEParser ({decoder}): {new_time * 1000:.2f} ms ({legacy_time / new_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+啟動導入時間基準測試
+
+以 python -X importtime 分別導入GUI入口（app）與批次模式入口（batch），
+報告總導入時間與耗時最多的模組，並檢查應延遲導入的模組沒有出現在
+GUI的啟動路徑中。超出時間預算或出現延遲模組時以非零狀態碼退出，
+可用於發現啟動時間的退化。
+
+用法: python bench/bench_startup.py [--runs 5] [--budget-ms 60]
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# GUI啟動時不應導入的模組（首次使用或視窗顯示後在背景導入）
+DEFERRED_MODULES = [
+    "aiohttp", "asyncio", "api_client", "response_cache",
+    "exporter", "gzip", "compare_window", "tkinter.filedialog", "pygments", "concurrent.futures",
+]
+
+
+def import_profile(module):
+    """在新的解釋器中導入模組並解析 -X importtime 輸出
+
+    Returns:
+        {模組名: (自身微秒, 累計微秒)}
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def report(module, runs, budget_ms, deferred):
+    profiles = [import_profile(module) for _ in range(runs)]
+    totals = [profile[module][1] / 1000 for profile in profiles]
+    median = statistics.median(totals)
+    print(f"{module}: 導入時間中位數 {median:.1f} ms（{runs} 次，最小 {min(totals):.1f} ms）")
+
+    slowest = sorted(profiles[-1].items(), key=lambda item: item[1][0], reverse=True)[:8]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"    {name:<32} 自身 {self_us / 1000:6.2f} ms  累計 {cumulative_us / 1000:6.2f} ms")
+
+    ok = median <= budget_ms
+    if not ok:
+        print(f"    超出預算 {budget_ms} ms")
+    loaded = [name for name in deferred if name in profiles[-1]]
+    if loaded:
+        print(f"    啟動路徑中出現應延遲導入的模組: {', '.join(loaded)}")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="啟動導入時間基準測試")
+    parser.add_argument("--runs", type=int, default=5, help="每個入口重複的次數")
+    parser.add_argument("--budget-ms", type=float, default=60, help="GUI入口的導入時間預算（毫秒）")
+    args = parser.parse_args()
+
+    ok = report("app", args.runs, args.budget_ms, DEFERRED_MODULES)
+    # 批次模式需要aiohttp，只檢查不導入tkinter
+    ok = report("batch", args.runs, float("inf"), ["tkinter"]) and ok
+    print("通過" if ok else "失敗")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
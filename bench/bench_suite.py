@@ -0,0 +1,371 @@
+"""
+串流性能基準測試套件
+
+以本地模擬的chat-completions伺服器（mock_sse_server.py）重播不同的token速率、
+數據塊大小與請求/回應大小，測量：
+
+    api_client    ApiClient.send_message 的解析吞吐量（tokens/s、MB/s、首字延遲）
+    chat_manager  ChatManager 從提交消息到首個token與全部回應顯示在文字框的延遲（需要Tk）
+    tk_render     RenderQueue 寫入Tk文字框的吞吐量與主循環最長停頓（需要Tk）
+
+需要Tk的測試在沒有顯示器時會嘗試啟動Xvfb，仍不可用時跳過並記錄原因。
+結果以JSON輸出，可用 --compare 與之前的提交的結果比較。不消耗API額度。
+
+用法: python bench/bench_suite.py [--scenario 名稱 ...] [--repeat 3] [--output results.json]
+                                  [--compare baseline.json] [--no-tk]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import datetime
+import threading
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("LLM_API_TOKEN", "cpk_" + "0" * 32)
+
+from config import API_CONFIG
+from event_loop import BackgroundLoop
+from api_client import ApiClient, create_pooled_session
+from mock_sse_server import MockSSEServer, make_chunk
+
+# 測試本身不應受客戶端速率限制影響
+API_CONFIG["max_concurrent_requests"] = 0
+API_CONFIG["rate_limits"] = {"default": {"requests_per_minute": 0, "tokens_per_minute": 0}}
+
+MODEL = "deepseek-ai/DeepSeek-V3-0324"
+
+# 場景：回應token數、每個token的文字、每次寫入的token數、每秒token數（None為不限速）、
+# 請求中對話歷史的大小（KB）
+SCENARIOS = {
+    "small_tokens": {"tokens": 5000, "token_text": "字", "tokens_per_chunk": 1, "token_rate": None, "history_kb": 0},
+    "chunked": {"tokens": 5000, "token_text": "字", "tokens_per_chunk": 32, "token_rate": None, "history_kb": 0},
+    "large_tokens": {"tokens": 2000, "token_text": "字節" * 32, "tokens_per_chunk": 1, "token_rate": None,
+                     "history_kb": 0},
+    "paced_100tps": {"tokens": 200, "token_text": "字", "tokens_per_chunk": 1, "token_rate": 100, "history_kb": 0},
+    "large_request": {"tokens": 500, "token_text": "字", "tokens_per_chunk": 1, "token_rate": None,
+                      "history_kb": 256},
+}
+
+
+def make_history(history_kb):
+    """生成約history_kb大小的對話歷史，最後一條為用戶提問"""
+    messages = []
+    paragraph = "這是用於測試的對話歷史內容。The quick brown fox jumps over the lazy dog. " * 40
+    size = 0
+    while size < history_kb * 1024:
+        role = "user" if len(messages) % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": paragraph})
+        size += len(paragraph.encode("utf-8"))
+    if messages and messages[-1]["role"] == "user":
+        messages.pop()
+    messages.append({"role": "user", "content": "請繼續"})
+    return messages
+
+
+def median_metrics(samples):
+    """各次運行的指標取中位數（忽略None）"""
+    result = {}
+    for field in samples[0]:
+        values = [sample[field] for sample in samples if sample[field] is not None]
+        result[field] = round(statistics.median(values), 3) if values else None
+    return result
+
+
+# ---- ApiClient 解析吞吐量 ----
+
+async def bench_api_client(url, scenario, repeat):
+    stream_bytes = len(make_chunk(scenario["token_text"])) * scenario["tokens"]
+    messages = make_history(scenario["history_kb"])
+    session = create_pooled_session()
+    samples = []
+    try:
+        # 第一次建立連接，不計入結果
+        for run in range(repeat + 1):
+            client = ApiClient(on_message_callback=lambda content: None, session=session, api_url=url)
+            start = time.perf_counter()
+            success, _, status = await client.send_message(messages, MODEL, 0.5)
+            elapsed = time.perf_counter() - start
+            if not success:
+                raise RuntimeError(f"請求失敗: {status}")
+            if run == 0:
+                continue
+            metrics = client.metrics
+            samples.append({
+                "total_ms": elapsed * 1000,
+                "ttft_ms": metrics["ttft_ms"],
+                "tokens_per_sec": metrics["tokens"] / elapsed,
+                "mb_per_sec": stream_bytes / elapsed / 1024 / 1024,
+                "gap_p95_ms": metrics["gap_p95_ms"],
+                "request_kb": metrics["request_bytes"] / 1024,
+            })
+    finally:
+        await session.close()
+    return median_metrics(samples)
+
+
+# ---- Tk（ChatManager端到端延遲、渲染吞吐量） ----
+
+def start_display():
+    """確保有可用的X顯示，沒有時嘗試啟動Xvfb
+
+    Returns:
+        (Xvfb進程或None, 不可用原因或None)
+    """
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return None, None
+    if not shutil.which("Xvfb"):
+        return None, "沒有顯示器且未安裝Xvfb"
+    display = ":97"
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1)
+    if process.poll() is not None:
+        return None, "Xvfb啟動失敗"
+    os.environ["DISPLAY"] = display
+    return process, None
+
+
+def run_tk_until(root, predicate, timeout):
+    """運行Tk主循環直到predicate()為真或超時
+
+    Returns:
+        是否在超時前完成
+    """
+    deadline = time.perf_counter() + timeout
+
+    def poll():
+        if predicate() or time.perf_counter() > deadline:
+            root.quit()
+        else:
+            root.after(1, poll)
+
+    root.after(1, poll)
+    root.mainloop()
+    return predicate()
+
+
+def bench_chat_manager(root, url, scenario, repeat):
+    from tkinter import scrolledtext
+    from chat_manager import ChatManager
+    from ui_dispatcher import UiDispatcher
+
+    # ChatManager內部的ApiClient使用默認端點
+    API_CONFIG["api_url"] = url
+    history = make_history(scenario["history_kb"])[:-1]
+
+    dispatcher = UiDispatcher(root)
+    dispatcher.start()
+    chat_display = scrolledtext.ScrolledText(root)
+    chat_display.pack()
+    completed = []
+    chat_manager = ChatManager(dispatcher=dispatcher,
+                               update_stats_callback=lambda text: completed.append(time.perf_counter()))
+    chat_manager.attach_display(chat_display)
+
+    # 記錄回應文字第一次寫入文字框的時間
+    render_queue = chat_manager.render_queue
+    insert_runs = render_queue._insert_runs
+    first_paint = []
+
+    def timed_insert_runs(runs):
+        # 回應文字的標籤為("assistant", ...)元組
+        if not first_paint and any(isinstance(tag, tuple) and "assistant" in tag for _, tag in runs):
+            first_paint.append(time.perf_counter())
+        insert_runs(runs)
+
+    render_queue._insert_runs = timed_insert_runs
+
+    samples = []
+    try:
+        for run in range(repeat + 1):
+            chat_manager.chat_history = list(history)
+            first_paint.clear()
+            completed.clear()
+            start = time.perf_counter()
+            chat_manager.send_message("請繼續", chat_display, MODEL, 0.5, None, None, None, None)
+            if not run_tk_until(root, lambda: completed, timeout=60):
+                raise RuntimeError("等待回應超時")
+            if run == 0:
+                continue
+            metrics = chat_manager.telemetry.records()[-1]
+            samples.append({
+                "first_paint_ms": (first_paint[0] - start) * 1000 if first_paint else None,
+                "complete_ms": (completed[0] - start) * 1000,
+                "network_ttft_ms": metrics["ttft_ms"],
+                "render_lag_max_ms": metrics["render_lag_max_ms"],
+            })
+    finally:
+        chat_manager.shutdown()
+        dispatcher.stop()
+        chat_display.destroy()
+    return median_metrics(samples)
+
+
+def bench_tk_render(root, scenario, repeat):
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from render_queue import RenderQueue
+
+    text_widget = scrolledtext.ScrolledText(root)
+    text_widget.pack()
+    token = scenario["token_text"]
+    total_chars = len(token) * scenario["tokens"]
+    chunk = scenario["tokens_per_chunk"]
+    delay = chunk / scenario["token_rate"] if scenario["token_rate"] else 0
+
+    def produce(render_queue):
+        for index in range(0, scenario["tokens"], chunk):
+            for _ in range(min(chunk, scenario["tokens"] - index)):
+                render_queue.push(token, "assistant")
+            if delay:
+                time.sleep(delay)
+
+    samples = []
+    for _ in range(repeat):
+        text_widget.delete("1.0", tk.END)
+        render_queue = RenderQueue(text_widget)
+        render_queue.start()
+
+        # 以5ms的定時器測量主循環的最長停頓
+        stall = {"last": time.perf_counter(), "max": 0.0}
+
+        def tick():
+            now = time.perf_counter()
+            stall["max"] = max(stall["max"], now - stall["last"])
+            stall["last"] = now
+            stall["id"] = root.after(5, tick)
+
+        tick()
+        producer = threading.Thread(target=produce, args=(render_queue,), daemon=True)
+        start = time.perf_counter()
+        producer.start()
+        run_tk_until(root, lambda: render_queue.chars >= total_chars, timeout=60)
+        elapsed = time.perf_counter() - start
+        root.after_cancel(stall["id"])
+        render_queue.stop()
+        producer.join()
+
+        stats = render_queue.get_stats()
+        samples.append({
+            "render_ms": elapsed * 1000,
+            "chars_per_sec": total_chars / elapsed,
+            "frames": stats["frames"],
+            "tokens_per_frame": stats["tokens_per_frame"],
+            "max_stall_ms": stall["max"] * 1000,
+            "render_lag_max_ms": render_queue.take_lag_stats()["render_lag_max_ms"],
+        })
+    text_widget.destroy()
+    return median_metrics(samples)
+
+
+# ---- 結果 ----
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    baseline_results = baseline["results"] if baseline else {}
+    for key, metrics in results.items():
+        print(key)
+        for field, value in metrics.items():
+            line = f"    {field:<20} {'-' if value is None else f'{value:.3f}':>12}"
+            old = baseline_results.get(key, {}).get(field)
+            if value is not None and old:
+                line += f"   基準 {old:.3f}（{(value - old) / old * 100:+.1f}%）"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="串流性能基準測試套件")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="只運行指定場景（可重複），默認全部")
+    parser.add_argument("--repeat", type=int, default=3, help="每項測試重複的次數（取中位數）")
+    parser.add_argument("--output", metavar="FILE", help="將結果寫入JSON檔")
+    parser.add_argument("--compare", metavar="FILE", help="與之前保存的JSON結果比較")
+    parser.add_argument("--no-tk", action="store_true", help="跳過需要Tk的測試")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    results = {}
+    skipped = {}
+
+    root = None
+    xvfb = None
+    if args.no_tk:
+        skipped["tk"] = "--no-tk"
+    else:
+        xvfb, reason = start_display()
+        if reason:
+            skipped["tk"] = reason
+        else:
+            import tkinter as tk
+            try:
+                root = tk.Tk()
+            except tk.TclError as e:
+                skipped["tk"] = f"無法創建Tk視窗: {e}"
+
+    server_loop = BackgroundLoop("MockServerLoop")
+    try:
+        for name in names:
+            scenario = SCENARIOS[name]
+            server = server_loop.submit(MockSSEServer(
+                tokens=scenario["tokens"], token_text=scenario["token_text"],
+                tokens_per_chunk=scenario["tokens_per_chunk"], token_rate=scenario["token_rate"]
+            ).start()).result()
+            try:
+                results[f"api_client/{name}"] = asyncio.run(bench_api_client(server.url, scenario, args.repeat))
+                if root is not None:
+                    results[f"chat_manager/{name}"] = bench_chat_manager(root, server.url, scenario, args.repeat)
+                    results[f"tk_render/{name}"] = bench_tk_render(root, scenario, args.repeat)
+            finally:
+                server_loop.submit(server.stop()).result()
+    finally:
+        server_loop.stop()
+        if root is not None:
+            root.destroy()
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = {
+        "version": 1,
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "scenarios": {name: SCENARIOS[name] for name in names},
+        "results": results,
+        "skipped": skipped,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"基準: {baseline.get('commit')}（{baseline.get('timestamp')}）")
+    print_results(results, baseline)
+    for name, reason in skipped.items():
+        print(f"跳過 {name}: {reason}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        print(f"結果已寫入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+請求編碼基準測試
+
+模擬一個多輪會話，比較每輪重新序列化整個歷史（舊行為：aiohttp的json=參數）
+與WireEncoder只編碼新追加消息的累計耗時。
+
+用法: python bench/bench_wire_format.py [輪數]
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wire_format import WireEncoder, to_wire_message
+
+REPLY = "這是一段模型回應的內容，包含程式碼與說明。" * 40
+
+
+def build_turns(turns):
+    """生成帶顯示欄位的聊天歷史"""
+    history = []
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for i in range(turns):
+        history.append({"role": "user", "content": f"第{i}個問題", "timestamp": now})
+        history.append({"role": "assistant", "content": REPLY, "timestamp": now, "model": "mock/model"})
+    return history
+
+
+def legacy_encode(messages):
+    body = {"model": "mock/model", "messages": messages, "stream": True,
+            "max_tokens": 10000, "temperature": 0.5}
+    return json.dumps(body).encode("utf-8")
+
+
+def run(turns):
+    history = build_turns(turns)
+
+    start = time.perf_counter()
+    legacy_bytes = 0
+    for i in range(1, turns + 1):
+        legacy_bytes = len(legacy_encode(history[:2 * i - 1]))
+    legacy_time = time.perf_counter() - start
+
+    encoder = WireEncoder()
+    start = time.perf_counter()
+    wire_bytes = 0
+    for i in range(1, turns + 1):
+        wire_bytes = len(encoder.encode_body(history[:2 * i - 1], "mock/model", 0.5, 10000))
+    wire_time = time.perf_counter() - start
+
+    # 驗證編碼結果與只含role/content的完整序列化一致
+    expected = [to_wire_message(m) for m in history[:2 * turns - 1]]
+    assert json.loads(encoder.encode_messages(history[:2 * turns - 1])) == expected
+
+    print(f"{turns} 輪會話，最後一輪請求: 舊 {legacy_bytes / 1024:.1f} KB, 新 {wire_bytes / 1024:.1f} KB")
+    print(f"每輪重新序列化: 累計 {legacy_time * 1000:.1f} ms")
+    print(f"WireEncoder: 累計 {wire_time * 1000:.1f} ms ({legacy_time / wire_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
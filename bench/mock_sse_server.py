@@ -0,0 +1,141 @@
+"""
+本地模擬的chat-completions串流伺服器
+
+以OpenAI相容的SSE格式回傳固定內容，供基準測試使用，不消耗API額度。
+"""
+
+import time
+import asyncio
+import json
+import argparse
+from aiohttp import web
+
+
+def make_chunk(content):
+    """建立單個SSE數據塊"""
+    payload = {"choices": [{"delta": {"content": content}}]}
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class MockSSEServer:
+    def __init__(self, tokens=50, token_text="字", token_delay=0.0, host="127.0.0.1", port=0,
+                 faults=None, retry_after=None, stall_time=5.0, tokens_per_chunk=1, token_rate=None):
+        """初始化模擬伺服器
+
+        Args:
+            tokens: 每次回應輸出的token數
+            token_text: 每個token的文字
+            token_delay: 相鄰token之間的延遲（秒）
+            host: 監聽地址
+            port: 監聽端口，0表示自動選擇
+            faults: 故障注入列表，每個請求按順序取出一項（用完後正常回應）：
+                HTTP狀態碼（如429、503）直接回傳該錯誤；"drop" 不回應即斷開連接；
+                "stall" 等待stall_time秒後才回應；"cut" 輸出一半token後斷開連接
+            retry_after: 錯誤回應附帶的Retry-After標頭值
+            stall_time: "stall" 故障的等待時間（秒）
+            tokens_per_chunk: 每次寫入（網絡數據塊）包含的token數
+            token_rate: 每秒輸出的token數，設置時取代token_delay
+        """
+        self.tokens = tokens
+        self.token_text = token_text
+        self.token_delay = 1 / token_rate if token_rate else token_delay
+        self.tokens_per_chunk = max(1, tokens_per_chunk)
+        self.host = host
+        self.port = port
+        self.request_count = 0
+        self.faults = list(faults or [])
+        self.retry_after = retry_after
+        self.stall_time = stall_time
+        # 每個請求的模型ID，用於驗證備用模型切換
+        self.models = []
+        # 每個請求到達的時間（time.perf_counter），用於檢查速率限制
+        self.request_times = []
+        # 已寫出的token總數，以及最近一次客戶端中途斷開的時間，用於檢查取消後伺服器是否停止輸出
+        self.tokens_sent = 0
+        self.disconnect_time = None
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    async def handle_chat(self, request):
+        """處理chat-completions請求"""
+        self.request_count += 1
+        self.request_times.append(time.perf_counter())
+        body = await request.read()
+        self.models.append(json.loads(body).get("model"))
+
+        fault = self.faults.pop(0) if self.faults else None
+        if isinstance(fault, int):
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return web.json_response({"error": {"message": f"模擬錯誤 {fault}"}}, status=fault, headers=headers)
+        if fault == "drop":
+            request.transport.close()
+            return web.Response()
+        if fault == "stall":
+            await asyncio.sleep(self.stall_time)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        event = make_chunk(self.token_text)
+        for index in range(0, self.tokens, self.tokens_per_chunk):
+            if fault == "cut" and index >= self.tokens // 2:
+                request.transport.close()
+                return response
+            count = min(self.tokens_per_chunk, self.tokens - index)
+            try:
+                await response.write(event * count)
+            except ConnectionResetError:
+                # 客戶端已關閉連接
+                self.disconnect_time = time.perf_counter()
+                return response
+            self.tokens_sent += count
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay * count)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self):
+        """啟動伺服器"""
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_chat)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # 取得實際監聽的端口
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        """停止伺服器"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve(args):
+    server = await MockSSEServer(tokens=args.tokens, token_text=args.token_text, token_rate=args.rate,
+                                 tokens_per_chunk=args.chunk, host=args.host, port=args.port).start()
+    print(f"模擬伺服器已啟動: {server.url}（按Ctrl+C停止）")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    # 獨立運行，例如讓批次模式以 --api-url 連接: python bench/mock_sse_server.py --port 8765 --rate 50
+    parser = argparse.ArgumentParser(description="本地模擬的chat-completions串流伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tokens", type=int, default=500, help="每次回應的token數")
+    parser.add_argument("--token-text", default="字", help="每個token的文字")
+    parser.add_argument("--rate", type=float, help="每秒輸出的token數，默認不限速")
+    parser.add_argument("--chunk", type=int, default=1, help="每次寫入包含的token數")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
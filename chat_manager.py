@@ -1,180 +1,461 @@
+import time
 import datetime
-import threading
-import asyncio
-import concurrent.futures
-from api_client import ApiClient
-from ui_utils import get_time_str, set_text_readonly_but_selectable
+from event_loop import BackgroundLoop
+from request_scheduler import RequestScheduler
+from render_queue import RenderQueue
+from chat_view import ChatView
+from markdown_render import MarkdownStream, apply_line_tags
+from token_budget import TokenBudget
+from wire_format import WireEncoder
+from telemetry import Telemetry, format_metrics
+from config import API_CONFIG, STORE_CONFIG, RESPONSE_CACHE_CONFIG
+from ui_utils import get_time_str
 import tkinter as tk
 
 class ChatManager:
-    def __init__(self, update_status_callback=None):
+    def __init__(self, update_status_callback=None, dispatcher=None, store=None, scheduler=None,
+                 update_stats_callback=None):
         """初始化聊天管理器
         
         Args:
             update_status_callback: 更新狀態欄的回調函數
+            dispatcher: UiDispatcher實例，背景線程的UI操作經由它在主線程執行
+            store: ConversationStore實例，為None時不持久化對話
+            scheduler: 多個對話共用的RequestScheduler，為None時自行創建
+            update_stats_callback: 每個請求完成後以指標摘要文字調用的回調函數（主線程）
         """
         self.chat_history = []
         self.is_sending = False
         self.task_cancelled = False
         self.current_task = None
         self.update_status = update_status_callback
+        self.dispatcher = dispatcher
         
         # 創建API客戶端
         self.api_client = None
+        
+        # 常駐的背景事件循環與共用的連接池會話
+        self.loop_runner = scheduler.loop_runner if scheduler else BackgroundLoop()
+        self.session = None
+        
+        # 請求調度：回應串流期間提交的消息排隊，空出名額時立即發送
+        self.scheduler = scheduler or RequestScheduler(self.loop_runner)
+        self.ui_elements = None
+        
+        # 聊天顯示區的渲染隊列與視窗化視圖
+        self.render_queue = None
+        self.chat_view = None
+        # 當前回應的增量Markdown解析狀態
+        self.markdown = None
+        
+        # 上下文預算管理
+        self.token_budget = TokenBudget()
+        
+        # 請求編碼器，快取已編碼的歷史消息
+        self.wire_encoder = WireEncoder()
+        
+        # 對話持久化
+        self.store = store
+        
+        # 回應快取（默認關閉）
+        self.response_cache = None
+        if RESPONSE_CACHE_CONFIG["enabled"]:
+            from response_cache import ResponseCache
+            self.response_cache = ResponseCache()
+        self.session_id = None
+        self.has_more_history = False
+        
+        # 每個請求的延遲與吞吐量指標
+        self.telemetry = Telemetry()
+        self.update_stats = update_stats_callback
+        
+        # 連接預熱：上次預熱或請求的時間，以及最近一次預熱建立連接所用的毫秒數
+        self._last_connection_use = float("-inf")
+        self._prewarm_saved_ms = None
     
     def get_history(self):
         """獲取聊天歷史"""
         return self.chat_history
     
     def clear_history(self):
-        """清除聊天歷史"""
+        """清除聊天歷史（已存儲的會話保留，下一條消息開始新會話）"""
         self.chat_history = []
+        self.wire_encoder.reset()
+        self.session_id = None
+        self.has_more_history = False
+    
+    def _append_history(self, message):
+        """追加消息到聊天歷史，並寫入對話存儲"""
+        if self.store:
+            if self.session_id is None:
+                self.session_id = self.store.create_session()
+            message["seq"] = self.store.append_message(self.session_id, message)
+        self.chat_history.append(message)
+    
+    def list_sessions(self, limit=100):
+        """列出已存儲的會話"""
+        if not self.store or self.store.error is not None:
+            return []
+        return self.store.list_sessions(limit)
+    
+    def search_messages(self, query, limit=50):
+        """在已存儲的所有會話中搜尋消息"""
+        if not self.store or self.store.error is not None:
+            return []
+        return self.store.search(query, limit)
+    
+    def open_session(self, session_id, from_seq=None):
+        """開啟已存儲的會話，只載入最近的消息
+        
+        Args:
+            session_id: 會話ID
+            from_seq: 從此序號開始載入到最新（用於定位搜尋結果），None表示只載入最近的消息
+        
+        Returns:
+            載入的消息列表
+        """
+        if from_seq is None:
+            messages, has_more = self.store.load_messages(session_id, STORE_CONFIG["initial_messages"])
+        else:
+            messages, has_more = self.store.load_messages_from(session_id, from_seq)
+        self.chat_history = messages
+        self.wire_encoder.reset()
+        self.session_id = session_id
+        # 在寫入線程預先讀取會話的下一個序號，之後追加消息時不需讀取數據庫
+        self.store.resume_session(session_id)
+        self.has_more_history = has_more
+        return messages
+    
+    def load_older_messages(self):
+        """載入當前會話中更早的一頁消息並加到歷史開頭
+        
+        Returns:
+            新載入的消息列表
+        """
+        if not (self.store and self.session_id and self.has_more_history and self.chat_history):
+            return []
+        older, has_more = self.store.load_messages(
+            self.session_id, STORE_CONFIG["page_size"], before_seq=self.chat_history[0]["seq"]
+        )
+        self.chat_history = older + self.chat_history
+        self.has_more_history = has_more
+        return older
+    
+    def get_export_source(self):
+        """獲取導出用的消息來源（可在背景線程調用）
+        
+        開啟的會話只載入了部分消息時，從對話存儲逐頁讀取完整會話。
+        
+        Returns:
+            元組 (消息的可迭代對象, 消息總數)
+        """
+        if self.store and self.session_id and self.has_more_history:
+            session_id = self.session_id
+            self.store.flush()
+            return self.store.iter_messages(session_id), self.store.count_messages(session_id)
+        snapshot = list(self.chat_history)
+        return snapshot, len(snapshot)
+    
+    def message_segments(self, message):
+        """將一條歷史消息轉換為顯示用的(文字, 標籤)片段列表"""
+        time_str = message.get("timestamp", "")[-8:] or get_time_str()
+        if message["role"] == "user":
+            return [
+                (f"[{time_str}] ", "time"),
+                ("您:\n", "user_header"),
+                (f"{message['content']}\n\n", "user")
+            ]
+        return [
+            (f"[{time_str}] ", "time"),
+            (f"{message.get('model', 'AI').split('/')[-1]}:\n", "assistant_header"),
+            *MarkdownStream().segments(f"{message['content']}\n\n")
+        ]
+    
+    async def _get_session(self):
+        """獲取共用會話（在背景事件循環中調用）"""
+        if self.session is None or self.session.closed:
+            # aiohttp導入較慢，延遲到背景線程首次需要會話時才導入
+            from api_client import create_pooled_session
+            self.session = create_pooled_session()
+        return self.session
+    
+    async def _close_session(self):
+        """關閉共用會話"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+    
+    def prewarm(self):
+        """在背景線程預先建立或刷新到API伺服器的連接（主線程調用）
+        
+        視窗顯示後、用戶開始輸入或切換模型時調用，按Enter時連接已就緒。
+        請求進行中、或距離上次預熱或請求不到API_CONFIG["prewarm_interval"]秒時
+        不重複預熱；閒置的連接由連接池在keepalive_timeout後關閉。
+        """
+        now = time.monotonic()
+        if self.is_sending or now - self._last_connection_use < API_CONFIG["prewarm_interval"]:
+            return
+        self._last_connection_use = now
+        self.loop_runner.submit(self._prewarm())
+    
+    async def _prewarm(self):
+        # 首次調用時在背景線程導入網絡模組
+        from api_client import warm_up_connection
+        saved_ms = await warm_up_connection(await self._get_session(), API_CONFIG["api_url"])
+        if saved_ms:
+            self._prewarm_saved_ms = saved_ms
+    
+    def attach_display(self, chat_display):
+        """綁定聊天顯示區，創建渲染隊列與視窗化視圖（主線程調用）
+        
+        Returns:
+            ChatView實例
+        """
+        if self.render_queue is None or self.render_queue.text_widget is not chat_display:
+            if self.render_queue:
+                self.render_queue.stop()
+                self.chat_view.highlighter.stop()
+            self.render_queue = RenderQueue(chat_display)
+            self.render_queue.start()
+            self.chat_view = ChatView(chat_display, self, self.render_queue)
+        return self.chat_view
+    
+    def get_render_stats(self):
+        """獲取渲染吞吐量統計"""
+        return self.render_queue.get_stats() if self.render_queue else {}
+    
+    def _run_on_ui(self, func, *args):
+        """在Tk主線程執行UI操作"""
+        if self.dispatcher:
+            self.dispatcher.call(func, *args)
+        else:
+            func(*args)
+    
+    def _set_status(self, message):
+        """更新狀態欄（連續的狀態更新只保留最新一次）"""
+        if not self.update_status:
+            return
+        if self.dispatcher:
+            self.dispatcher.call_coalesced("status", self.update_status, message)
+        else:
+            self.update_status(message)
+    
+    def _set_controls_state(self, ui_elements, sending):
+        """切換輸入框與按鈕狀態（主線程調用）
+        
+        Args:
+            ui_elements: 包含user_input_entry、send_btn、clear_btn、stop_btn的字典
+            sending: 是否處於發送中
+        """
+        # 發送中仍可輸入並提交新消息（進入隊列），只禁止清除歷史
+        if ui_elements.get('clear_btn'):
+            ui_elements['clear_btn'].config(state=tk.DISABLED if sending else tk.NORMAL)
+        if ui_elements.get('stop_btn'):
+            ui_elements['stop_btn'].config(state=tk.NORMAL if sending else tk.DISABLED)
+        
+        # 結束發送後讓輸入框重新獲得焦點
+        if not sending and ui_elements.get('user_input_entry'):
+            ui_elements['user_input_entry'].focus_set()
     
     def _on_message_received(self, content, chat_display):
-        """收到消息時的處理函數"""
-        chat_display.config(state=tk.NORMAL)
-        chat_display.insert(tk.END, content, "assistant")
-        chat_display.see(tk.END)
-        set_text_readonly_but_selectable(chat_display)
+        """收到消息時的處理函數（背景線程調用）
+        
+        文字立即放入渲染隊列；每完成一行，緊接著放入只針對該行的Markdown標籤設置。
+        """
+        self._push_markdown(self.markdown.feed(content))
+    
+    def _push_markdown(self, pieces):
+        """將MarkdownStream產生的片段與行標籤設置放入渲染隊列"""
+        for text, tags, spans in pieces:
+            self.render_queue.push(text, tags)
+            if spans:
+                self.render_queue.push_call(apply_line_tags, self.render_queue.text_widget, spans)
+    
+    def _push_cancel_notice(self):
+        """結束被取消的回應：先為未完成的最後一行套用格式，再顯示取消提示"""
+        self._push_markdown(self.markdown.finish())
+        self.render_queue.push("[回應已取消]\n\n", "system")
     
     def _on_error_received(self, error_message, chat_display):
         """收到錯誤時的處理函數"""
-        chat_display.config(state=tk.NORMAL)
-        chat_display.insert(tk.END, f"\n{error_message}\n", "error")
-        chat_display.see(tk.END)
-        set_text_readonly_but_selectable(chat_display)
-        
-        if self.update_status:
-            self.update_status(f"錯誤: {error_message[:50]}")
+        self.render_queue.push(f"\n{error_message}\n", "error")
+        self._set_status(f"錯誤: {error_message[:50]}")
+    
+    def _on_retry(self, model_id, attempt, delay, reason):
+        """請求失敗、即將重試時的處理函數"""
+        self._set_status(f"{model_id.split('/')[-1]} {reason}，{delay:.1f} 秒後進行第 {attempt} 次重試")
+    
+    def _on_throttle(self, model_id, delay):
+        """因速率限制延後發送時的處理函數"""
+        self._set_status(f"已達 {model_id.split('/')[-1]} 的速率限制，{delay:.1f} 秒後發送")
+    
+    def _on_failover(self, model_id, fallback_id):
+        """切換到備用模型時的處理函數"""
+        self.render_queue.push(
+            f"[{model_id.split('/')[-1]} 暫時無法回應，改用 {fallback_id.split('/')[-1]}]\n", "system"
+        )
+        self._set_status(f"已切換至備用模型 {fallback_id.split('/')[-1]}")
     
     def _on_request_done(self):
         """請求完成時的處理函數"""
-        if self.update_status and not self.task_cancelled:
-            self.update_status("就緒")
+        if not self.task_cancelled:
+            self._set_status("就緒")
+    
+    def _record_metrics(self, metrics):
+        """補充渲染延遲後記錄指標並更新統計面板（經由渲染隊列在主線程執行）"""
+        metrics.update(self.render_queue.take_lag_stats())
+        # 預熱後的第一個請求重用了連接時，記錄預熱省下的連接時間
+        if not metrics["cached"]:
+            if metrics["connection_reused"] and self._prewarm_saved_ms:
+                metrics["prewarm_saved_ms"] = self._prewarm_saved_ms
+            self._prewarm_saved_ms = None
+        self.telemetry.add(metrics)
+        if self.update_stats:
+            self.update_stats(format_metrics(metrics, self.telemetry.summary()))
     
-    async def _send_message_async(self, user_input, chat_display, model_id, temperature, 
-                                user_input_entry, send_btn, clear_btn, stop_btn):
-        """異步發送消息
+    async def _send_message_async(self, user_input, chat_display, model_id, temperature):
+        """異步發送消息（由調度器在輪到此請求時啟動）
         
         Args:
             user_input: 用戶輸入的消息
             chat_display: 聊天顯示區域
             model_id: 模型ID
             temperature: 溫度值
-            user_input_entry, send_btn, clear_btn, stop_btn: UI元素
         """
+        import asyncio
+        
         # 設置發送狀態
-        self.is_sending = True
         self.task_cancelled = False
-        
-        # 存儲UI元素引用，以便停止時使用
-        self.current_ui_elements = {
-            'user_input_entry': user_input_entry,
-            'send_btn': send_btn,
-            'clear_btn': clear_btn,
-            'stop_btn': stop_btn
-        }
-        
-        # 禁用UI元素
-        user_input_entry.config(state=tk.DISABLED)
-        send_btn.config(state=tk.DISABLED)
-        clear_btn.config(state=tk.DISABLED)
-        stop_btn.config(state=tk.NORMAL)
+        self.current_task = asyncio.current_task()
         
         try:
             # 獲取當前時間
             current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             # 添加用戶消息到聊天歷史
-            self.chat_history.append({"role": "user", "content": user_input, "timestamp": current_time})
+            user_message = {"role": "user", "content": user_input, "timestamp": current_time}
+            self._append_history(user_message)
             
             # 在UI中顯示用戶消息
             time_str = get_time_str()
-            chat_display.config(state=tk.NORMAL)
-            chat_display.insert(tk.END, f"[{time_str}] ", "time")
-            chat_display.insert(tk.END, f"您:\n", "user_header")
-            chat_display.insert(tk.END, f"{user_input}\n\n", "user")
-            chat_display.see(tk.END)
-            set_text_readonly_but_selectable(chat_display)
-            
-            # 創建API客戶端並設置回調
-            self.api_client = ApiClient(
-                on_message_callback=lambda content: self._on_message_received(content, chat_display),
-                on_error_callback=lambda error: self._on_error_received(error, chat_display),
-                on_done_callback=self._on_request_done
-            )
+            self.render_queue.push_call(self.chat_view.start_block, user_message)
+            self.render_queue.push(f"[{time_str}] ", "time")
+            self.render_queue.push(f"您:\n", "user_header")
+            self.render_queue.push(f"{user_input}\n\n", "user")
             
-            # 顯示AI回應的開始
+            # 顯示AI回應的開始（回應完成後才加入聊天歷史）。在第一次await之前準備好，
+            # 之後任何時候被取消都能保存已收到的部分並顯示取消提示
             time_str = get_time_str()
             response_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            chat_display.config(state=tk.NORMAL)
-            chat_display.insert(tk.END, f"[{time_str}] ", "time")
-            chat_display.insert(tk.END, f"{model_id.split('/')[-1]}:\n", "assistant_header")
-            chat_display.see(tk.END)
-            set_text_readonly_but_selectable(chat_display)
+            assistant_message = {"role": "assistant", "content": "", "timestamp": response_time, "model": model_id}
+            self.render_queue.push_call(self.render_queue.reset_lag_stats)
+            self.render_queue.push_call(self.chat_view.start_block, assistant_message)
+            self.render_queue.push(f"[{time_str}] ", "time")
+            self.render_queue.push(f"{model_id.split('/')[-1]}:\n", "assistant_header")
+            self.markdown = MarkdownStream()
+            client = None
             
-            # 更新狀態欄
-            if self.update_status:
+            try:
+                # 創建API客戶端並設置回調
+                from api_client import ApiClient, CANCELLED_STATUS
+                session = await self._get_session()
+                client = self.api_client = ApiClient(
+                    on_message_callback=lambda content: self._on_message_received(content, chat_display),
+                    on_error_callback=lambda error: self._on_error_received(error, chat_display),
+                    on_done_callback=self._on_request_done,
+                    session=session,
+                    wire_encoder=self.wire_encoder,
+                    on_retry_callback=self._on_retry,
+                    on_failover_callback=self._on_failover,
+                    on_throttle_callback=self._on_throttle,
+                    response_cache=self.response_cache,
+                    wait_for_capacity=self._wait_for_ui
+                )
+                
+                # 截斷超出模型上下文預算的舊消息
+                messages, estimated_tokens, dropped = self.token_budget.fit(self.chat_history, model_id)
+                payload = client.build_request_body(messages, model_id, temperature)
+                
+                # 更新狀態欄
                 model_name = model_id.split('/')[-1]
-                self.update_status(f"正在使用 {model_name} 處理請求，溫度: {temperature:.2f}")
+                unchanged = self.wire_encoder.unchanged_prefix_bytes
+                status = (f"正在使用 {model_name} 處理請求，溫度: {temperature:.2f}，"
+                          f"約 {estimated_tokens} tokens / {len(payload) / 1024:.1f} KB"
+                          f"（前綴未變 {unchanged * 100 // len(payload)}%）")
+                if dropped:
+                    status += f"，已省略最早的 {dropped} 條消息"
+                self._set_status(status)
+                
+                # UI隊列積壓時先讓主線程追上
+                await self._wait_for_ui()
+                
+                # 發送消息（取消時ApiClient正常返回已收到的部分）
+                success, full_response, status = await client.send_message(
+                    messages, model_id, temperature, payload=payload
+                )
+            except asyncio.CancelledError:
+                # 在ApiClient處理之外被取消（等待會話或UI隊列時），仍保存已收到的部分
+                self._commit_reply(assistant_message, client, "".join(client.response_parts) if client else "", True)
+                self._push_cancel_notice()
+                raise
             
-            # 發送消息
-            success, full_response, status = await self.api_client.send_message(
-                self.chat_history, model_id, temperature
-            )
+            # 是否截斷以請求返回時的狀態為準：之後才按下停止不影響已完整收到的回應
+            cancelled = status == CANCELLED_STATUS
             
-            # 添加換行
-            if not self.task_cancelled:
-                chat_display.config(state=tk.NORMAL)
-                chat_display.insert(tk.END, "\n\n")
-                chat_display.see(tk.END)
-                set_text_readonly_but_selectable(chat_display)
+            # 添加換行（經過Markdown解析，使最後一行的格式生效）
+            if not cancelled:
+                self._on_message_received("\n\n", chat_display)
             
             # 更新聊天歷史
-            if full_response:
-                # 如果被取消，標記為截斷
-                suffix = " [回應被截斷]" if self.task_cancelled else ""
-                self.chat_history.append({
-                    "role": "assistant", 
-                    "content": full_response + suffix, 
-                    "timestamp": response_time,
-                    "model": model_id
-                })
+            self._commit_reply(assistant_message, client, full_response, cancelled)
             
             # 如果取消了，顯示取消提示
-            if self.task_cancelled:
-                chat_display.config(state=tk.NORMAL)
-                chat_display.insert(tk.END, "[回應已取消]\n\n", "system")
-                chat_display.see(tk.END)
-                set_text_readonly_but_selectable(chat_display)
+            if cancelled:
+                self._push_cancel_notice()
+            
+            # 回應全部渲染後記錄指標
+            if client.metrics:
+                self.render_queue.push_call(self._record_metrics, client.metrics)
             
             # 更新狀態欄
-            if self.update_status:
-                self.update_status(status)
+            if self.response_cache:
+                status += f" · 快取命中 {self.response_cache.hits} / 未命中 {self.response_cache.misses}"
+            self._set_status(status)
                 
         finally:
-            # 關閉API客戶端會話
-            if self.api_client:
-                await self.api_client.close_session()
-            
-            # 恢復UI元素狀態
-            user_input_entry.config(state=tk.NORMAL)
-            send_btn.config(state=tk.NORMAL)
-            clear_btn.config(state=tk.NORMAL)
-            stop_btn.config(state=tk.DISABLED)
-            
-            # 讓輸入框重新獲得焦點
-            user_input_entry.focus_set()
-            
-            # 重置狀態
-            self.is_sending = False
-            self.current_task = None
-            self.current_ui_elements = None
+            self._last_connection_use = time.monotonic()
+            # 重置狀態（若已有新任務接手則不覆蓋其狀態）
+            if self.current_task is asyncio.current_task():
+                self.current_task = None
+    
+    async def _wait_for_ui(self):
+        """渲染隊列或UI隊列積壓時等待主線程追上（串流期間每個數據塊後調用）"""
+        await self.render_queue.wait_for_capacity()
+        if self.dispatcher:
+            await self.dispatcher.wait_for_capacity()
+    
+    def _commit_reply(self, assistant_message, client, text, cancelled):
+        """將回應加入聊天歷史（每條回應只調用一次；被取消時保存截斷的部分並加上標記）
+        
+        Args:
+            assistant_message: 回應開始時創建的消息字典
+            client: 發送此請求的ApiClient（尚未創建時為None）
+            text: 已收到的回應內容
+            cancelled: 回應是否被取消而截斷
+        """
+        if not text:
+            return
+        suffix = " [回應被截斷]" if cancelled else ""
+        assistant_message["content"] = text + suffix
+        assistant_message["model"] = client.last_model
+        self._append_history(assistant_message)
     
     def send_message(self, user_input, chat_display, model_id, temperature,
                      user_input_entry, send_btn, clear_btn, stop_btn, model_name=""):
         """發送消息（主線程調用）
         
+        回應串流期間提交的消息會進入隊列，上一條回應完成後按順序發送。
+        
         Args:
             user_input: 用戶輸入的消息
             chat_display: 聊天顯示區域
@@ -183,79 +464,213 @@ class ChatManager:
             user_input_entry, send_btn, clear_btn, stop_btn: UI元素
             model_name: 模型名稱，用於顯示
         """
-        # 檢查是否已經在發送中
-        if self.is_sending:
+        was_busy = self.scheduler.is_busy(self)
+        
+        # 標記為發送中，直到隊列中的請求全部完成
+        self.is_sending = True
+        self.ui_elements = {
+            'user_input_entry': user_input_entry,
+            'send_btn': send_btn,
+            'clear_btn': clear_btn,
+            'stop_btn': stop_btn
+        }
+        self._set_controls_state(self.ui_elements, True)
+        self.attach_display(chat_display).ensure_bottom()
+        
+        # 交給調度器，輪到此請求時在背景事件循環中發送
+        request = self.scheduler.submit(
+            self, model_id,
+            lambda: self._send_message_async(user_input, chat_display, model_id, temperature)
+        )
+        request.future.add_done_callback(self._on_task_finished)
+        
+        if was_busy:
+            queued = self.scheduler.queued_count(self)
+            self._set_status(f"已加入隊列，共 {queued} 條消息等待發送（按Esc取消排隊）")
+    
+    def _on_task_finished(self, future):
+        """請求結束（完成、失敗或在隊列中被取消）時的處理函數"""
+        # 調度器創建Future時已導入
+        import concurrent.futures
+        try:
+            future.result()
+        except concurrent.futures.CancelledError:
+            pass
+        except Exception as e:
+            print(f"任務異常: {e}")
+            self._set_status(f"發生錯誤: {e}")
+        self._run_on_ui(self._update_busy_state)
+    
+    def _update_busy_state(self):
+        """隊列清空後恢復空閒狀態（主線程調用）"""
+        if self.scheduler.is_busy(self):
             return
-            
-        # 創建一個函數來運行異步任務
-        def run_async_task():
-            # 獲取事件循環
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # 創建任務
-            task = loop.create_task(self._send_message_async(
-                user_input, chat_display, model_id, temperature,
-                user_input_entry, send_btn, clear_btn, stop_btn
-            ))
-            self.current_task = task
-            
-            try:
-                # 運行任務直到完成
-                loop.run_until_complete(task)
-            except concurrent.futures.CancelledError:
-                pass
-            except asyncio.CancelledError:
-                pass
-            except Exception as e:
-                print(f"任務異常: {e}")
-                if self.update_status:
-                    self.update_status(f"發生錯誤: {e}")
-            finally:
-                # 清理
-                loop.close()
+        self.is_sending = False
+        if self.ui_elements:
+            self._set_controls_state(self.ui_elements, False)
+            self.ui_elements = None
+    
+    def cancel_queued(self):
+        """取消所有排隊中尚未發送的消息（主線程調用）
         
-        # 在新線程中運行
-        threading.Thread(target=run_async_task).start()
+        Returns:
+            取消的消息數
+        """
+        count = self.scheduler.cancel_queued(self)
+        if count:
+            self._set_status(f"已取消 {count} 條排隊中的消息")
+        return count
     
     def stop_response(self):
         """停止當前響應"""
         self.task_cancelled = True
         
-        # 如果有API客戶端，取消它
-        if self.api_client:
-            self.api_client.cancel()
+        # 請求進行中時由ApiClient在其事件循環中關閉串流；尚未開始發送（例如等待
+        # UI隊列）時取消任務。兩者只取其一，避免重複取消打斷之後的處理
+        # （控件狀態在任務結束後由_update_busy_state恢復，隊列中的消息繼續發送）
+        if not (self.api_client and self.api_client.cancel()) and self.current_task:
+            self.loop_runner.call_soon(self.current_task.cancel)
         
-        # 如果有當前任務，嘗試取消它
-        if self.current_task:
-            try:
-                self.current_task.cancel()
-            except:
-                pass
+        # 更新狀態欄
+        self._set_status("回應已取消")
+    
+    def compare_models(self, prompt, model_ids, temperature,
+                       on_message=None, on_error=None, on_finished=None):
+        """比較模式：將同一問題同時發送給多個模型（主線程調用）
         
-        # 立即恢復UI元素狀態（使用存儲的UI元素引用）
-        if hasattr(self, 'current_ui_elements') and self.current_ui_elements:
-            ui_elements = self.current_ui_elements
-            
-            if ui_elements.get('user_input_entry'):
-                ui_elements['user_input_entry'].config(state=tk.NORMAL)
-            if ui_elements.get('send_btn'):
-                ui_elements['send_btn'].config(state=tk.NORMAL)
-            if ui_elements.get('clear_btn'):
-                ui_elements['clear_btn'].config(state=tk.NORMAL)
-            if ui_elements.get('stop_btn'):
-                ui_elements['stop_btn'].config(state=tk.DISABLED)
+        所有請求在同一個事件循環上並行，共用連接池會話；比較結果不會加入
+        聊天歷史，需由用戶通過adopt_reply採用。
+        
+        Args:
+            prompt: 用戶問題
+            model_ids: 模型ID列表
+            temperature: 溫度值
+            on_message: 收到增量文字時的回調，參數為 (模型ID, 文字)，在背景線程調用
+            on_error: 發生錯誤時的回調，參數為 (模型ID, 錯誤消息)，在背景線程調用
+            on_finished: 單個模型完成時的回調，參數為 (模型ID, 結果字典)，在背景線程調用
             
-            # 讓輸入框重新獲得焦點
-            if ui_elements.get('user_input_entry'):
-                ui_elements['user_input_entry'].focus_set()
+        Returns:
+            concurrent.futures.Future，取消它即可中止所有請求
+        """
+        user_message = {
+            "role": "user",
+            "content": prompt,
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        messages = list(self.chat_history) + [user_message]
+        return self.loop_runner.submit(self._compare_async(
+            messages, model_ids, temperature, on_message, on_error, on_finished
+        ))
+    
+    async def _compare_async(self, messages, model_ids, temperature, on_message, on_error, on_finished):
+        """並行執行比較模式的所有請求"""
+        import asyncio
         
-        # 更新狀態欄
-        if self.update_status:
-            self.update_status("回應已取消")
+        session = await self._get_session()
+        # 各模型的請求共用歷史部分，使用同一個編碼器只需編碼一次
+        wire_encoder = WireEncoder()
+        return await asyncio.gather(*(
+            self._compare_one(session, wire_encoder, messages, model_id, temperature,
+                              on_message, on_error, on_finished)
+            for model_id in model_ids
+        ))
+    
+    async def _compare_one(self, session, wire_encoder, messages, model_id, temperature,
+                           on_message, on_error, on_finished):
+        """發送比較模式中的單個請求並記錄延遲與吞吐量
         
-        # 重置發送狀態
-        self.is_sending = False
+        Returns:
+            結果字典，包含model、success、response、status、ttft（秒）、
+            tokens（收到的增量塊數，約等於token數）、tokens_per_sec、total_time（秒）
+        """
+        start = time.perf_counter()
+        first_token_time = None
+        token_count = 0
+        
+        def handle_message(content):
+            nonlocal first_token_time, token_count
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            token_count += 1
+            if on_message:
+                on_message(model_id, content)
+        
+        def handle_error(error_message):
+            if on_error:
+                on_error(model_id, error_message)
+        
+        from api_client import ApiClient
+        client = ApiClient(
+            on_message_callback=handle_message,
+            on_error_callback=handle_error,
+            session=session,
+            wire_encoder=wire_encoder,
+            response_cache=self.response_cache,
+            request_kind="compare",
+            wait_for_capacity=self.dispatcher.wait_for_capacity if self.dispatcher else None
+        )
+        fitted, _, _ = self.token_budget.fit(messages, model_id)
+        success, response, status = await client.send_message(fitted, model_id, temperature)
+        end = time.perf_counter()
+        if client.metrics:
+            self.telemetry.add(client.metrics)
+        
+        streaming_time = end - first_token_time if first_token_time else 0.0
+        result = {
+            "model": model_id,
+            "success": success and not client.is_cancelled,
+            "response": response,
+            "status": status,
+            "ttft": first_token_time - start if first_token_time else None,
+            "tokens": token_count,
+            "tokens_per_sec": token_count / streaming_time if streaming_time > 0 else 0.0,
+            "total_time": end - start
+        }
+        if on_finished:
+            on_finished(model_id, result)
+        return result
+    
+    def adopt_reply(self, prompt, result):
+        """將比較模式中的一個回應採用到主對話（主線程調用）
+        
+        Args:
+            prompt: 比較時發送的問題
+            result: compare_models產生的結果字典
+            
+        Returns:
+            是否成功採用（正在發送消息時不可採用）
+        """
+        if self.is_sending or not result["response"]:
+            return False
+        
+        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.chat_view.ensure_bottom()
+        for message in (
+            {"role": "user", "content": prompt, "timestamp": current_time},
+            {"role": "assistant", "content": result["response"], "timestamp": current_time, "model": result["model"]}
+        ):
+            self._append_history(message)
+            self.render_queue.push_call(self.chat_view.start_block, message)
+            for text, tag in self.message_segments(message):
+                self.render_queue.push(text, tag)
+        return True
+    
+    def shutdown(self):
+        """關閉共用會話、停止背景事件循環並寫入剩餘記錄並關閉快取（視窗關閉時調用）"""
+        self.scheduler.cancel_queued(self)
+        if self.loop_runner.is_running():
+            if self.current_task:
+                self.loop_runner.call_soon(self.current_task.cancel)
+            
+            try:
+                self.loop_runner.submit(self._close_session()).result(timeout=3)
+            except Exception:
+                pass
+            
+            self.loop_runner.stop()
         
-        # 清理UI元素引用
-        self.current_ui_elements = None 
\ No newline at end of file
+        # 寫入尚未落盤的消息
+        if self.store:
+            self.store.close()
+        if self.response_cache:
+            self.response_cache.close()
@@ -0,0 +1,231 @@
+import tkinter as tk
+from config import CHAT_VIEW_CONFIG
+from code_highlight import CodeHighlighter
+
+
+class ChatView:
+    """聊天顯示區的視窗化渲染
+
+    文字框中只保留一段連續的消息（可見部分加上前後餘量），每條消息的起點
+    以標記記錄。用戶捲動到頂部或底部時，從聊天歷史（或對話存儲）分頁載入
+    相鄰的消息，並移除遠離視窗的另一端，使文字框的內容量不隨對話長度增長。
+    視窗附近的代碼塊由CodeHighlighter在捲動或內容變化後延遲高亮。
+    """
+
+    def __init__(self, text_widget, chat_manager, render_queue):
+        """初始化聊天視圖
+
+        Args:
+            text_widget: 聊天顯示區（ScrolledText）
+            chat_manager: ChatManager實例，提供聊天歷史與分頁載入
+            render_queue: 聊天顯示區的渲染隊列
+        """
+        self.text_widget = text_widget
+        self.chat_manager = chat_manager
+        self.render_queue = render_queue
+        self.max_messages = CHAT_VIEW_CONFIG["max_messages"]
+        self.margin = CHAT_VIEW_CONFIG["margin"]
+        self.page_size = CHAT_VIEW_CONFIG["page_size"]
+        self.edge_threshold = CHAT_VIEW_CONFIG["edge_threshold"]
+
+        # 已渲染的消息：[(標記名, 消息字典), ...]，按顯示順序排列
+        self.blocks = []
+        # 底部是否有消息因視窗化而未渲染
+        self.bottom_trimmed = False
+        self._mark_counter = 0
+        self._check_pending = False
+        # 消息在聊天歷史中的位置 {id(消息): 位置}。聊天歷史只會追加或整個替換
+        # （清除、開啟會話、載入更早的消息都會創建新列表），列表改變時重建，追加時補上新消息
+        self._indexed_history = None
+        self._positions = {}
+        self.highlighter = CodeHighlighter(text_widget)
+
+        # 攔截捲動回調以偵測是否到達邊緣
+        scrollbar = getattr(text_widget, "vbar", None)
+        self._scrollbar_set = scrollbar.set if scrollbar else None
+        text_widget.configure(yscrollcommand=self._on_yscroll)
+
+    # ---- 標記管理 ----
+
+    def _new_mark(self, index):
+        """在index處創建消息起點標記"""
+        self._mark_counter += 1
+        mark = f"msg_{self._mark_counter}"
+        self.text_widget.mark_set(mark, index)
+        self.text_widget.mark_gravity(mark, tk.LEFT)
+        return mark
+
+    def start_block(self, message):
+        """在文字框末尾開始一條新消息（主線程調用，通常經由渲染隊列）"""
+        self.blocks.append((self._new_mark("end-1c"), message))
+        if not self.bottom_trimmed and self.render_queue.auto_scroll:
+            self._trim_top()
+
+    def clear(self):
+        """清空文字框與所有消息標記"""
+        for mark, _ in self.blocks:
+            self.text_widget.mark_unset(mark)
+        self.blocks = []
+        self.bottom_trimmed = False
+        self.render_queue.auto_scroll = True
+        self.text_widget.delete("1.0", tk.END)
+
+    def _history_index(self, message):
+        """找出消息在聊天歷史中的位置（按對象比較），找不到時返回None"""
+        history = self.chat_manager.chat_history
+        if history is not self._indexed_history:
+            self._indexed_history = history
+            self._positions = {}
+        for index in range(len(self._positions), len(history)):
+            self._positions[id(history[index])] = index
+        index = self._positions.get(id(message))
+        if index is None or history[index] is not message:
+            return None
+        return index
+
+    def _insert_message(self, index, message):
+        """在index處插入一條消息的所有片段"""
+        args = []
+        for text, tag in self.chat_manager.message_segments(message):
+            args.extend([text, tag])
+        self.text_widget.insert(index, *args)
+
+    # ---- 整體重繪 ----
+
+    def show_history(self, start=None):
+        """重新繪製聊天顯示區
+
+        Args:
+            start: 從聊天歷史中的此位置開始顯示，None表示顯示最新的消息
+        """
+        self.render_queue.flush()
+        self.clear()
+        history = self.chat_manager.chat_history
+        anchor_top = start is not None
+        if start is None:
+            start = max(len(history) - self.max_messages, 0)
+        end = min(start + self.max_messages, len(history))
+
+        for message in history[start:end]:
+            self.blocks.append((self._new_mark("end-1c"), message))
+            self._insert_message(tk.END, message)
+
+        self.bottom_trimmed = end < len(history)
+        self.render_queue.auto_scroll = not self.bottom_trimmed
+        self.text_widget.see("1.0" if anchor_top else tk.END)
+
+    def ensure_bottom(self):
+        """確保最新的消息已渲染（發送新消息前調用）"""
+        if self.bottom_trimmed:
+            self.show_history()
+        self.render_queue.auto_scroll = True
+        self.text_widget.see(tk.END)
+
+    # ---- 捲動分頁 ----
+
+    def _on_yscroll(self, first, last):
+        """文字框捲動回調"""
+        if self._scrollbar_set:
+            self._scrollbar_set(first, last)
+        self.highlighter.schedule()
+        # 捲動回調中不宜修改內容，延後到空閒時檢查
+        if not self._check_pending:
+            self._check_pending = True
+            self.text_widget.after_idle(self._check_edges)
+
+    def _check_edges(self):
+        """到達頂部或底部時分頁載入相鄰的消息"""
+        self._check_pending = False
+        first, last = self.text_widget.yview()
+
+        # 用戶離開底部時停止自動捲動，回到底部時恢復
+        at_bottom = last >= 1.0 - self.edge_threshold
+        self.render_queue.auto_scroll = at_bottom and not self.bottom_trimmed
+
+        if first <= self.edge_threshold and self.page_older():
+            return
+        if at_bottom and self.bottom_trimmed:
+            self.page_newer()
+
+    def page_older(self):
+        """在頂部載入更早的一頁消息
+
+        Returns:
+            是否載入了新消息
+        """
+        if not self.blocks:
+            return False
+        start = self._history_index(self.blocks[0][1])
+        if start is None:
+            return False
+        if start == 0:
+            # 聊天歷史已全部渲染，嘗試從對話存儲載入更早的消息
+            if not self.chat_manager.load_older_messages():
+                return False
+            start = self._history_index(self.blocks[0][1])
+
+        older = self.chat_manager.chat_history[max(start - self.page_size, 0):start]
+        widget = self.text_widget
+
+        # 以文字框頂部的標記保持當前可見位置
+        widget.mark_set("view_anchor", "@0,0")
+        widget.mark_gravity("view_anchor", tk.RIGHT)
+        widget.mark_set("page_insert", "1.0")
+        widget.mark_gravity("page_insert", tk.RIGHT)
+        first_mark = self.blocks[0][0]
+        widget.mark_gravity(first_mark, tk.RIGHT)
+
+        new_blocks = []
+        for message in older:
+            new_blocks.append((self._new_mark("page_insert"), message))
+            self._insert_message("page_insert", message)
+
+        widget.mark_gravity(first_mark, tk.LEFT)
+        self.blocks = new_blocks + self.blocks
+        widget.yview("view_anchor")
+
+        self._trim_bottom()
+        return True
+
+    def page_newer(self):
+        """在底部載入較新的一頁消息"""
+        if not self.blocks:
+            return
+        last = self._history_index(self.blocks[-1][1])
+        if last is None:
+            self.ensure_bottom()
+            return
+        history = self.chat_manager.chat_history
+        newer = history[last + 1:last + 1 + self.page_size]
+        for message in newer:
+            self.blocks.append((self._new_mark("end-1c"), message))
+            self._insert_message(tk.END, message)
+        self.bottom_trimmed = last + 1 + len(newer) < len(history)
+        self._trim_top()
+
+    def _trim_top(self):
+        """移除頂部超出視窗的消息"""
+        excess = len(self.blocks) - (self.max_messages + self.margin)
+        if excess <= 0:
+            return
+        widget = self.text_widget
+        widget.mark_set("view_anchor", "@0,0")
+        widget.delete("1.0", self.blocks[excess][0])
+        for mark, _ in self.blocks[:excess]:
+            widget.mark_unset(mark)
+        self.blocks = self.blocks[excess:]
+        widget.yview("view_anchor")
+
+    def _trim_bottom(self):
+        """移除底部超出視窗的消息（正在接收回應時不移除）"""
+        excess = len(self.blocks) - (self.max_messages + self.margin)
+        if excess <= 0 or self.chat_manager.is_sending:
+            return
+        keep = len(self.blocks) - excess
+        widget = self.text_widget
+        widget.delete(self.blocks[keep][0], tk.END)
+        for mark, _ in self.blocks[keep:]:
+            widget.mark_unset(mark)
+        self.blocks = self.blocks[:keep]
+        self.bottom_trimmed = True
+        self.render_queue.auto_scroll = False
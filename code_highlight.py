@@ -0,0 +1,332 @@
+import re
+import queue
+import bisect
+import hashlib
+import threading
+import collections
+import importlib.util
+from config import HIGHLIGHT_CONFIG
+from markdown_render import MarkdownStream, fence_language, tk_column
+
+# pygments標記類型到文字標籤的對應（按順序匹配，子類型歸入父類型）
+_TOKEN_TAGS = [
+    ("Comment", "hl_comment"),
+    ("Literal.String", "hl_string"),
+    ("Literal.Number", "hl_number"),
+    ("Keyword", "hl_keyword"),
+    ("Operator.Word", "hl_keyword"),
+    ("Name.Builtin", "hl_builtin"),
+    ("Name.Function", "hl_function"),
+    ("Name.Class", "hl_function"),
+    ("Name.Decorator", "hl_decorator"),
+]
+
+# BMP以外的字元（在Tk 8.6中佔兩列）
+_ASTRAL = re.compile("[\U00010000-\U0010FFFF]")
+
+_STOP = object()
+
+
+def block_key(language, code):
+    """以語言與代碼內容計算代碼塊的快取鍵"""
+    return hashlib.sha256(f"{language}\n{code}".encode("utf-8")).hexdigest()
+
+
+def closed_blocks(first_row, text):
+    """從md_code標籤範圍的文字中找出已結束且標明語言的代碼塊
+
+    Args:
+        first_row: 範圍起點的行號
+        text: 範圍內的文字（可能包含多個相鄰的代碼塊）
+
+    Returns:
+        [(代碼首行的行號, 語言, 代碼), ...]
+    """
+    stream = MarkdownStream()
+    blocks = []
+    block = None
+    for offset, line in enumerate(text.split("\n")):
+        opening = not stream.in_code_block
+        stream.parse_line(line)
+        if opening:
+            if stream.in_code_block:
+                block = (first_row + offset + 1, fence_language(line), [])
+        elif not stream.in_code_block:
+            if block[1] and block[2]:
+                blocks.append((block[0], block[1], "\n".join(block[2]) + "\n"))
+            block = None
+        else:
+            block[2].append(line)
+    return blocks
+
+
+class CodeTokenizer:
+    """以pygments切分代碼（在工作線程中使用，首次使用時才導入pygments）"""
+
+    def __init__(self):
+        self._lexers = {}
+        self._token_tags = {}
+        self._tag_types = None
+
+    def tokenize(self, language, code):
+        """以pygments切分代碼
+
+        Args:
+            language: 代碼塊標明的語言
+            code: 代碼（以換行結尾）
+
+        Returns:
+            [(標籤, 起始行, 起始列, 結束行, 結束列), ...]，行號相對於代碼首行，
+            列號以Tk的列計算；不支持的語言返回空列表
+        """
+        from pygments.lexers import get_lexer_by_name
+        from pygments.token import string_to_tokentype
+        from pygments.util import ClassNotFound
+
+        if language not in self._lexers:
+            try:
+                self._lexers[language] = get_lexer_by_name(language)
+            except ClassNotFound:
+                self._lexers[language] = None
+        lexer = self._lexers[language]
+        if lexer is None:
+            return []
+        if self._tag_types is None:
+            self._tag_types = [(string_to_tokentype(name), tag) for name, tag in _TOKEN_TAGS]
+
+        # 合併相鄰的同類標記，減少標籤範圍數
+        spans = []
+        for offset, token_type, value in lexer.get_tokens_unprocessed(code):
+            tag = self._token_tags.get(token_type, False)
+            if tag is False:
+                tag = next((tag for parent, tag in self._tag_types if token_type in parent), None)
+                self._token_tags[token_type] = tag
+            if tag is None or not value.strip():
+                continue
+            if spans and spans[-1][0] == tag and spans[-1][2] == offset:
+                spans[-1][2] = offset + len(value)
+            else:
+                spans.append([tag, offset, offset + len(value)])
+
+        line_starts = [0]
+        position = code.find("\n")
+        while position >= 0:
+            line_starts.append(position + 1)
+            position = code.find("\n", position + 1)
+        astral = _ASTRAL.search(code) is not None
+
+        def locate(offset):
+            row = bisect.bisect_right(line_starts, offset) - 1
+            column = offset - line_starts[row]
+            if astral:
+                column = tk_column(code[line_starts[row]:offset], column)
+            return row, column
+
+        return [(tag, *locate(start), *locate(end)) for tag, start, end in spans]
+
+
+class CodeHighlighter:
+    """代碼塊的延遲語法高亮
+
+    只處理可見範圍附近、已結束的代碼塊：主線程找出代碼塊後交給工作線程
+    以pygments切分，結果在主循環中按幀分批設置為標籤，不阻塞渲染與捲動。
+    結果以代碼塊內容的雜湊快取，分頁載入或重繪後重新插入的代碼塊直接從快取
+    套用；高亮標籤只設置顏色，調整字體大小時無需重新處理。
+    未安裝pygments（可選依賴）時不做任何處理。
+    """
+
+    def __init__(self, text_widget, frame_ms=16):
+        """初始化語法高亮
+
+        Args:
+            text_widget: 聊天顯示區
+            frame_ms: 分批設置標籤的幀間隔（毫秒）
+        """
+        self.text_widget = text_widget
+        self.frame_ms = frame_ms
+        self.margin = HIGHLIGHT_CONFIG["viewport_margin"]
+        self.scan_delay = HIGHLIGHT_CONFIG["scan_delay_ms"]
+        self.batch_size = HIGHLIGHT_CONFIG["batch_size"]
+        self.cache_entries = HIGHLIGHT_CONFIG["cache_entries"]
+        # 只檢查是否已安裝，pygments在工作線程首次使用時才導入
+        self.enabled = importlib.util.find_spec("pygments") is not None
+
+        # {快取鍵: 標籤範圍}，按最近使用排序
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        # 工作線程的任務隊列與完成的結果（deque的append/popleft是線程安全的）
+        self._jobs = queue.Queue()
+        self._results = collections.deque()
+        self._worker = None
+        # 切分中的代碼塊：{標記名: 行數}
+        self._in_flight = {}
+        # 待設置標籤的代碼塊：[標記名, 代碼, 行數, 標籤範圍, 已設置數]
+        self._pending = collections.deque()
+        self._scan_id = None
+        self._frame_id = None
+        self._mark_counter = 0
+
+        # 只在工作線程中使用
+        self._tokenizer = CodeTokenizer()
+
+        for tag, color in HIGHLIGHT_CONFIG["colors"].items():
+            text_widget.tag_configure(tag, foreground=color)
+
+    # ---- 主線程 ----
+
+    def schedule(self):
+        """捲動或內容變化後安排檢查可見範圍內的代碼塊（主線程調用，連續調用只檢查一次）"""
+        if self.enabled and self._scan_id is None:
+            self._scan_id = self.text_widget.after(self.scan_delay, self._scan)
+
+    def stop(self):
+        """停止檢查與設置標籤，結束工作線程並丟棄未完成的代碼塊（之後可再次schedule）"""
+        widget = self.text_widget
+        for after_id in (self._scan_id, self._frame_id):
+            if after_id is not None:
+                widget.after_cancel(after_id)
+        self._scan_id = self._frame_id = None
+
+        # 未完成的代碼塊移除hl_done與標記，重新顯示時可再次高亮
+        unfinished = list(self._in_flight.items()) + [(item[0], item[2]) for item in self._pending]
+        if widget.winfo_exists():
+            for mark, lines in unfinished:
+                widget.tag_remove("hl_done", mark, f"{mark} + {lines} lines")
+                widget.mark_unset(mark)
+        self._pending.clear()
+        self._in_flight.clear()
+
+        # 舊工作線程處理完已排隊的任務後結束，其結果寫入舊的隊列，不會被誤收
+        if self._worker is not None:
+            self._jobs.put(_STOP)
+            self._worker = None
+        self._jobs = queue.Queue()
+        self._results = collections.deque()
+
+    def _scan(self):
+        """找出可見範圍附近尚未高亮的代碼塊"""
+        self._scan_id = None
+        widget = self.text_widget
+        top = int(widget.index("@0,0").split(".")[0])
+        bottom = int(widget.index(f"@0,{widget.winfo_height()}").split(".")[0])
+        start = f"{max(top - self.margin, 1)}.0"
+        end = f"{bottom + self.margin}.0"
+
+        # tag_nextrange只找起點在範圍內的代碼，從上方開始的代碼塊另外包含
+        previous = widget.tag_prevrange("md_code", start)
+        if previous and widget.compare(previous[1], ">", start):
+            start = previous[0]
+        while True:
+            found = widget.tag_nextrange("md_code", start, end)
+            if not found:
+                break
+            first, start = found
+            for row, language, code in closed_blocks(int(first.split(".")[0]), widget.get(first, start)):
+                self._request(row, language, code)
+
+        if self._pending or self._in_flight:
+            self._start_frames()
+
+    def _request(self, row, language, code):
+        """高亮從row行開始的代碼塊（已處理過的跳過）"""
+        widget = self.text_widget
+        lines = code.count("\n")
+        start = f"{row}.0"
+        # hl_done標記已處理的代碼；重新插入的文字不帶此標籤
+        if "hl_done" in widget.tag_names(start):
+            return
+        widget.tag_add("hl_done", start, f"{row + lines}.0")
+
+        self._mark_counter += 1
+        mark = f"hl_{self._mark_counter}"
+        widget.mark_set(mark, start)
+        widget.mark_gravity(mark, "left")
+
+        key = block_key(language, code)
+        ranges = self.cache.get(key)
+        if ranges is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            self._pending.append([mark, code, lines, ranges, 0])
+            return
+        self.misses += 1
+        self._in_flight[mark] = lines
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, args=(self._jobs, self._results),
+                                            name="CodeHighlighter", daemon=True)
+            self._worker.start()
+        self._jobs.put((mark, key, language, code))
+
+    def _start_frames(self):
+        if self._frame_id is None:
+            self._frame_id = self.text_widget.after(self.frame_ms, self._on_frame)
+
+    def _on_frame(self):
+        """收取工作線程的結果，並設置最多batch_size個標籤範圍"""
+        self._frame_id = None
+        while self._results:
+            mark, key, code, ranges = self._results.popleft()
+            del self._in_flight[mark]
+            self.cache[key] = ranges
+            if len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+            self._pending.append([mark, code, code.count("\n"), ranges, 0])
+
+        widget = self.text_widget
+        budget = self.batch_size
+        while self._pending and budget > 0:
+            item = self._pending[0]
+            mark, code, lines, ranges, done = item
+            # 代碼塊可能已因視窗化或重繪被移除，每幀設置前先確認內容未變
+            if widget.get(mark, f"{mark} + {lines} lines") != code:
+                done = len(ranges)
+            else:
+                row = int(widget.index(mark).split(".")[0])
+                batch = ranges[done:done + budget]
+                # 同一標籤的多個範圍以一次tag_add設置
+                indices = collections.defaultdict(list)
+                for tag, first_row, first_col, last_row, last_col in batch:
+                    indices[tag].extend((f"{row + first_row}.{first_col}", f"{row + last_row}.{last_col}"))
+                for tag, args in indices.items():
+                    widget.tag_add(tag, *args)
+                budget -= len(batch)
+                done += len(batch)
+                item[4] = done
+            if done >= len(ranges):
+                self._pending.popleft()
+                widget.mark_unset(mark)
+
+        if self._pending or self._in_flight:
+            self._start_frames()
+
+    def is_idle(self):
+        """是否沒有待檢查、切分中或待設置標籤的代碼塊"""
+        return (self._scan_id is None and self._frame_id is None
+                and not self._pending and not self._in_flight)
+
+    def get_stats(self):
+        """獲取快取統計"""
+        return {"hits": self.hits, "misses": self.misses, "cached_blocks": len(self.cache)}
+
+    # ---- 工作線程 ----
+
+    def _work(self, jobs, results):
+        """工作線程主體：逐個切分代碼塊
+
+        Args:
+            jobs: 啟動時的任務隊列
+            results: 啟動時的結果隊列（stop後替換為新的隊列，舊線程的結果不再被收取）
+        """
+        while True:
+            job = jobs.get()
+            if job is _STOP:
+                return
+            mark, key, language, code = job
+            try:
+                ranges = self._tokenizer.tokenize(language, code)
+            except Exception as e:
+                print(f"語法高亮失敗: {e}")
+                ranges = []
+            results.append((mark, key, code, ranges))
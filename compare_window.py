@@ -0,0 +1,224 @@
+import tkinter as tk
+from tkinter import scrolledtext
+
+from config import DEFAULT_FONT_FAMILY, MODELS, UI_COLORS
+from render_queue import RenderQueue
+from ui_utils import set_text_readonly_but_selectable
+
+# 同時比較的最大模型數
+MAX_COMPARE_MODELS = 4
+
+
+class ComparePane:
+    """比較模式中單個模型的回應面板"""
+
+    def __init__(self, parent, model_name, on_adopt):
+        """初始化回應面板
+
+        Args:
+            parent: 父容器
+            model_name: 模型顯示名稱
+            on_adopt: 點擊「採用此回應」時的回調
+        """
+        self.frame = tk.Frame(parent, bd=1, relief=tk.GROOVE)
+        self.frame.rowconfigure(2, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+
+        tk.Label(self.frame, text=model_name, font=(DEFAULT_FONT_FAMILY, 10, "bold"),
+                 anchor=tk.W).grid(row=0, column=0, sticky="ew", padx=5, pady=(5, 0))
+        self.metrics_label = tk.Label(self.frame, text="等待回應...", fg="#6c757d",
+                                      font=(DEFAULT_FONT_FAMILY, 8), anchor=tk.W)
+        self.metrics_label.grid(row=1, column=0, sticky="ew", padx=5)
+
+        self.text = scrolledtext.ScrolledText(self.frame, wrap=tk.WORD, width=30, height=12,
+                                              font=(DEFAULT_FONT_FAMILY, 10))
+        self.text.grid(row=2, column=0, sticky="nsew", padx=5, pady=5)
+        self.text.tag_configure("error", foreground="#dc3545")
+        set_text_readonly_but_selectable(self.text)
+
+        self.adopt_btn = tk.Button(self.frame, text="採用此回應", state=tk.DISABLED,
+                                   font=(DEFAULT_FONT_FAMILY, 9), command=on_adopt)
+        self.adopt_btn.grid(row=3, column=0, pady=(0, 5))
+
+        self.render_queue = RenderQueue(self.text)
+        self.render_queue.start()
+        self.result = None
+
+    def show_result(self, result):
+        """顯示完成後的延遲與吞吐量（主線程調用）"""
+        self.result = result
+        ttft = f"{result['ttft']:.2f}s" if result["ttft"] is not None else "-"
+        self.metrics_label.config(
+            text=f"首字延遲 {ttft} · {result['tokens']} tokens · "
+                 f"{result['tokens_per_sec']:.1f} tokens/s · 總耗時 {result['total_time']:.2f}s"
+        )
+        if result["success"] and result["response"]:
+            self.adopt_btn.config(state=tk.NORMAL)
+
+    def destroy(self):
+        self.render_queue.stop()
+        self.frame.destroy()
+
+
+class CompareWindow:
+    """比較模式視窗
+
+    將同一問題並行發送給多個模型，每個模型的回應串流到各自的面板，
+    並顯示首字延遲與tokens/s；用戶可採用其中一個回應加入主對話。
+    """
+
+    def __init__(self, parent, chat_manager, default_model, temperature, prompt="", update_status=None):
+        """初始化比較視窗
+
+        Args:
+            parent: 主視窗
+            chat_manager: ChatManager實例
+            default_model: 預設勾選的模型名稱
+            temperature: 溫度值
+            prompt: 預填的問題
+            update_status: 更新主視窗狀態欄的函數
+        """
+        self.chat_manager = chat_manager
+        self.temperature = temperature
+        self.update_status = update_status
+        self.panes = {}
+        self.future = None
+        self.prompt = ""
+        self.closed = False
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("比較模式")
+        self.window.geometry("1000x640")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.window.rowconfigure(2, weight=1)
+        self.window.columnconfigure(0, weight=1)
+
+        # 模型選擇
+        model_frame = tk.Frame(self.window)
+        model_frame.grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 5))
+        tk.Label(model_frame, text=f"選擇模型（最多{MAX_COMPARE_MODELS}個）:",
+                 font=(DEFAULT_FONT_FAMILY, 10, "bold")).grid(row=0, column=0, sticky=tk.W)
+        self.model_vars = {}
+        for index, model_name in enumerate(MODELS):
+            var = tk.BooleanVar(value=model_name == default_model)
+            tk.Checkbutton(model_frame, text=model_name, variable=var,
+                           font=(DEFAULT_FONT_FAMILY, 9)).grid(row=1 + index // 4, column=index % 4, sticky=tk.W)
+            self.model_vars[model_name] = var
+
+        # 問題輸入
+        prompt_frame = tk.Frame(self.window)
+        prompt_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
+        prompt_frame.columnconfigure(0, weight=1)
+        self.prompt_entry = tk.Text(prompt_frame, height=3, wrap=tk.WORD, font=(DEFAULT_FONT_FAMILY, 10))
+        self.prompt_entry.grid(row=0, column=0, rowspan=2, sticky="ew")
+        self.prompt_entry.insert("1.0", prompt)
+        self.start_btn = tk.Button(prompt_frame, text="開始比較", bg=UI_COLORS["send_btn_color"], fg="white",
+                                   font=(DEFAULT_FONT_FAMILY, 10, "bold"), command=self.start)
+        self.start_btn.grid(row=0, column=1, padx=(5, 0), sticky="ew")
+        self.stop_btn = tk.Button(prompt_frame, text="停止", bg=UI_COLORS["stop_btn_color"], fg="white",
+                                  font=(DEFAULT_FONT_FAMILY, 10, "bold"), state=tk.DISABLED, command=self.stop)
+        self.stop_btn.grid(row=1, column=1, padx=(5, 0), sticky="ew")
+
+        # 回應面板區域
+        self.panes_frame = tk.Frame(self.window)
+        self.panes_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=(5, 10))
+        self.panes_frame.rowconfigure(0, weight=1)
+
+        self.prompt_entry.focus_set()
+
+    def _selected_models(self):
+        return [name for name, var in self.model_vars.items() if var.get()]
+
+    def start(self):
+        """開始比較"""
+        prompt = self.prompt_entry.get("1.0", "end-1c").strip()
+        model_names = self._selected_models()
+        if not prompt or self.future is not None:
+            return
+        if not 2 <= len(model_names) <= MAX_COMPARE_MODELS:
+            self._set_status(f"請選擇2至{MAX_COMPARE_MODELS}個模型進行比較")
+            return
+
+        self._clear_panes()
+        model_ids = []
+        for column, model_name in enumerate(model_names):
+            model_id = MODELS[model_name]
+            pane = ComparePane(self.panes_frame, model_name, lambda model_id=model_id: self.adopt(model_id))
+            pane.frame.grid(row=0, column=column, sticky="nsew", padx=2)
+            self.panes_frame.columnconfigure(column, weight=1, uniform="pane")
+            self.panes[model_id] = pane
+            model_ids.append(model_id)
+
+        self.prompt = prompt
+        self.start_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.NORMAL)
+        self._set_status(f"正在比較 {len(model_ids)} 個模型...")
+
+        self.future = self.chat_manager.compare_models(
+            prompt, model_ids, self.temperature,
+            on_message=self._on_message,
+            on_error=self._on_error,
+            on_finished=self._on_finished
+        )
+        self.future.add_done_callback(lambda future: self._run_on_ui(self._on_all_finished))
+
+    def stop(self):
+        """中止所有比較請求"""
+        if self.future is not None:
+            self.future.cancel()
+
+    def _clear_panes(self):
+        for column, pane in enumerate(self.panes.values()):
+            pane.destroy()
+            self.panes_frame.columnconfigure(column, weight=0, uniform="")
+        self.panes = {}
+
+    def _run_on_ui(self, func, *args):
+        """在主線程執行（視窗關閉後忽略）"""
+        def run():
+            if not self.closed:
+                func(*args)
+        self.chat_manager.dispatcher.call(run)
+
+    # ---- 背景線程回調 ----
+
+    def _on_message(self, model_id, content):
+        self.panes[model_id].render_queue.push(content)
+
+    def _on_error(self, model_id, error_message):
+        self.panes[model_id].render_queue.push(f"\n錯誤: {error_message}\n", "error")
+
+    def _on_finished(self, model_id, result):
+        self._run_on_ui(self.panes[model_id].show_result, result)
+
+    # ---- 主線程 ----
+
+    def _on_all_finished(self):
+        cancelled = self.future.cancelled()
+        self.future = None
+        self.start_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
+        self._set_status("比較已停止" if cancelled else "比較完成，可選擇採用其中一個回應")
+
+    def adopt(self, model_id):
+        """將指定模型的回應加入主對話"""
+        pane = self.panes.get(model_id)
+        if pane is None or pane.result is None:
+            return
+        if not self.chat_manager.adopt_reply(self.prompt, pane.result):
+            self._set_status("請等待目前的回應完成後再採用")
+            return
+        self._set_status(f"已採用 {model_id.split('/')[-1]} 的回應")
+        self.close()
+
+    def _set_status(self, message):
+        if self.update_status:
+            self.update_status(message)
+
+    def close(self):
+        """關閉視窗並中止未完成的請求"""
+        self.stop()
+        self.closed = True
+        for pane in self.panes.values():
+            pane.render_queue.stop()
+        self.window.destroy()
@@ -42,11 +42,128 @@ MODELS = {
     "Llama-4 Maverick": "chutesai/Llama-4-Maverick-17B-128E-Instruct-FP8"
 }
 
+# 各模型的上下文長度上限（tokens），用於在發送前截斷過長的對話歷史
+MODEL_CONTEXT_LIMITS = {
+    "deepseek-ai/DeepSeek-V3-0324": 163840,
+    "deepseek-ai/DeepSeek-R1": 163840,
+    "deepseek-ai/DeepSeek-R1-0528": 163840,
+    "deepseek-ai/DeepSeek-Prover-V2-671B": 163840,
+    "tngtech/DeepSeek-R1T-Chimera": 163840,
+    "Qwen/Qwen3-235B-A22B": 40960,
+    "chutesai/Llama-4-Maverick-17B-128E-Instruct-FP8": 256000
+}
+
+# 未列出的模型使用的默認上下文長度
+DEFAULT_CONTEXT_LIMIT = 32768
+
+# 按模型ID固定的系統提示，"default"用於未列出的模型；空字符串表示不發送系統提示
+# 系統提示總是作為第一條消息以相同的位元組發送，不會被上下文截斷移除
+SYSTEM_PROMPTS = {
+    "default": "",
+}
+
 # API配置
 API_CONFIG = {
     "api_url": "https://llm.chutes.ai/v1/chat/completions",
     # API令牌將從環境變數或設定檔讀取
     "api_token_env_var": "LLM_API_TOKEN",
+    "max_tokens": 10000,               # 單次回應的最大token數（同時為回應預留的上下文空間）
+    # 連接池設置（所有對話與模型共用同一個會話）
+    "connector_limit": 20,             # 連接池總連接數上限
+    "connector_limit_per_host": 10,    # 每個主機的連接數上限
+    "dns_cache_ttl": 300,              # DNS快取時間（秒）
+    "keepalive_timeout": 60,           # 閒置連接保持時間（秒）
+    # 用戶輸入或切換模型時預先建立連接；距離上次預熱或請求不到此秒數時不重複預熱（應小於keepalive_timeout）
+    "prewarm_interval": 20,
+    # 超時設置（取代原先固定的60秒總超時，長回應不會被中斷）
+    "connect_timeout": 10,             # 建立連接（含等待連接池）的超時（秒）
+    "first_byte_timeout": 60,          # 發出請求到收到第一段回應內容的超時（秒）
+    "idle_read_timeout": 30,           # 串流中相鄰兩次收到數據的最長間隔（秒）
+    # 重試與備用模型
+    "max_retries": 3,                  # 429、5xx、連接失敗及超時的最大重試次數
+    "retry_base_delay": 1.0,           # 指數退避的基礎延遲（秒）
+    "retry_max_delay": 30.0,           # 單次重試的最長等待（秒），包括Retry-After
+    "fallback_model": None,            # 主模型重試後仍失敗時改用的模型（MODELS中的名稱），None表示不切換
+    # 客戶端速率限制：同一API令牌的所有請求（主對話、比較模式、批次任務）共用
+    # 多台電腦或腳本共用同一令牌時，請按使用者數量按比例調低
+    "max_concurrent_requests": 4,      # 同時進行的請求數上限，0表示不限制
+    "rate_limits": {
+        # 按模型ID設置，未列出的模型使用"default"；值為0或None表示不限制該項
+        "default": {"requests_per_minute": 60, "tokens_per_minute": 300000},
+    },
+    "rate_limit_burst_seconds": 10,    # 令牌桶容量：允許一次性用掉多少秒的額度
+}
+
+# 對話記錄存儲配置
+STORE_CONFIG = {
+    "enabled": True,
+    "db_path": os.path.join(os.path.expanduser("~"), ".ai_chat_window", "conversations.db"),
+    "initial_messages": 50,            # 開啟會話時先載入的最近消息數
+    "page_size": 50,                   # 每次載入更早消息的數量
+    "write_timeout": 5,                # flush與close等待寫入線程的最長秒數
+}
+
+# 回應快取配置（默認關閉；相同模型、消息、溫度與max_tokens的請求直接重播已保存的回應）
+RESPONSE_CACHE_CONFIG = {
+    "enabled": False,
+    "db_path": os.path.join(os.path.expanduser("~"), ".ai_chat_window", "response_cache.db"),
+    "max_temperature": 0.0,            # 只快取溫度不高於此值的請求（較高溫度每次回應應不同）
+    "max_entries": 1000,               # 最多保存的回應數
+    "max_bytes": 50 * 1024 * 1024,     # 所有回應的總大小上限
+    "ttl_seconds": 7 * 24 * 3600,      # 有效期（秒）
+}
+
+# 請求指標配置
+TELEMETRY_CONFIG = {
+    "max_records": 500,                # 環形緩衝區保留的請求數
+    "summary_window": 20,              # 統計面板平均值使用的最近請求數
+}
+
+# 性能分析配置（設置環境變數 AI_CHAT_PROFILE=1 後啟動即啟用）
+PROFILING_CONFIG = {
+    "env_var": "AI_CHAT_PROFILE",
+    "output_dir": os.path.join(os.path.expanduser("~"), ".ai_chat_window", "profiles"),
+    "slow_callback_ms": 100,           # Tk回調或主循環停頓超過此時間時記錄
+}
+
+# 聊天顯示區視窗化渲染配置
+CHAT_VIEW_CONFIG = {
+    "max_messages": 60,                # 文字框中保留的消息數
+    "margin": 20,                      # 超出保留數多少條後才移除，避免頻繁增刪
+    "page_size": 20,                   # 捲動到邊緣時每次載入的消息數
+    "edge_threshold": 0.02,            # 捲動位置距離邊緣小於此比例時觸發載入
+}
+
+# 聊天顯示區Markdown渲染配置
+MARKDOWN_CONFIG = {
+    "code_font_family": "Consolas",    # 代碼塊、行內代碼與表格使用的等寬字體
+    "heading_scales": {1: 1.4, 2: 1.25, 3: 1.1},  # 標題相對正文的字體大小（四級以下同三級）
+    "code_bg": "#f3f4f6",              # 代碼背景色
+    "inline_code_fg": "#c7254e",       # 行內代碼文字顏色
+    "fence_fg": "#9ca3af",             # 代碼塊圍欄（```）文字顏色
+}
+
+# 代碼塊語法高亮配置（需安裝可選的pygments套件）
+HIGHLIGHT_CONFIG = {
+    "viewport_margin": 100,            # 可見範圍上下各多少行內的代碼塊也一併高亮
+    "scan_delay_ms": 50,               # 捲動或內容變化後延遲多久檢查可見的代碼塊
+    "batch_size": 400,                 # 每幀最多設置的標籤範圍數
+    "cache_entries": 256,              # 快取高亮結果的代碼塊數
+    "colors": {                        # 各類語法元素的文字顏色
+        "hl_comment": "#6a737d",
+        "hl_string": "#032f62",
+        "hl_number": "#005cc5",
+        "hl_keyword": "#d73a49",
+        "hl_builtin": "#005cc5",
+        "hl_function": "#6f42c1",
+        "hl_decorator": "#e36209",
+    },
+}
+
+# 請求調度配置
+SCHEDULER_CONFIG = {
+    "max_in_flight": 4,                # 所有對話同時發送的最大請求數
+    "max_in_flight_per_model": 2,      # 每個模型同時發送的最大請求數
 }
 
 # UI相關顏色配置
@@ -57,6 +174,8 @@ UI_COLORS = {
     "stop_btn_color": "#FF9800",
     "clear_btn_color": "#f44336",
     "export_btn_color": "#3498db",
+    "sessions_btn_color": "#8e44ad",
+    "compare_btn_color": "#16a085",
     "header_bg": "#2c3e50",
     "header_fg": "white",
     "header_subtitle_fg": "#ecf0f1",
@@ -72,6 +191,10 @@ def setup_warnings():
         warnings.filterwarnings("ignore", category=ResourceWarning)
         warnings.filterwarnings("ignore", message=".*[iI][cC][cC][pP].*")
 
+# 是否啟用性能分析
+def profiling_enabled():
+    return os.environ.get(PROFILING_CONFIG["env_var"], "") not in ("", "0")
+
 # 獲取API令牌
 def get_api_token():
     # 優先從環境變數獲取API令牌
@@ -0,0 +1,534 @@
+import os
+import uuid
+import queue
+import sqlite3
+import datetime
+import threading
+from config import STORE_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    model TEXT,
+    timestamp TEXT,
+    UNIQUE(session_id, seq)
+);
+"""
+
+# 全文索引：trigram分詞不依賴空格斷詞，適用於中文；由觸發器隨消息寫入增量更新
+_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    content, model, timestamp,
+    content='messages', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content, model, timestamp)
+    VALUES (new.id, new.content, new.model, new.timestamp);
+END;
+CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content, model, timestamp)
+    VALUES ('delete', old.id, old.content, old.model, old.timestamp);
+END;
+"""
+
+# 短詞索引：trigram無法匹配少於3個字元的詞（大部分中文詞只有2個字），另以
+# search_grams把內容轉換為重疊的雙字元詞元，由unicode61分詞；2字元的詞精確匹配
+# 詞元，1字元的詞以前綴查詢匹配。觸發器中的search_grams由_connect註冊
+_SHORT_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE messages_short USING fts5(grams, tokenize='unicode61', prefix='1');
+CREATE TRIGGER messages_short_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_short(rowid, grams) VALUES (new.id, search_grams(new.content));
+END;
+CREATE TRIGGER messages_short_delete AFTER DELETE ON messages BEGIN
+    DELETE FROM messages_short WHERE rowid = old.id;
+END;
+"""
+
+# trigram索引要求查詢詞至少3個字元
+_MIN_INDEXED_QUERY = 3
+
+# 寫入線程的停止標記
+_STOP = object()
+
+
+def _word_runs(text):
+    """將文字按非字母數字字元切分為小寫的連續片段（與unicode61的詞元字元一致）"""
+    runs = []
+    current = []
+    for char in text.lower():
+        if char.isalnum():
+            current.append(char)
+        elif current:
+            runs.append("".join(current))
+            current = []
+    if current:
+        runs.append("".join(current))
+    return runs
+
+
+def _search_grams(text):
+    """短詞索引的內容：每個連續片段中所有位置開始的雙字元詞元（片段末字元單獨成詞元）"""
+    if not text:
+        return ""
+    return " ".join(run[i:i + 2] for run in _word_runs(text) for i in range(len(run)))
+
+
+def _search_fold(text):
+    """短詞索引的大小寫折疊（與_word_runs一致；SQLite的lower只處理ASCII）"""
+    return text.lower() if text else ""
+
+
+def _short_term_query(term):
+    """短詞在短詞索引中的查詢式，詞中含標點等非詞元字元時返回None"""
+    runs = _word_runs(term)
+    if len(runs) != 1 or len(runs[0]) != len(term):
+        return None
+    return f'"{runs[0]}"' if len(term) == 2 else f'"{runs[0]}"*'
+
+
+def _row_to_message(row):
+    """將數據庫行轉換為聊天歷史條目"""
+    message = {"role": row["role"], "content": row["content"], "timestamp": row["timestamp"], "seq": row["seq"]}
+    if row["model"]:
+        message["model"] = row["model"]
+    return message
+
+
+class ConversationStore:
+    """對話持久化存儲
+
+    使用WAL模式的SQLite，消息以追加方式寫入。所有寫入由專用線程完成，
+    調用方（Tk主線程或事件循環線程）只需放入隊列，不會被磁碟IO阻塞。
+    """
+
+    def __init__(self, db_path=None):
+        """初始化對話存儲
+
+        Args:
+            db_path: 數據庫檔案路徑，默認使用STORE_CONFIG["db_path"]
+        """
+        self.db_path = db_path or STORE_CONFIG["db_path"]
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        # 所有線程的讀取連接，close時統一關閉
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._seq_lock = threading.Lock()
+        self._next_seq = {}
+        # 正在由寫入線程讀取下一個序號的會話 {會話ID: threading.Event}
+        self._seq_loading = {}
+        self.search_enabled = False
+        self.short_search_enabled = False
+        # 寫入線程啟動失敗時的異常，此後寫入被丟棄、讀取接口拋出異常
+        self.error = None
+        self._ready = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="ConversationStoreWriter", daemon=True)
+        self._writer.start()
+
+    def _connect(self, check_same_thread=True):
+        """創建數據庫連接"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.create_function("search_grams", 1, _search_grams)
+        conn.create_function("search_fold", 1, _search_fold, deterministic=True)
+        return conn
+
+    def _get_reader(self):
+        """獲取當前線程的讀取連接"""
+        self._ready.wait()
+        if self.error is not None:
+            raise sqlite3.OperationalError(f"對話存儲不可用: {self.error}")
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 只在本線程使用，但須允許close()從其他線程關閉
+            conn = self._connect(check_same_thread=False)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    # ---- 寫入線程 ----
+
+    def _write_loop(self):
+        """寫入線程主體：逐批取出隊列中的操作並在同一事務中提交"""
+        conn = None
+        try:
+            conn = self._connect()
+            conn.executescript(_SCHEMA)
+            self._setup_search(conn)
+        except Exception as e:
+            print(f"對話存儲初始化失敗，本次運行的對話將不會保存: {e}")
+            self.error = e
+            if conn is not None:
+                conn.close()
+        finally:
+            # 無論成功與否都須設置，否則讀取接口會一直等待
+            self._ready.set()
+
+        if self.error is not None:
+            self._discard_loop()
+            return
+
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            flushed = []
+            try:
+                conn.execute("BEGIN")
+                for item in batch:
+                    if item is _STOP:
+                        running = False
+                    elif isinstance(item, threading.Event):
+                        flushed.append(item)
+                    else:
+                        self._apply(conn, *item)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"提交對話記錄失敗: {e}")
+                conn.rollback()
+            finally:
+                for event in flushed:
+                    event.set()
+                for _ in batch:
+                    self._queue.task_done()
+
+        conn.close()
+
+    def _apply(self, conn, method, args):
+        """在保存點中執行一項寫入，失敗時只回滾該項，同批的其他寫入照常提交"""
+        conn.execute("SAVEPOINT write_item")
+        try:
+            method(conn, *args)
+        except Exception as e:
+            conn.execute("ROLLBACK TO write_item")
+            print(f"寫入對話記錄失敗: {e}")
+        conn.execute("RELEASE write_item")
+
+    def _discard_loop(self):
+        """初始化失敗後的寫入線程：丟棄寫入，只完成序號讀取與flush，避免調用方等待"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                if isinstance(item, threading.Event):
+                    item.set()
+                else:
+                    method, args = item
+                    if method == self._load_next_seq:
+                        self._set_next_seq(*args, 0)
+            finally:
+                self._queue.task_done()
+
+    def _setup_search(self, conn):
+        """建立全文索引（舊數據庫首次升級時為已有消息重建索引）"""
+        tables = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('messages_fts', 'messages_short')"
+        )}
+        try:
+            if "messages_fts" not in tables:
+                with conn:
+                    conn.executescript(_SEARCH_SCHEMA)
+                    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+            self.search_enabled = True
+            if "messages_short" not in tables:
+                with conn:
+                    conn.executescript(_SHORT_SEARCH_SCHEMA)
+                    conn.execute("INSERT INTO messages_short(rowid, grams) "
+                                 "SELECT id, search_grams(content) FROM messages")
+            self.short_search_enabled = True
+        except sqlite3.OperationalError as e:
+            # SQLite未編譯FTS5或不支持trigram時退回逐行比對
+            print(f"全文索引不可用，搜尋將使用逐行比對: {e}")
+
+    def _insert_session(self, conn, session_id, created_at):
+        conn.execute(
+            "INSERT OR IGNORE INTO sessions (id, title, created_at, updated_at) VALUES (?, NULL, ?, ?)",
+            (session_id, created_at, created_at)
+        )
+
+    def _insert_message(self, conn, session_id, seq, message):
+        timestamp = message.get("timestamp") or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute(
+            "INSERT INTO messages (session_id, seq, role, content, model, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, seq, message["role"], message["content"], message.get("model"), timestamp)
+        )
+        # 以第一條用戶消息作為會話標題
+        title = message["content"].strip().replace("\n", " ")[:40] if message["role"] == "user" else None
+        conn.execute(
+            "UPDATE sessions SET updated_at = ?, message_count = message_count + 1, "
+            "title = COALESCE(title, ?) WHERE id = ?",
+            (timestamp, title, session_id)
+        )
+
+    # ---- 寫入接口（非阻塞） ----
+
+    def create_session(self):
+        """創建新會話
+
+        Returns:
+            新會話ID
+        """
+        session_id = uuid.uuid4().hex
+        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._seq_lock:
+            self._next_seq[session_id] = 0
+        self._queue.put((self._insert_session, (session_id, created_at)))
+        return session_id
+
+    def resume_session(self, session_id):
+        """準備向已存在的會話追加消息（非阻塞）：由寫入線程讀取下一個序號
+
+        開啟已保存的會話時調用，之後的append_message通常不需等待。
+        """
+        with self._seq_lock:
+            if session_id in self._next_seq or session_id in self._seq_loading:
+                return
+            loaded = self._seq_loading[session_id] = threading.Event()
+        self._queue.put((self._load_next_seq, (session_id, loaded)))
+
+    def append_message(self, session_id, message):
+        """追加一條消息（放入寫入隊列後立即返回）
+
+        會話的下一個序號尚未由寫入線程讀取時，等待該讀取完成。
+
+        Args:
+            session_id: 會話ID
+            message: 聊天歷史條目
+
+        Returns:
+            消息在會話中的序號
+        """
+        self.resume_session(session_id)
+        while True:
+            with self._seq_lock:
+                seq = self._next_seq.get(session_id)
+                if seq is not None:
+                    self._next_seq[session_id] = seq + 1
+                    break
+                loaded = self._seq_loading[session_id]
+            loaded.wait()
+        self._queue.put((self._insert_message, (session_id, seq, dict(message))))
+        return seq
+
+    def _load_next_seq(self, conn, session_id, loaded):
+        """讀取已存在會話的下一個序號（寫入線程）"""
+        try:
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"讀取會話序號失敗: {e}")
+            seq = 0
+        self._set_next_seq(session_id, loaded, seq)
+
+    def _set_next_seq(self, session_id, loaded, seq):
+        """記錄會話的下一個序號並喚醒等待的append_message"""
+        with self._seq_lock:
+            self._next_seq.setdefault(session_id, seq)
+            del self._seq_loading[session_id]
+        loaded.set()
+
+    def flush(self, timeout=None):
+        """等待隊列中已有的寫入全部提交
+
+        Args:
+            timeout: 最多等待的秒數，默認使用STORE_CONFIG["write_timeout"]
+
+        Returns:
+            是否在超時前完成
+        """
+        if not self._writer.is_alive():
+            return False
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        if not flushed.wait(timeout or STORE_CONFIG["write_timeout"]):
+            print("等待對話記錄寫入超時")
+            return False
+        return True
+
+    def close(self, timeout=None):
+        """寫入剩餘數據、停止寫入線程並關閉所有線程的讀取連接
+
+        Args:
+            timeout: 最多等待寫入線程的秒數，默認使用STORE_CONFIG["write_timeout"]
+        """
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout or STORE_CONFIG["write_timeout"])
+            if self._writer.is_alive():
+                print("等待對話記錄寫入超時，未寫入的消息將遺失")
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._local = threading.local()
+
+    # ---- 讀取接口 ----
+
+    def list_sessions(self, limit=100, offset=0):
+        """列出會話，最近更新的在前
+
+        Returns:
+            會話字典列表，包含id、title、created_at、updated_at、message_count
+        """
+        rows = self._get_reader().execute(
+            "SELECT id, title, created_at, updated_at, message_count FROM sessions "
+            "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def load_messages(self, session_id, limit=None, before_seq=None):
+        """按序號倒序分頁載入消息
+
+        Args:
+            session_id: 會話ID
+            limit: 最多載入的消息數，默認使用STORE_CONFIG["initial_messages"]
+            before_seq: 只載入序號小於此值的消息，None表示從最新一條開始
+
+        Returns:
+            元組 (按時間順序排列的消息列表, 是否還有更早的消息)
+        """
+        limit = limit or STORE_CONFIG["initial_messages"]
+        if before_seq is None:
+            before_seq = 2 ** 62
+        rows = self._get_reader().execute(
+            "SELECT seq, role, content, model, timestamp FROM messages "
+            "WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, before_seq, limit + 1)
+        ).fetchall()
+
+        has_more = len(rows) > limit
+        messages = [_row_to_message(row) for row in reversed(rows[:limit])]
+        return messages, has_more
+
+    def count_messages(self, session_id):
+        """會話中已寫入的消息數"""
+        row = self._get_reader().execute(
+            "SELECT message_count FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def iter_messages(self, session_id, page_size=1000):
+        """按時間順序逐頁讀取會話的所有消息（用於導出，記憶體佔用固定）
+
+        Yields:
+            聊天歷史條目
+        """
+        conn = self._get_reader()
+        last_seq = -1
+        while True:
+            rows = conn.execute(
+                "SELECT seq, role, content, model, timestamp FROM messages "
+                "WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (session_id, last_seq, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _row_to_message(row)
+            last_seq = rows[-1]["seq"]
+
+    def load_messages_from(self, session_id, from_seq):
+        """載入從指定序號到最新的所有消息（用於從搜尋結果開啟會話）
+
+        Returns:
+            元組 (按時間順序排列的消息列表, 是否還有更早的消息)
+        """
+        rows = self._get_reader().execute(
+            "SELECT seq, role, content, model, timestamp FROM messages "
+            "WHERE session_id = ? AND seq >= ? ORDER BY seq",
+            (session_id, from_seq)
+        ).fetchall()
+        messages = [_row_to_message(row) for row in rows]
+        return messages, from_seq > 0
+
+    def search(self, query, limit=50, model=None):
+        """全文搜尋消息，結果按時間倒序排列
+
+        Args:
+            query: 搜尋文字，以空白分隔的多個詞須同時出現
+            limit: 最多返回的結果數
+            model: 只搜尋指定模型的回應
+
+        Returns:
+            結果字典列表，包含session_id、session_title、seq、role、model、timestamp、snippet
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        conn = self._get_reader()
+        model_filter = " AND m.model = ?" if model else ""
+        model_args = (model,) if model else ()
+
+        long_terms = [term for term in terms if len(term) >= _MIN_INDEXED_QUERY]
+        short_queries = [_short_term_query(term) for term in terms if len(term) < _MIN_INDEXED_QUERY]
+        # 每個詞作為短語查詢，避免FTS語法字元被解釋
+        long_match = " AND ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+
+        if self.search_enabled and not short_queries:
+            rows = conn.execute(
+                "SELECT m.session_id, s.title AS session_title, m.seq, m.role, m.model, m.timestamp, "
+                "snippet(messages_fts, 0, '【', '】', '…', 16) AS snippet "
+                "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                "JOIN sessions s ON s.id = m.session_id "
+                "WHERE messages_fts MATCH ?" + model_filter + " ORDER BY messages_fts.rowid DESC LIMIT ?",
+                (long_match,) + model_args + (limit,)
+            ).fetchall()
+        elif self.short_search_enabled and None not in short_queries:
+            # 以短詞索引按時間倒序查找，同時有長詞時再以trigram索引篩選
+            long_filter = ""
+            long_args = ()
+            if long_terms:
+                long_filter = " AND m.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)"
+                long_args = (long_match,)
+            first_term = next(term for term in terms if len(term) < _MIN_INDEXED_QUERY)
+            rows = conn.execute(
+                "SELECT m.session_id, s.title AS session_title, m.seq, m.role, m.model, m.timestamp, "
+                "substr(m.content, max(instr(search_fold(m.content), ?) - 20, 1), 80) AS snippet "
+                "FROM messages_short JOIN messages m ON m.id = messages_short.rowid "
+                "JOIN sessions s ON s.id = m.session_id "
+                "WHERE messages_short MATCH ?" + long_filter + model_filter +
+                " ORDER BY messages_short.rowid DESC LIMIT ?",
+                (first_term.lower(), " AND ".join(short_queries)) + long_args + model_args + (limit,)
+            ).fetchall()
+        else:
+            # 沒有可用的索引（或短詞中含標點），按時間倒序逐行比對
+            like_filter = " AND ".join("m.content LIKE ? ESCAPE '\\'" for _ in terms)
+            like_args = tuple("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                              for term in terms)
+            rows = conn.execute(
+                "SELECT m.session_id, s.title AS session_title, m.seq, m.role, m.model, m.timestamp, "
+                "substr(m.content, 1, 80) AS snippet "
+                "FROM messages m JOIN sessions s ON s.id = m.session_id "
+                "WHERE " + like_filter + model_filter + " ORDER BY m.id DESC LIMIT ?",
+                like_args + model_args + (limit,)
+            ).fetchall()
+
+        return [dict(row) for row in rows]
@@ -0,0 +1,137 @@
+import threading
+
+
+class BackgroundLoop:
+    """在背景線程中常駐運行的asyncio事件循環
+
+    所有網絡請求共用同一個事件循環，避免每次發送消息都重新創建線程與事件循環。
+    asyncio在背景線程啟動時才導入，不延長應用程式的啟動時間；事件循環就緒前
+    提交的協程與回調先放入隊列，調用線程（通常是Tk主線程）不必等待導入完成。
+    """
+
+    def __init__(self, name="ChatEventLoop"):
+        """初始化背景事件循環
+
+        Args:
+            name: 背景線程名稱
+        """
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        # 事件循環就緒前提交的回調 [(函數, 參數), ...]；以鎖保護，確保不遺漏也不重複
+        self._lock = threading.Lock()
+        self._queued = []
+
+    def is_running(self):
+        """事件循環是否正在運行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, wait=False):
+        """啟動背景線程（重複調用不會創建新線程）
+
+        Args:
+            wait: 是否等待事件循環就緒（默認不等待，就緒前提交的工作會排隊）
+
+        Returns:
+            事件循環；未等待且尚未就緒時為None
+        """
+        with self._lock:
+            if not self.is_running():
+                self._ready.clear()
+                self.loop = None
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        if wait:
+            self._ready.wait()
+        return self.loop
+
+    def _run(self):
+        """背景線程主體"""
+        import asyncio
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        with self._lock:
+            self.loop = loop
+            self._ready.set()
+            # 按提交順序執行就緒前排隊的工作（在鎖內安排，排在之後提交的工作之前）
+            for callback, args in self._queued:
+                loop.call_soon(callback, *args)
+            self._queued = []
+        try:
+            self.loop.run_forever()
+        finally:
+            # 取消殘留任務並關閉事件循環
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def submit(self, coro):
+        """從任意線程提交協程到事件循環（不等待事件循環就緒）
+
+        Returns:
+            concurrent.futures.Future
+        """
+        self.start()
+        with self._lock:
+            if not self._ready.is_set():
+                import concurrent.futures
+                future = concurrent.futures.Future()
+                self._queued.append((self._start_queued, (coro, future)))
+                return future
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _start_queued(self, coro, future):
+        """在事件循環中開始就緒前提交的協程，結果傳遞給submit返回的future"""
+        import concurrent.futures
+        if future.cancelled():
+            coro.close()
+            return
+        task = self.loop.create_task(coro)
+
+        def on_future_done(future):
+            # 與run_coroutine_threadsafe相同：提交方取消future時取消任務
+            if future.cancelled():
+                self.loop.call_soon_threadsafe(task.cancel)
+
+        def on_task_done(task):
+            try:
+                if future.cancelled():
+                    return
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+            except concurrent.futures.InvalidStateError:
+                # 提交方在此期間取消了future
+                pass
+
+        future.add_done_callback(on_future_done)
+        task.add_done_callback(on_task_done)
+
+    def call_soon(self, callback, *args):
+        """線程安全地在事件循環中調用函數（就緒前排隊，未啟動時忽略）"""
+        if not self.is_running():
+            return
+        with self._lock:
+            if not self._ready.is_set():
+                self._queued.append((callback, args))
+                return
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self, timeout=5):
+        """停止事件循環並等待背景線程結束"""
+        if not self.is_running():
+            return
+        if not self._ready.wait(timeout):
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
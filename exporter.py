@@ -0,0 +1,110 @@
+import io
+import gzip
+import json
+import datetime
+
+# 寫入緩衝區大小
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def _role_name(message):
+    """消息的顯示角色名稱"""
+    if message["role"] == "user":
+        return "您"
+    # 使用模型名稱，若無則默認為「AI」
+    return message.get("model", "AI").split('/')[-1]
+
+
+def _timestamp(message):
+    return message.get("timestamp") or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def iter_text(messages):
+    """以純文字格式逐條產生導出內容"""
+    yield "===== AI 聊天助手對話記錄 =====\n"
+    yield f"導出時間: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    for message in messages:
+        yield f"[{_timestamp(message)}] {_role_name(message)}: {message['content']}\n\n"
+
+
+def iter_markdown(messages):
+    """以Markdown格式逐條產生導出內容"""
+    yield "# AI 聊天助手對話記錄\n\n"
+    yield f"導出時間: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    for message in messages:
+        yield f"### {_role_name(message)} · {_timestamp(message)}\n\n{message['content']}\n\n---\n\n"
+
+
+def iter_jsonl(messages):
+    """以JSON Lines格式逐條產生導出內容（每行一條消息）"""
+    for message in messages:
+        record = {
+            "role": message["role"],
+            "content": message["content"],
+            "timestamp": _timestamp(message),
+        }
+        if message.get("model"):
+            record["model"] = message["model"]
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+# 副檔名到格式的映射
+EXPORT_FORMATS = {
+    ".txt": iter_text,
+    ".md": iter_markdown,
+    ".jsonl": iter_jsonl,
+}
+
+
+def get_export_format(file_path):
+    """根據檔名判斷導出格式
+
+    Returns:
+        元組 (格式產生函數, 是否gzip壓縮)
+    """
+    lower = file_path.lower()
+    compressed = lower.endswith(".gz")
+    if compressed:
+        lower = lower[:-3]
+    for extension, formatter in EXPORT_FORMATS.items():
+        if lower.endswith(extension):
+            return formatter, compressed
+    return iter_text, compressed
+
+
+def export_messages(messages, file_path, total=None, progress_callback=None, progress_interval=500):
+    """以串流方式將消息寫入檔案
+
+    消息與輸出內容都逐條處理，記憶體佔用不隨對話大小增長。
+
+    Args:
+        messages: 消息的可迭代對象（可為生成器）
+        file_path: 輸出檔案路徑，副檔名決定格式，以.gz結尾時使用gzip壓縮
+        total: 消息總數（用於顯示進度），未知時為None
+        progress_callback: 進度回調，參數為 (已寫入消息數, 總數)
+        progress_interval: 每寫入多少條消息回報一次進度
+
+    Returns:
+        寫入的消息數
+    """
+    formatter, compressed = get_export_format(file_path)
+
+    count = 0
+
+    def counted(items):
+        nonlocal count
+        for message in items:
+            yield message
+            count += 1
+            if progress_callback and count % progress_interval == 0:
+                progress_callback(count, total)
+
+    with open(file_path, "wb", buffering=_WRITE_BUFFER_SIZE) as raw:
+        stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if compressed else raw
+        with io.TextIOWrapper(stream, encoding="utf-8") as output:
+            for chunk in formatter(counted(messages)):
+                output.write(chunk)
+
+    if progress_callback:
+        progress_callback(count, total)
+    return count
@@ -8,9 +8,16 @@ AI聊天助手主程序入口
 - ui_utils.py: UI工具函數
 - chat_manager.py: 聊天邏輯管理
 - app.py: 主應用程序和GUI
+- batch.py: 無界面的批次模式（python main.py --batch prompts.jsonl）
 """
 
-from app import main
+import sys
 
 if __name__ == "__main__":
+    # 批次模式不導入GUI模組（及tkinter）
+    if "--batch" in sys.argv[1:]:
+        from batch import main as batch_main
+        sys.exit(batch_main())
+
+    from app import main
     main()
@@ -0,0 +1,215 @@
+import re
+import tkinter as tk
+from config import DEFAULT_FONT_FAMILY, MARKDOWN_CONFIG
+
+# 行首的標題與代碼塊圍欄
+_HEADING = re.compile(r"(#{1,6})[ \t]+")
+_FENCE = re.compile(r"[ ]{0,3}(`{3,}|~{3,})")
+# 行內代碼（相同數量的反引號包圍）與粗體
+_INLINE = re.compile(r"(`+)(.+?)\1|\*\*(?=\S)(.+?)(?<=\S)\*\*")
+
+# Tk 8.6以UTF-16保存文字，BMP以外的字元（如emoji）佔兩個索引位置
+_SURROGATE_COLUMNS = tk.TkVersion < 9
+
+
+def tk_column(line, index):
+    """將字串位置轉換為Tk文字框中的列號"""
+    if _SURROGATE_COLUMNS:
+        return index + sum(1 for char in line[:index] if ord(char) > 0xFFFF)
+    return index
+
+
+def fence_language(line):
+    """代碼塊開啟圍欄上的語言名稱（如"```python"得到"python"），沒有時返回空字串"""
+    match = _FENCE.match(line)
+    info = line[match.end():].split() if match else []
+    return info[0].lower() if info else ""
+
+
+def _inline_spans(line, offset=0):
+    """解析行內的粗體與行內代碼
+
+    Returns:
+        [(標籤, 開始位置, 結束位置), ...]，標記符號本身以md_marker隱藏
+    """
+    spans = []
+    for match in _INLINE.finditer(line, offset):
+        start, end = match.span()
+        if match.group(1):
+            tag, marker = "md_inline_code", len(match.group(1))
+        else:
+            tag, marker = "md_bold", 2
+        spans.append(("md_marker", start, start + marker))
+        spans.append((tag, start + marker, end - marker))
+        spans.append(("md_marker", end - marker, end))
+    return spans
+
+
+class MarkdownStream:
+    """串流回應的增量Markdown解析
+
+    文字到達時立即原樣輸出（代碼塊內的文字直接帶上代碼標籤），每當一行
+    完成才解析該行一次，得出標題、粗體、行內代碼等標籤範圍，由主線程只對
+    這一行調用tag_add。已完成的行不再重新解析，解析成本與回應長度成正比。
+    Markdown標記符號保留在文字中（複製與搜索得到原文），只以elide標籤隱藏。
+    """
+
+    def __init__(self, base_tag="assistant"):
+        """初始化解析狀態
+
+        Args:
+            base_tag: 所有文字共有的標籤
+        """
+        self._base_tags = (base_tag,)
+        self._code_tags = (base_tag, "md_code")
+        # 當前未完成的行
+        self._line = []
+        # 位於代碼塊內時為開啟的圍欄（如"```"），否則為None
+        self._fence = None
+
+    @property
+    def in_code_block(self):
+        """已解析的行是否停在代碼塊內"""
+        return self._fence is not None
+
+    def _current_tags(self):
+        """當前行在完成前使用的標籤"""
+        return self._code_tags if self._fence else self._base_tags
+
+    def parse_line(self, line):
+        """解析完整的一行並更新代碼塊狀態
+
+        Args:
+            line: 一行文字（可含結尾的換行）
+
+        Returns:
+            [(標籤, 開始位置, 結束位置), ...]，結束位置為None表示整行（含換行）
+        """
+        match = _FENCE.match(line)
+        if self._fence:
+            # 結束圍欄須使用相同字元、長度不短於開啟圍欄，且之後沒有其他文字
+            if (match and match.group(1)[0] == self._fence[0] and len(match.group(1)) >= len(self._fence)
+                    and not line[match.end():].strip()):
+                self._fence = None
+                return [("md_fence", 0, None)]
+            return []
+        if match:
+            self._fence = match.group(1)
+            return [("md_code", 0, None), ("md_fence", 0, None)]
+
+        match = _HEADING.match(line)
+        if match:
+            level = min(len(match.group(1)), 3)
+            return [(f"md_h{level}", 0, None), ("md_marker", 0, match.end())] + _inline_spans(line, match.end())
+        if line.startswith("|"):
+            return [("md_table", 0, None)] + _inline_spans(line)
+        return _inline_spans(line)
+
+    def feed(self, text):
+        """處理新到達的文字（背景線程調用）
+
+        Args:
+            text: 新到達的文字片段
+
+        Returns:
+            [(文字, 標籤, 標籤範圍), ...]，文字按行切分；片段結束一行且該行有格式時，
+            標籤範圍為以Tk列號表示的[(標籤, 開始列, 結束列)]，應在文字寫入後以
+            apply_line_tags套用，否則為None
+        """
+        pieces = []
+        start = 0
+        end = text.find("\n")
+        while end >= 0:
+            piece = text[start:end + 1]
+            self._line.append(piece)
+            line = "".join(self._line)
+            self._line = []
+            tags = self._current_tags()
+            spans = self.parse_line(line)
+            if spans:
+                spans = [(tag, tk_column(line, first), None if last is None else tk_column(line, last))
+                         for tag, first, last in spans]
+            pieces.append((piece, tags, spans or None))
+            start = end + 1
+            end = text.find("\n", start)
+        if start < len(text):
+            piece = text[start:]
+            self._line.append(piece)
+            pieces.append((piece, self._current_tags(), None))
+        return pieces
+
+    def finish(self):
+        """結束串流：為未完成的最後一行補上換行並解析（回應被取消時調用）
+
+        Returns:
+            與feed相同格式的片段；沒有未完成的行時為空列表
+        """
+        return self.feed("\n") if self._line else []
+
+    def segments(self, text):
+        """將完整的文字轉換為(文字, 標籤)片段（用於渲染聊天歷史）
+
+        Args:
+            text: 完整的消息內容
+
+        Returns:
+            [(文字, 標籤元組), ...]
+        """
+        segments = []
+        start = 0
+        while start < len(text):
+            end = text.find("\n", start)
+            end = len(text) if end < 0 else end + 1
+            line = text[start:end]
+            start = end
+
+            tags = self._current_tags()
+            spans = self.parse_line(line)
+            tags += tuple(tag for tag, _, last in spans if last is None)
+            position = 0
+            for tag, first, last in spans:
+                if last is None:
+                    continue
+                if first > position:
+                    segments.append((line[position:first], tags))
+                segments.append((line[first:last], tags + (tag,)))
+                position = last
+            if position < len(line):
+                segments.append((line[position:], tags))
+        return segments
+
+
+def apply_line_tags(text_widget, spans):
+    """為剛寫入的一行套用標籤範圍（主線程調用，經由渲染隊列緊接該行執行）
+
+    Args:
+        text_widget: 聊天顯示區
+        spans: MarkdownStream.feed返回的標籤範圍
+    """
+    # 該行以換行結尾，寫入後位於文字框最後一行的上一行
+    line = int(text_widget.index("end-1c").split(".")[0]) - 1
+    for tag, first, last in spans:
+        end = f"{line + 1}.0" if last is None else f"{line}.{last}"
+        text_widget.tag_add(tag, f"{line}.{first}", end)
+
+
+def configure_markdown_tags(text_widget, main_size):
+    """設置Markdown標籤的樣式（字體大小改變時重新調用）
+
+    Args:
+        text_widget: 聊天顯示區
+        main_size: 正文字體大小
+    """
+    code_font = (MARKDOWN_CONFIG["code_font_family"], main_size)
+    # 後創建的標籤優先級較高：標題字體覆蓋其中的粗體，隱藏標記最優先
+    text_widget.tag_configure("md_bold", font=(DEFAULT_FONT_FAMILY, main_size, "bold"))
+    text_widget.tag_configure("md_inline_code", font=code_font,
+                              foreground=MARKDOWN_CONFIG["inline_code_fg"],
+                              background=MARKDOWN_CONFIG["code_bg"])
+    text_widget.tag_configure("md_code", font=code_font, background=MARKDOWN_CONFIG["code_bg"])
+    text_widget.tag_configure("md_fence", foreground=MARKDOWN_CONFIG["fence_fg"])
+    text_widget.tag_configure("md_table", font=code_font)
+    for level in (3, 2, 1):
+        size = round(main_size * MARKDOWN_CONFIG["heading_scales"][level])
+        text_widget.tag_configure(f"md_h{level}", font=(DEFAULT_FONT_FAMILY, size, "bold"))
+    text_widget.tag_configure("md_marker", elide=True)
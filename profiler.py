@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+import traceback
+import contextlib
+import inspect
+from config import PROFILING_CONFIG
+
+
+def _describe_callback(func):
+    """Tk回調的可讀名稱（含定義位置）"""
+    # after()的回調包裝在tkinter內部的callit閉包中，取出真正的函數
+    if getattr(func, "__name__", "") == "callit" and getattr(func, "__closure__", None):
+        for cell in func.__closure__:
+            if hasattr(cell.cell_contents, "__qualname__"):
+                func = cell.cell_contents
+                break
+    code = getattr(func, "__code__", None) or getattr(getattr(func, "__func__", None), "__code__", None)
+    name = getattr(func, "__qualname__", repr(func))
+    if code is None:
+        return name
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SessionProfiler:
+    """可選的性能分析（設置PROFILING_CONFIG["env_var"]環境變數時啟用）
+
+    包裝的函數每次調用都記錄次數與耗時；同步函數最外層的調用同時以cProfile
+    分析，嵌套在其中的包裝函數只計時，其耗時已包含在外層的分析結果中。
+    協程函數只記錄經過的時間，不以cProfile分析：協程在await期間讓出事件循環，
+    分析器若保持開啟，同一線程上其他回調與協程的耗時都會算在它身上，且會
+    阻止並行的協程分析；協程中的同步熱點（例如串流中的_on_message_received）
+    應另行包裝。watch_tk另外記錄阻塞Tk主循環超過
+    閾值的回調，並在主循環停頓時採樣主線程的堆疊。
+    每次運行的結果保存在output_dir下以啟動時間命名的目錄中。
+    """
+
+    def __init__(self, output_dir=None, slow_callback_ms=None):
+        """初始化性能分析
+
+        Args:
+            output_dir: 保存分析結果的目錄，默認使用PROFILING_CONFIG["output_dir"]
+            slow_callback_ms: 記錄Tk回調與主循環停頓的閾值（毫秒）
+        """
+        output_dir = output_dir or PROFILING_CONFIG["output_dir"]
+        self.session_dir = os.path.join(output_dir, time.strftime("%Y%m%d_%H%M%S") + f"_{os.getpid()}")
+        os.makedirs(self.session_dir, exist_ok=True)
+        self.slow_threshold = (slow_callback_ms or PROFILING_CONFIG["slow_callback_ms"]) / 1000
+
+        self._profiles = {}
+        # {名稱: [調用次數, 總耗時, 最長耗時]}
+        self._timings = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._log_file = open(os.path.join(self.session_dir, "slow_callbacks.log"), "a", encoding="utf-8")
+
+        self._original_call = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    # ---- 函數包裝 ----
+
+    def wrap(self, func, name=None):
+        """包裝函數（同步函數或協程函數）
+
+        Returns:
+            包裝後的函數
+        """
+        name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            # 只計時，不跨越await開啟cProfile（見類的說明）
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self._record(name, time.perf_counter() - start)
+            async_wrapper.__wrapped__ = func
+            return async_wrapper
+
+        def wrapper(*args, **kwargs):
+            with self._measure(name):
+                return func(*args, **kwargs)
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def patch(self, owner, attribute, name=None):
+        """以包裝後的函數替換owner（類或模組）上的屬性"""
+        setattr(owner, attribute, self.wrap(getattr(owner, attribute), name))
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        profile = None
+        if not getattr(self._local, "active", False):
+            with self._lock:
+                if name not in self._profiles:
+                    self._profiles[name] = cProfile.Profile()
+                profile = self._profiles[name]
+            try:
+                profile.enable()
+                self._local.active = True
+            except ValueError:
+                # 其他線程的分析仍在進行（Python 3.12起同一時間只能有一個分析器），本次只計時
+                profile = None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self._local.active = False
+            self._record(name, elapsed)
+
+    def _record(self, name, elapsed):
+        """累計一次調用的耗時"""
+        with self._lock:
+            timing = self._timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    # ---- Tk主循環 ----
+
+    def watch_tk(self, root, heartbeat_ms=50):
+        """記錄阻塞主循環的Tk回調，並在主循環停頓時採樣主線程堆疊
+
+        Args:
+            root: Tk根視窗
+            heartbeat_ms: 主循環心跳間隔（毫秒）
+        """
+        import tkinter
+        self._original_call = original_call = tkinter.CallWrapper.__call__
+        profiler = self
+
+        # 所有Tcl到Python的回調（事件綁定、after、按鈕命令）都經過CallWrapper
+        def timed_call(wrapper, *args):
+            start = time.perf_counter()
+            try:
+                return original_call(wrapper, *args)
+            finally:
+                elapsed = time.perf_counter() - start
+                if elapsed > profiler.slow_threshold:
+                    profiler.log(f"Tk回調阻塞主循環 {elapsed * 1000:.1f} ms: {_describe_callback(wrapper.func)}")
+
+        tkinter.CallWrapper.__call__ = timed_call
+
+        main_thread = threading.get_ident()
+        last_beat = [time.perf_counter()]
+
+        def beat():
+            last_beat[0] = time.perf_counter()
+            if not self._stopped.is_set():
+                root.after(heartbeat_ms, beat)
+
+        def watch():
+            sampled = None
+            while not self._stopped.wait(heartbeat_ms / 1000):
+                stalled = time.perf_counter() - last_beat[0]
+                if stalled <= self.slow_threshold + heartbeat_ms / 1000:
+                    sampled = None
+                elif sampled != last_beat[0]:
+                    # 每次停頓只採樣一次
+                    sampled = last_beat[0]
+                    frame = sys._current_frames().get(main_thread)
+                    stack = "".join(traceback.format_stack(frame, limit=12)) if frame else ""
+                    self.log(f"主循環已停頓 {stalled * 1000:.0f} ms，主線程堆疊:\n{stack}")
+
+        beat()
+        self._watchdog = threading.Thread(target=watch, name="ProfilerWatchdog", daemon=True)
+        self._watchdog.start()
+
+    def log(self, message):
+        """寫入慢回調日誌"""
+        line = f"[{time.strftime('%H:%M:%S')}] {message}\n"
+        with self._lock:
+            if not self._log_file.closed:
+                self._log_file.write(line)
+                self._log_file.flush()
+
+    # ---- 保存 ----
+
+    def get_timings(self):
+        """獲取各函數的調用統計
+
+        Returns:
+            {名稱: {"calls", "total_ms", "avg_ms", "max_ms"}}
+        """
+        with self._lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "total_ms": round(total * 1000, 3),
+                    "avg_ms": round(total / calls * 1000, 3),
+                    "max_ms": round(longest * 1000, 3),
+                }
+                for name, (calls, total, longest) in self._timings.items()
+            }
+
+    def save(self):
+        """停止監視並將分析結果寫入session_dir（視窗關閉時調用）
+
+        每個函數保存為「名稱.prof」（可用pstats或snakeviz查看），調用統計保存為timings.json。
+        """
+        self._stopped.set()
+        if self._original_call is not None:
+            import tkinter
+            tkinter.CallWrapper.__call__ = self._original_call
+            self._original_call = None
+
+        with self._lock:
+            profiles = list(self._profiles.items())
+        for name, profile in profiles:
+            profile.dump_stats(os.path.join(self.session_dir, f"{name}.prof"))
+        with open(os.path.join(self.session_dir, "timings.json"), "w", encoding="utf-8") as output:
+            json.dump(self.get_timings(), output, ensure_ascii=False, indent=2)
+
+        with self._lock:
+            self._log_file.close()
+        print(f"性能分析結果已保存到: {self.session_dir}")
@@ -0,0 +1,162 @@
+import time
+import collections
+import tkinter as tk
+
+
+class RenderQueue:
+    """串流文字渲染隊列
+
+    背景線程只負責把文字片段放入隊列，Tk主循環按固定幀間隔取出，
+    將同一幀內的所有片段合併為一次insert和一次see調用。
+    主線程跟不上時，異步生產者經由wait_for_capacity等待，積壓不會無限增長。
+    """
+
+    def __init__(self, text_widget, frame_ms=16, max_pending=2000):
+        """初始化渲染隊列
+
+        Args:
+            text_widget: 目標文字框
+            frame_ms: 每幀間隔（毫秒）
+            max_pending: 待渲染項目數上限，超過時異步生產者應等待
+        """
+        self.text_widget = text_widget
+        self.frame_ms = frame_ms
+        self.max_pending = max_pending
+        # deque的append/popleft是線程安全的，背景線程可直接push
+        self._pending = collections.deque()
+        self._after_id = None
+
+        # 是否在寫入後自動捲動到底部（用戶向上捲動閱讀時關閉）
+        self.auto_scroll = True
+
+        # 吞吐量統計
+        self.frames = 0
+        self.tokens = 0
+        self.chars = 0
+
+        # 渲染延遲統計：片段放入隊列到寫入文字框的時間（每幀取最早的片段）
+        self._first_pending_at = None
+        self._lag_sum = 0.0
+        self._lag_count = 0
+        self._lag_max = 0.0
+
+    def push(self, text, tag=None):
+        """放入待渲染的文字片段（可從任意線程調用）"""
+        if text:
+            if self._first_pending_at is None:
+                self._first_pending_at = time.perf_counter()
+            self._pending.append((text, tag))
+
+    def push_call(self, func, *args):
+        """放入一個在渲染到此位置時於主線程執行的函數（例如設置標記）"""
+        self._pending.append((None, (func, args)))
+
+    def pending_count(self):
+        """尚未寫入文字框的項目數"""
+        return len(self._pending)
+
+    async def wait_for_capacity(self, interval=0.01):
+        """積壓超過上限時讓出事件循環，直到主線程追上（背壓）"""
+        import asyncio
+        while self._after_id is not None and len(self._pending) >= self.max_pending:
+            await asyncio.sleep(interval)
+
+    def start(self):
+        """開始按幀渲染（須在主線程調用）"""
+        if self._after_id is None:
+            self._after_id = self.text_widget.after(self.frame_ms, self._on_frame)
+
+    def stop(self):
+        """停止渲染並寫入剩餘內容（須在主線程調用）"""
+        if self._after_id is not None:
+            self.text_widget.after_cancel(self._after_id)
+            self._after_id = None
+        self.flush()
+
+    def _on_frame(self):
+        """每幀的回調"""
+        try:
+            self.flush()
+        finally:
+            self._after_id = self.text_widget.after(self.frame_ms, self._on_frame)
+
+    def flush(self):
+        """將隊列中的片段一次性寫入文字框"""
+        if not self._pending:
+            return
+        if self._first_pending_at is not None:
+            lag = time.perf_counter() - self._first_pending_at
+            self._first_pending_at = None
+            self._lag_sum += lag
+            self._lag_count += 1
+            self._lag_max = max(self._lag_max, lag)
+
+        # 合併相同標籤的連續片段；遇到函數項時先寫入之前的文字
+        runs = []
+        count = 0
+        while self._pending:
+            text, tag = self._pending.popleft()
+            if text is None:
+                self._insert_runs(runs)
+                runs = []
+                func, args = tag
+                func(*args)
+                continue
+            count += 1
+            if runs and runs[-1][1] == tag:
+                runs[-1][0].append(text)
+            else:
+                runs.append(([text], tag))
+        self._insert_runs(runs)
+
+        if self.auto_scroll:
+            self.text_widget.see(tk.END)
+
+        self.frames += 1
+        self.tokens += count
+
+    def _insert_runs(self, runs):
+        """以一次insert調用寫入多段不同標籤的文字"""
+        if not runs:
+            return
+        args = []
+        for parts, tag in runs:
+            text = "".join(parts)
+            self.chars += len(text)
+            args.append(text)
+            args.append(tag or ())
+        self.text_widget.insert(tk.END, *args)
+
+    def get_stats(self):
+        """獲取渲染統計
+
+        Returns:
+            包含幀數、片段數、字元數及平均每幀片段數的字典
+        """
+        return {
+            "frames": self.frames,
+            "tokens": self.tokens,
+            "chars": self.chars,
+            "tokens_per_frame": self.tokens / self.frames if self.frames else 0.0
+        }
+
+    def reset_lag_stats(self):
+        """重新開始統計渲染延遲（須在主線程調用，通常經由push_call在請求開始時執行）"""
+        self._lag_sum = 0.0
+        self._lag_count = 0
+        self._lag_max = 0.0
+
+    def take_lag_stats(self):
+        """獲取自上次重置以來的渲染延遲並重置
+
+        Returns:
+            包含render_lag_avg_ms、render_lag_max_ms的字典，沒有數據時值為None
+        """
+        if not self._lag_count:
+            return {"render_lag_avg_ms": None, "render_lag_max_ms": None}
+        stats = {
+            "render_lag_avg_ms": round(self._lag_sum / self._lag_count * 1000, 2),
+            "render_lag_max_ms": round(self._lag_max * 1000, 2),
+        }
+        self.reset_lag_stats()
+        return stats
@@ -0,0 +1,134 @@
+import threading
+from config import SCHEDULER_CONFIG
+
+
+class ScheduledRequest:
+    """調度器中的一個請求"""
+
+    def __init__(self, key, model_id, coro_factory):
+        """初始化請求
+
+        Args:
+            key: 所屬對話的鍵，同一對話的請求按順序逐個發送
+            model_id: 模型ID，用於限制每個模型的並行數
+            coro_factory: 無參數函數，開始發送時調用以產生協程
+        """
+        self.key = key
+        self.model_id = model_id
+        self.coro_factory = coro_factory
+        self.task = None
+        # 請求結束後得到協程的返回值；排隊中被取消時為已取消狀態
+        # （延遲導入：concurrent.futures會連帶導入logging，不在GUI啟動路徑上導入）
+        import concurrent.futures
+        self.future = concurrent.futures.Future()
+
+
+class RequestScheduler:
+    """運行在背景事件循環上的請求調度器
+
+    同一對話的請求逐個發送（下一條提示需要上一條回應作為上下文），
+    不同對話可並行；同時受總並行數與每個模型並行數的限制。超出限制的
+    請求按提交順序排隊，有空位時立即發送。多個對話共用同一個事件循環，
+    不需要為每個對話創建線程。
+    """
+
+    def __init__(self, loop_runner, max_in_flight=None, max_in_flight_per_model=None):
+        """初始化調度器
+
+        Args:
+            loop_runner: BackgroundLoop實例
+            max_in_flight: 同時發送的最大請求數，默認使用SCHEDULER_CONFIG
+            max_in_flight_per_model: 每個模型同時發送的最大請求數，默認使用SCHEDULER_CONFIG
+        """
+        self.loop_runner = loop_runner
+        self.max_in_flight = max_in_flight or SCHEDULER_CONFIG["max_in_flight"]
+        self.max_in_flight_per_model = max_in_flight_per_model or SCHEDULER_CONFIG["max_in_flight_per_model"]
+
+        # 排隊與發送中的請求；以鎖保護，submit/cancel_queued可從任意線程調用
+        self._lock = threading.Lock()
+        self._queued = []
+        self._running = []
+
+    def submit(self, key, model_id, coro_factory):
+        """提交請求（可從任意線程調用）
+
+        Returns:
+            ScheduledRequest實例
+        """
+        request = ScheduledRequest(key, model_id, coro_factory)
+        with self._lock:
+            self._queued.append(request)
+        self.loop_runner.start()
+        self.loop_runner.call_soon(self._dispatch)
+        return request
+
+    def cancel_queued(self, key):
+        """取消某對話所有排隊中的請求
+
+        Returns:
+            取消的請求數
+        """
+        with self._lock:
+            removed = [request for request in self._queued if request.key == key]
+            self._queued = [request for request in self._queued if request.key != key]
+        for request in removed:
+            request.future.cancel()
+        return len(removed)
+
+    def queued_count(self, key=None):
+        """排隊中的請求數（key為None時統計所有對話）"""
+        with self._lock:
+            return sum(1 for request in self._queued if key is None or request.key == key)
+
+    def is_busy(self, key):
+        """對話是否有排隊或發送中的請求"""
+        with self._lock:
+            return any(request.key == key for request in self._queued + self._running)
+
+    def _can_start(self, request, running_keys, model_counts):
+        if request.key in running_keys:
+            return False
+        return model_counts.get(request.model_id, 0) < self.max_in_flight_per_model
+
+    def _dispatch(self):
+        """發送所有可以開始的請求（在事件循環中調用）"""
+        started = []
+        with self._lock:
+            running_keys = {request.key for request in self._running}
+            model_counts = {}
+            for request in self._running:
+                model_counts[request.model_id] = model_counts.get(request.model_id, 0) + 1
+
+            # 排隊列表按提交順序排列，先提交的先發送
+            for request in list(self._queued):
+                if len(self._running) >= self.max_in_flight:
+                    break
+                if not self._can_start(request, running_keys, model_counts):
+                    continue
+                self._queued.remove(request)
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+                self._running.append(request)
+                running_keys.add(request.key)
+                model_counts[request.model_id] = model_counts.get(request.model_id, 0) + 1
+                started.append(request)
+
+        for request in started:
+            request.task = self.loop_runner.loop.create_task(request.coro_factory())
+            request.task.add_done_callback(lambda task, request=request: self._on_done(request))
+
+    def _on_done(self, request):
+        """請求結束：釋放名額、傳遞結果並發送下一個請求"""
+        with self._lock:
+            self._running.remove(request)
+
+        task = request.task
+        if task.cancelled():
+            import concurrent.futures
+            request.future.set_exception(concurrent.futures.CancelledError())
+        elif task.exception() is not None:
+            request.future.set_exception(task.exception())
+        else:
+            request.future.set_result(task.result())
+
+        self._dispatch()
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from config import RESPONSE_CACHE_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    deltas TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);
+"""
+
+
+def cache_key(payload):
+    """以請求體計算快取鍵
+
+    請求體由WireEncoder以固定順序緊湊編碼（只含role/content、溫度已四捨五入），
+    相同的模型、消息、溫度與max_tokens必定得到相同的位元組。
+    """
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ResponseCache:
+    """磁碟上的回應快取
+
+    以請求體的雜湊為鍵保存回應的增量片段，命中時按原片段重播，
+    使聊天顯示區的行為與真實串流一致。超過有效期的條目視為未命中；
+    條目數或總大小超過上限時，按最近使用時間淘汰最舊的條目。
+    """
+
+    def __init__(self, db_path=None, max_entries=None, max_bytes=None, ttl_seconds=None):
+        """初始化回應快取
+
+        Args:
+            db_path: 數據庫檔案路徑，默認使用RESPONSE_CACHE_CONFIG["db_path"]
+            max_entries: 最多保存的回應數
+            max_bytes: 所有回應的總大小上限（位元組）
+            ttl_seconds: 有效期（秒）
+        """
+        self.db_path = db_path or RESPONSE_CACHE_CONFIG["db_path"]
+        self.max_entries = max_entries or RESPONSE_CACHE_CONFIG["max_entries"]
+        self.max_bytes = max_bytes or RESPONSE_CACHE_CONFIG["max_bytes"]
+        self.ttl = ttl_seconds or RESPONSE_CACHE_CONFIG["ttl_seconds"]
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 查詢與寫入都很短，以鎖保護單一連接即可供事件循環與工作線程共用
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+        # 命中統計（本次運行）
+        self.hits = 0
+        self.misses = 0
+
+    def is_cacheable(self, temperature):
+        """只快取確定性的請求（溫度不高於設定值）"""
+        return temperature <= RESPONSE_CACHE_CONFIG["max_temperature"]
+
+    def get(self, key):
+        """查詢快取
+
+        Returns:
+            回應的增量片段列表，未命中時為None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT deltas, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, model, deltas):
+        """保存回應並淘汰超出上限的舊條目
+
+        Args:
+            key: cache_key計算的快取鍵
+            model: 模型ID
+            deltas: 回應的增量片段列表
+        """
+        data = json.dumps(deltas, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, deltas, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """刪除過期條目，並按最近使用時間淘汰超出條目數或大小上限的條目"""
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        evict = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evict.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evict)
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def get_stats(self):
+        """獲取命中統計
+
+        Returns:
+            包含hits、misses、entries、bytes的字典
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,96 @@
+import json
+
+# 優先使用更快的JSON解碼器（可選依賴）
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+
+class SSEParser:
+    """增量式SSE（Server-Sent Events）解析器
+
+    直接處理原始位元組塊：事件可以跨多次讀取被切分，支持多行data欄位，
+    並忽略註解行（常用作keep-alive）及其他欄位。
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._data_lines = []
+
+    def feed(self, chunk):
+        """輸入一個位元組塊
+
+        Args:
+            chunk: 從網絡讀到的原始位元組
+
+        Returns:
+            本次完成的事件data列表（已解碼為字符串）
+        """
+        buffer = self._buffer + chunk if self._buffer else chunk
+        end = buffer.rfind(b"\n")
+        if end < 0:
+            self._buffer = buffer
+            return []
+
+        self._buffer = buffer[end + 1:]
+        events = []
+        data_lines = self._data_lines
+        for line in buffer[:end].split(b"\n"):
+            if line.endswith(b"\r"):
+                line = line[:-1]
+
+            if not line:
+                # 空行表示一個事件結束
+                if data_lines:
+                    events.append(b"\n".join(data_lines).decode("utf-8"))
+                    data_lines = []
+                continue
+
+            if line.startswith(b"data:"):
+                value = line[5:]
+                if value.startswith(b" "):
+                    value = value[1:]
+                data_lines.append(value)
+            # 以冒號開頭的註解行及其他欄位（event、id、retry）不影響data內容
+
+        self._data_lines = data_lines
+        return events
+
+    def close(self):
+        """串流結束時取出尚未以空行結束的最後一個事件
+
+        Returns:
+            剩餘的事件data列表
+        """
+        if self._buffer:
+            self.feed(b"\n")
+        events = []
+        if self._data_lines:
+            events.append(b"\n".join(self._data_lines).decode("utf-8"))
+            self._data_lines = []
+        return events
+
+
+def parse_delta(data):
+    """從chat-completions數據塊中取出增量文字
+
+    Args:
+        data: 單個事件的data字符串
+
+    Returns:
+        增量文字，沒有內容時返回None
+
+    Raises:
+        ValueError: data不是有效的JSON
+    """
+    data_json = json_loads(data)
+    choices = data_json.get("choices")
+    if not choices:
+        return None
+    delta = choices[0].get("delta")
+    if not delta:
+        return None
+    return delta.get("content")
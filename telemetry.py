@@ -0,0 +1,201 @@
+import csv
+import json
+import time
+import datetime
+import threading
+import collections
+from config import TELEMETRY_CONFIG
+
+# 導出與統計面板使用的欄位（依序）
+METRIC_FIELDS = (
+    "timestamp", "kind", "model", "success", "status", "cached", "retries",
+    "request_bytes", "unchanged_prefix_bytes", "connection_reused", "prewarm_saved_ms", "dns_ms", "connect_ms", "ttft_ms", "total_ms",
+    "tokens", "tokens_per_sec", "gap_p50_ms", "gap_p95_ms", "gap_max_ms",
+    "render_lag_avg_ms", "render_lag_max_ms",
+)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+class RequestTimer:
+    """單個請求的計時器
+
+    由ApiClient在發送時創建，記錄DNS解析與建立連接的時間（經由aiohttp的
+    TraceConfig回調）、首個token時間以及相鄰token的間隔。
+    """
+
+    def __init__(self, model, kind="chat"):
+        """初始化計時器
+
+        Args:
+            model: 模型ID
+            kind: 請求類型（chat、compare、batch）
+        """
+        self.model = model
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.marks = {}
+        self.first_token = None
+        self.last_token = None
+        self.gaps = []
+        self.tokens = 0
+        self.retries = 0
+        self.connection_reused = None
+
+    def mark(self, name):
+        """記錄事件時間（dns_start、dns_end、connect_start、connect_end）"""
+        self.marks[name] = time.perf_counter()
+
+    def _span(self, start, end):
+        if start in self.marks and end in self.marks:
+            return self.marks[end] - self.marks[start]
+        return None
+
+    def on_token(self):
+        """收到一個增量片段"""
+        now = time.perf_counter()
+        if self.first_token is None:
+            self.first_token = now
+        else:
+            self.gaps.append(now - self.last_token)
+        self.last_token = now
+        self.tokens += 1
+
+    def finish(self, success, status, cached=False, request_bytes=0, unchanged_prefix_bytes=None):
+        """結束計時
+
+        Args:
+            success: 請求是否成功
+            status: 狀態文字
+            cached: 是否由回應快取重播
+            request_bytes: 請求體大小
+            unchanged_prefix_bytes: 請求體與上一個請求相同的開頭位元組數
+
+        Returns:
+            指標字典，欄位見METRIC_FIELDS（渲染延遲由ChatManager補充）
+        """
+        end = time.perf_counter()
+        gaps = sorted(self.gaps)
+        streaming = self.last_token - self.first_token if self.first_token is not None else 0.0
+        return {
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "kind": self.kind,
+            "model": self.model,
+            "success": success,
+            "status": status,
+            "cached": cached,
+            "retries": self.retries,
+            "request_bytes": request_bytes,
+            "unchanged_prefix_bytes": unchanged_prefix_bytes,
+            "connection_reused": self.connection_reused,
+            "prewarm_saved_ms": None,
+            "dns_ms": _ms(self._span("dns_start", "dns_end")),
+            "connect_ms": _ms(self._span("connect_start", "connect_end")),
+            "ttft_ms": _ms(self.first_token - self.start) if self.first_token is not None else None,
+            "total_ms": _ms(end - self.start),
+            "tokens": self.tokens,
+            "tokens_per_sec": round((self.tokens - 1) / streaming, 1) if streaming > 0 else None,
+            "gap_p50_ms": _ms(_percentile(gaps, 0.5)),
+            "gap_p95_ms": _ms(_percentile(gaps, 0.95)),
+            "gap_max_ms": _ms(gaps[-1]) if gaps else None,
+            "render_lag_avg_ms": None,
+            "render_lag_max_ms": None,
+        }
+
+
+class Telemetry:
+    """請求指標的環形緩衝區
+
+    只保留最近的max_records條記錄，可從任意線程添加，並可導出為CSV或JSON。
+    """
+
+    def __init__(self, max_records=None):
+        """初始化環形緩衝區
+
+        Args:
+            max_records: 保留的記錄數，默認使用TELEMETRY_CONFIG["max_records"]
+        """
+        self._records = collections.deque(maxlen=max_records or TELEMETRY_CONFIG["max_records"])
+        self._lock = threading.Lock()
+
+    def add(self, metrics):
+        with self._lock:
+            self._records.append(metrics)
+
+    def records(self):
+        """所有記錄的副本（由舊到新）"""
+        with self._lock:
+            return list(self._records)
+
+    def summary(self, window=None):
+        """最近window條成功請求的平均值
+
+        Returns:
+            包含count、ttft_ms、tokens_per_sec、gap_p95_ms、render_lag_max_ms平均值的字典
+        """
+        window = window or TELEMETRY_CONFIG["summary_window"]
+        recent = [record for record in self.records()[-window:] if record["success"]]
+        result = {"count": len(recent)}
+        for field in ("ttft_ms", "tokens_per_sec", "gap_p95_ms", "render_lag_max_ms"):
+            values = [record[field] for record in recent if record.get(field) is not None]
+            result[field] = round(sum(values) / len(values), 1) if values else None
+        return result
+
+    def export(self, file_path):
+        """導出所有記錄，副檔名為.json時導出JSON，否則導出CSV
+
+        Returns:
+            導出的記錄數
+        """
+        records = self.records()
+        if file_path.lower().endswith(".json"):
+            with open(file_path, "w", encoding="utf-8") as output:
+                json.dump(records, output, ensure_ascii=False, indent=2)
+        else:
+            # utf-8-sig使Excel正確識別中文
+            with open(file_path, "w", encoding="utf-8-sig", newline="") as output:
+                writer = csv.DictWriter(output, fieldnames=METRIC_FIELDS, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(records)
+        return len(records)
+
+
+def format_metrics(metrics, summary=None):
+    """將一條記錄格式化為統計面板的單行文字"""
+    metrics = dict(metrics)
+    if metrics.get("unchanged_prefix_bytes") is not None and metrics["request_bytes"]:
+        metrics["prefix_unchanged_pct"] = metrics["unchanged_prefix_bytes"] * 100 / metrics["request_bytes"]
+
+    def value(field, unit="ms", digits=0):
+        number = metrics.get(field)
+        return "-" if number is None else f"{number:.{digits}f}{unit}"
+
+    if metrics["cached"]:
+        connection = "快取"
+    elif metrics["connection_reused"]:
+        connection = "重用連接"
+        if metrics.get("prewarm_saved_ms"):
+            connection += f"（預熱節省 {value('prewarm_saved_ms')}）"
+    else:
+        connection = f"DNS {value('dns_ms')} / 連接 {value('connect_ms')}"
+
+    parts = [
+        f"{metrics['model'].split('/')[-1]}",
+        connection,
+        f"首字 {value('ttft_ms')}",
+        f"前綴未變 {value('prefix_unchanged_pct', '%')}",
+        f"{metrics['tokens']} tokens @ {value('tokens_per_sec', ' tok/s', 1)}",
+        f"間隔 p50 {value('gap_p50_ms', 'ms', 1)} / p95 {value('gap_p95_ms', 'ms', 1)}",
+        f"渲染延遲 max {value('render_lag_max_ms', 'ms', 1)}",
+    ]
+    if summary and summary["count"] > 1 and summary["ttft_ms"] is not None:
+        parts.append(f"近{summary['count']}次平均首字 {summary['ttft_ms']:.0f}ms")
+    return " · ".join(parts)
@@ -0,0 +1,90 @@
+import re
+from functools import lru_cache
+from config import API_CONFIG, MODEL_CONTEXT_LIMITS, DEFAULT_CONTEXT_LIMIT
+from wire_format import get_system_message
+
+# 中日韓文字及全形符號大致為每字一個token
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+# 每條消息的格式開銷（角色標記、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=8192)
+def estimate_tokens(text):
+    """估算文字的token數
+
+    以內容字符串為快取鍵：歷史消息的內容不會改變，且字符串會快取自身的雜湊值，
+    因此每條消息只需計算一次。
+
+    Args:
+        text: 消息內容
+
+    Returns:
+        估算的token數
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    # 其他文字（英文、程式碼等）平均約4個字元一個token
+    return cjk_count + (other_count + 3) // 4
+
+
+def estimate_message_tokens(message):
+    """估算單條消息的token數（含格式開銷）"""
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class TokenBudget:
+    def __init__(self, context_limits=None, reserve_tokens=None):
+        """初始化上下文預算管理器
+
+        Args:
+            context_limits: 模型ID到上下文長度的映射，默認使用MODEL_CONTEXT_LIMITS
+            reserve_tokens: 為模型回應預留的token數，默認使用API_CONFIG["max_tokens"]
+        """
+        self.context_limits = context_limits or MODEL_CONTEXT_LIMITS
+        self.reserve_tokens = API_CONFIG["max_tokens"] if reserve_tokens is None else reserve_tokens
+
+    def get_context_limit(self, model_id):
+        """獲取模型的上下文長度上限"""
+        return self.context_limits.get(model_id, DEFAULT_CONTEXT_LIMIT)
+
+    def get_prompt_budget(self, model_id):
+        """獲取可用於對話歷史的token數（扣除模型固定的系統提示）"""
+        budget = self.get_context_limit(model_id) - self.reserve_tokens
+        system_message = get_system_message(model_id)
+        if system_message:
+            budget -= estimate_message_tokens(system_message)
+        return max(budget, 0)
+
+    def fit(self, messages, model_id):
+        """從最舊的消息開始截斷，使對話歷史符合模型的上下文預算
+
+        最新一條消息總會被保留；截斷後若以助手回應開頭，會一併移除，
+        保證發送的歷史從用戶消息開始。
+
+        Args:
+            messages: 完整的消息列表
+            model_id: 模型ID
+
+        Returns:
+            元組 (截斷後的消息列表, 估算的token數, 被省略的消息數)
+        """
+        budget = self.get_prompt_budget(model_id)
+        total = 0
+        start = len(messages)
+        while start > 0:
+            tokens = estimate_message_tokens(messages[start - 1])
+            if total + tokens > budget and start < len(messages):
+                break
+            total += tokens
+            start -= 1
+
+        # 不以孤立的助手回應開頭
+        while start < len(messages) - 1 and messages[start]["role"] == "assistant":
+            total -= estimate_message_tokens(messages[start])
+            start += 1
+
+        return messages[start:], total, start
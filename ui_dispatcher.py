@@ -0,0 +1,113 @@
+import time
+import threading
+import collections
+
+
+class UiDispatcher:
+    """線程安全的UI調度器
+
+    Tk只允許在主線程操作元件。背景線程通過此調度器把UI操作放入隊列，
+    由主循環以after定時取出執行；狀態欄等重複更新只保留最新一次。
+    """
+
+    def __init__(self, root, poll_ms=16, budget_ms=8, max_pending=500):
+        """初始化UI調度器
+
+        Args:
+            root: Tk根視窗，用於after輪詢
+            poll_ms: 輪詢間隔（毫秒）
+            budget_ms: 每次輪詢最多執行的時間（毫秒），避免阻塞主循環
+            max_pending: 待執行操作數上限，超過時異步生產者應等待
+        """
+        self.root = root
+        self.poll_ms = poll_ms
+        self.budget = budget_ms / 1000
+        self.max_pending = max_pending
+        self._queue = collections.deque()
+        self._coalesced = {}
+        self._lock = threading.Lock()
+        self._main_thread_id = threading.get_ident()
+        self._after_id = None
+
+    def is_main_thread(self):
+        """當前是否為Tk主線程"""
+        return threading.get_ident() == self._main_thread_id
+
+    def call(self, func, *args):
+        """在主線程執行func（主線程中直接執行，否則放入隊列）"""
+        if self.is_main_thread():
+            func(*args)
+        else:
+            self._queue.append((None, func, args))
+
+    def call_coalesced(self, key, func, *args):
+        """在主線程執行func，相同key尚未執行的舊操作會被新操作取代"""
+        if self.is_main_thread():
+            with self._lock:
+                self._coalesced.pop(key, None)
+            func(*args)
+            return
+
+        with self._lock:
+            is_new = key not in self._coalesced
+            self._coalesced[key] = (func, args)
+        if is_new:
+            self._queue.append((key, None, None))
+
+    def pending_count(self):
+        """尚未執行的操作數"""
+        return len(self._queue)
+
+    async def wait_for_capacity(self, interval=0.01):
+        """隊列過長時讓出事件循環，直到主線程追上（背壓）"""
+        import asyncio
+        while self._after_id is not None and len(self._queue) >= self.max_pending:
+            await asyncio.sleep(interval)
+
+    def start(self):
+        """開始輪詢隊列（須在主線程調用）"""
+        if self._after_id is None:
+            self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def stop(self):
+        """停止輪詢並丟棄未執行的操作"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._queue.clear()
+        with self._lock:
+            self._coalesced.clear()
+
+    def _poll(self):
+        """執行隊列中的操作，超出時間預算的部分留到下一輪"""
+        try:
+            self.run_pending()
+        finally:
+            self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def run_pending(self):
+        """在主線程執行待處理操作
+
+        Returns:
+            本次執行的操作數
+        """
+        deadline = time.perf_counter() + self.budget
+        count = 0
+        while self._queue:
+            key, func, args = self._queue.popleft()
+            if key is not None:
+                with self._lock:
+                    entry = self._coalesced.pop(key, None)
+                if entry is None:
+                    continue
+                func, args = entry
+
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"UI操作異常: {e}")
+            count += 1
+
+            if time.perf_counter() >= deadline:
+                break
+        return count
@@ -9,6 +9,10 @@ def get_time_str():
 
 def set_text_readonly_but_selectable(text_widget):
     """設置文字框為唯讀但可選取的模式"""
+    # 綁定只需安裝一次，重複調用直接返回
+    if getattr(text_widget, "readonly_selectable", False):
+        return
+    
     # 啟用文字框以允許配置標籤和選取功能
     text_widget.config(state=tk.NORMAL)
     
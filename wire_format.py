@@ -0,0 +1,139 @@
+import json
+from config import SYSTEM_PROMPTS
+
+# 發送給API的消息欄位；timestamp、model等只用於顯示與導出
+WIRE_FIELDS = ("role", "content")
+
+# 各模型固定的系統提示消息（每個模型只創建一次，編碼器可按對象重用已編碼的位元組）
+_system_messages = {}
+
+
+def to_wire_message(message):
+    """將聊天歷史條目轉換為API消息格式（移除顯示用欄位）"""
+    return {field: message[field] for field in WIRE_FIELDS}
+
+
+def get_system_message(model):
+    """獲取模型固定的系統提示消息
+
+    Returns:
+        {"role": "system", "content": ...}，未設置系統提示時為None
+    """
+    if model not in _system_messages:
+        prompt = SYSTEM_PROMPTS.get(model, SYSTEM_PROMPTS.get("default"))
+        _system_messages[model] = {"role": "system", "content": prompt} if prompt else None
+    return _system_messages[model]
+
+
+def common_prefix_length(old, new):
+    """兩個位元組串開頭相同部分的長度
+
+    以二分法比較切片，每次比較都在C中完成，MB級的請求體也只需數毫秒。
+    """
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[:middle] == new[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def encode_json(value):
+    """以緊湊格式編碼JSON並轉為UTF-8位元組"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class WireEncoder:
+    """對話歷史的請求編碼器
+
+    聊天歷史中的條目一經追加便不再修改，因此每條消息只需編碼一次。
+    編碼器記住上一次發送的消息序列及其已拼接的位元組；新一輪請求若以
+    相同的消息開頭，只編碼新追加的消息。
+
+    請求體的欄位順序固定，並把每輪變化的參數放在消息之後，同一對話的
+    連續請求因此共用盡可能長的相同開頭，有利於服務端的前綴（KV）快取。
+    unchanged_prefix_bytes記錄最近一次請求體與上一次相同的開頭位元組數。
+    """
+
+    def __init__(self):
+        self._encoded = {}
+        self._prefix_messages = []
+        self._prefix_bytes = b""
+        # 上一次的請求體（清除歷史後仍保留，新對話的開頭可能與之相同）
+        self._last_body = b""
+        self.unchanged_prefix_bytes = 0
+
+    def reset(self):
+        """清空快取（清除聊天歷史時調用）"""
+        self._encoded = {}
+        self._prefix_messages = []
+        self._prefix_bytes = b""
+
+    def _encode_message(self, message):
+        """編碼單條消息，結果按消息對象快取"""
+        entry = self._encoded.get(id(message))
+        # 保存消息對象本身，避免id被回收後重用造成誤判
+        if entry is None or entry[0] is not message:
+            entry = (message, encode_json(to_wire_message(message)))
+            self._encoded[id(message)] = entry
+        return entry[1]
+
+    def _has_prefix(self, messages):
+        """messages是否以上一次編碼的消息序列開頭"""
+        prefix = self._prefix_messages
+        if len(messages) < len(prefix):
+            return False
+        for old, new in zip(prefix, messages):
+            if old is not new:
+                return False
+        return True
+
+    def encode_messages(self, messages):
+        """將消息列表編碼為JSON陣列的位元組
+
+        Args:
+            messages: 聊天歷史條目列表
+
+        Returns:
+            UTF-8編碼的JSON陣列
+        """
+        if self._prefix_messages and self._has_prefix(messages):
+            new_messages = messages[len(self._prefix_messages):]
+            parts = [self._encode_message(message) for message in new_messages]
+            if parts:
+                self._prefix_bytes += b"," + b",".join(parts)
+            self._prefix_messages.extend(new_messages)
+        else:
+            # 歷史被截斷或清除時，以已快取的消息重新拼接，並丟棄不再使用的快取
+            parts = [self._encode_message(message) for message in messages]
+            keep = {id(message) for message in messages}
+            self._encoded = {key: entry for key, entry in self._encoded.items() if key in keep}
+            self._prefix_bytes = b",".join(parts)
+            self._prefix_messages = list(messages)
+
+        return b"[" + self._prefix_bytes + b"]"
+
+    def encode_body(self, messages, model, temperature, max_tokens):
+        """構建完整的chat-completions請求體
+
+        Args:
+            messages: 聊天歷史條目列表
+            model: 模型ID
+            temperature: 溫度參數
+            max_tokens: 最大回應token數
+
+        Returns:
+            UTF-8編碼的JSON請求體
+        """
+        body = b"".join((
+            b'{"model":', encode_json(model),
+            b',"messages":', self.encode_messages(messages),
+            b',"stream":true,"max_tokens":', encode_json(max_tokens),
+            b',"temperature":', encode_json(temperature),
+            b"}"
+        ))
+        self.unchanged_prefix_bytes = common_prefix_length(self._last_body, body)
+        self._last_body = body
+        return body